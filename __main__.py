@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+"""
+Запуск эмулятора из командной строки: python -m emulator run program.asm ...
+Графический интерфейс (и tkinter) не импортируется
+"""
+
+import sys
+import os
+
+# Добавляем директорию проекта в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())
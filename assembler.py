@@ -4,6 +4,45 @@
 """
 
 import re
+from array import array
+from collections import namedtuple
+
+# Результат однопроходного ассемблирования: машинные коды, таблица меток и номер
+# строки исходного текста для каждого слова
+Assembly = namedtuple('Assembly', ('words', 'labels', 'lines'))
+
+# Строка исходного текста для assemble_stream: метка - до первого ':' вне комментария,
+# мнемоника и операнд - первые два слова кода, остальное (в том числе комментарий)
+# пропускается. Разбиение совпадает с parse_line: комментарий, метка, split()
+_LINE_BODY = r'[^\S\n]*(?:([^:;\n]*):)?[^\S\n]*([^\s;]*)[^\S\n]*([^\s;]*)[^\n]*'
+_LINE = re.compile(_LINE_BODY + r'\n')
+_LINE_ONLY = re.compile(_LINE_BODY)
+_READ_CHUNK = 1 << 20
+
+# Смещение поля операнда по способу адресации (как в encode_instruction)
+_OPERAND_BASE = {'direct': 0, 'indirect': 256, 'immediate': 512, 'register': 1024, 'reg_indirect': 1040}
+
+
+class AssemblyError(ValueError):
+    """Ошибки ассемблирования: errors - список (строка, столбец, сообщение)"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("Ошибки ассемблирования:\n" + "\n".join(
+            f"Строка {line}, столбец {column}: {message}" for line, column, message in errors))
+
+
+def label_at(address, labels):
+    """Имя адреса по таблице меток: 'LOOP' или 'LOOP+3' от ближайшей метки не выше адреса"""
+    best = None
+    for name, label_address in labels.items():
+        if label_address <= address and (best is None or label_address > labels[best]):
+            best = name
+    if best is None:
+        return f"{address:04X}"
+    offset = address - labels[best]
+    return best if offset == 0 else f"{best}+{offset}"
+
 
 class Assembler:
     def __init__(self):
@@ -191,6 +230,83 @@ class Assembler:
         return instructions
 
     
+    def assemble_stream(self, source):
+        """Однопроходное ассемблирование текста, файла (читается блоками) или итератора строк
+
+        Строки разбираются одним регулярным выражением, одинаковые пары (мнемоника, операнд)
+        кодируются один раз на всю программу. Ссылки на метки, объявленные ниже, записываются
+        в таблицу исправлений и заполняются после последней строки. Коды совпадают с
+        assemble(), но повторное объявление метки считается ошибкой. Все ошибки собираются
+        и выбрасываются одним AssemblyError с номерами строк и столбцов.
+        """
+        if isinstance(source, str):
+            scan = _LINE.finditer(source + '\n')
+        elif hasattr(source, 'read'):
+            scan = _scan_file(source)
+        else:
+            scan = map(_LINE_ONLY.match, source)
+        self.reset()
+        labels = self.labels
+        opcodes = {name: code << 12 for name, code in self.opcodes.items()}
+        words = array('H')
+        line_map = array('I')
+        fixups = []      # (индекс слова, имя, способ адресации, строка, столбец)
+        errors = []
+        # (None, мнемоника, операнд) -> слово, None для строки без команды или
+        # (слово, имя, способ) для ссылки на метку ниже. Метка не переобъявляется,
+        # поэтому найденные значения меток не меняются
+        encoded = {}
+
+        for line_num, match in enumerate(scan, 1):
+            key = match.groups()
+            label = key[0]
+            if label is not None:
+                key = (None, key[1], key[2])
+                name = label.strip()
+                if name in labels:
+                    column = match.start(1) - match.start() + len(label) - len(label.lstrip()) + 1
+                    errors.append((line_num, column, f"Метка {name} уже объявлена"))
+                labels[name] = len(words)
+
+            word = encoded.get(key, -1)
+            if word == -1:
+                try:
+                    word = encoded[key] = _encode(key[1], key[2], opcodes, labels)
+                except _LineError as e:
+                    position = match.end(e.group) if e.at_end else match.start(e.group)
+                    errors.append((line_num, position - match.start() + 1, str(e)))
+                    words.append(0)
+                    line_map.append(line_num)
+                    continue
+                if word is None:
+                    continue
+            elif word is None:
+                continue
+            if word.__class__ is tuple:
+                fixups.append((len(words), word[1], word[2], line_num, match.start(3) - match.start() + 1))
+                word = word[0]
+            words.append(word)
+            line_map.append(line_num)
+
+        # Ссылки вперёд: метки известны целиком; имя без метки в прямой адресации -
+        # целое число, как в parse_operand
+        for address, name, operand_type, line_num, column in fixups:
+            if name in labels:
+                value = labels[name]
+            elif operand_type == 'direct' and _is_int(name):
+                value = int(name)
+            else:
+                errors.append((line_num, column, f"Неизвестная метка: {name}" if operand_type == 'indirect'
+                               else f"Неизвестный операнд: {name}"))
+                continue
+            words[address] |= (value + _OPERAND_BASE[operand_type]) & 0xFFF
+
+        if errors:
+            errors.sort()
+            raise AssemblyError(errors)
+        self.address_counter = len(words)
+        return Assembly(words, dict(labels), line_map)
+
     def format_program(self, instructions):
         result = []
         for instr in instructions:
@@ -228,3 +344,89 @@ class Assembler:
             result.append(line)
         
         return result
+
+
+class _LineError(ValueError):
+    """Ошибка в строке: group - группа _LINE (2 - мнемоника, 3 - операнд), at_end - столбец после неё"""
+
+    def __init__(self, message, group, at_end=False):
+        super().__init__(message)
+        self.group = group
+        self.at_end = at_end
+
+
+def _encode(mnemonic, operand, opcodes, labels):
+    """Слово команды, None для строки без команды или (слово, имя метки ниже, способ)
+
+    Операнд разбирается в порядке проверок parse_operand.
+    """
+    if not mnemonic:
+        return None
+    opcode = opcodes.get(mnemonic)
+    if opcode is None:
+        opcode = opcodes.get(mnemonic.upper())
+        if opcode is None:
+            raise _LineError(f"Неизвестная команда: {mnemonic.upper()}", 2)
+    if opcode == 0:
+        return opcode
+    if not operand:
+        raise _LineError(f"Команда {mnemonic.upper()} требует операнд", 2, at_end=True)
+
+    first = operand[0]
+    try:
+        if first == '#':
+            value = int(operand[1:]) + 512
+        elif first == '(' and operand[-1] == ')':
+            inner = operand[1:-1]
+            if inner[:1] in ('R', 'r') and inner[1:].isdigit():
+                value = int(inner[1:])
+                if value > 15:
+                    raise _LineError(f"Invalid register in (Rk): {operand}", 3)
+                value += 1040
+            elif inner.isdigit():
+                value = int(inner) + 256
+            elif inner in labels:
+                value = labels[inner] + 256
+            else:
+                return opcode, inner, 'indirect'
+        elif first == 'R' and len(operand) >= 2:
+            if not operand[1:].isdigit():
+                raise _LineError(f"Недопустимый формат регистра: {operand}", 3)
+            value = int(operand[1:])
+            if value > 15:
+                raise _LineError(f"Недопустимый номер регистра: {operand}", 3)
+            value += 1024
+        elif operand.isdigit():
+            value = int(operand)
+        elif operand in labels:
+            value = labels[operand]
+        else:
+            return opcode, operand, 'direct'
+    except _LineError:
+        raise
+    except ValueError:
+        raise _LineError(f"Некорректное число: {operand}", 3)
+    return opcode | (value & 0xFFF)
+
+
+def _scan_file(f):
+    """Строки файла блоками по _READ_CHUNK символов: совпадения _LINE"""
+    tail = ''
+    while True:
+        chunk = f.read(_READ_CHUNK)
+        if not chunk:
+            break
+        chunk = tail + chunk
+        end = chunk.rfind('\n') + 1
+        tail = chunk[end:]
+        yield from _LINE.finditer(chunk, 0, end)
+    if tail:
+        yield _LINE.match(tail + '\n')
+
+
+def _is_int(text):
+    try:
+        int(text)
+    except ValueError:
+        return False
+    return True
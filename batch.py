@@ -0,0 +1,159 @@
+"""
+Пакетное выполнение множества заданий (программа, данные) на пуле процессов
+Каждая программа ассемблируется один раз в родительском процессе (через кэш
+ассемблирования objfile) и передаётся рабочим процессам при запуске, задания
+отправляются пачками
+"""
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from objfile import assemble_cached
+from predictor import make_predictor
+from processor import Processor, Snapshot, EMPTY_SNAPSHOT
+
+DEFAULT_MAX_STEPS = 10000
+
+# Состояние рабочего процесса: машинные коды программ, снимки процессора
+# с загруженной программой и переиспользуемый процессор
+_worker_programs = {}
+_worker_labels = {}
+_worker_snapshots = {}
+_worker_processor = None
+
+
+def load_manifest(path):
+    """Чтение списка заданий: JSON-массив или JSON Lines (одно задание на строку)
+
+    Задание: {"program": "programs/variant9_max.asm", "data": {"300": [6, 12, 3]},
+              "max_steps": 10000, "dump": [100, [101, 105]], "predictor": "2bit"}
+    Необязательный "predictor" - описание предсказателя переходов для make_predictor,
+    "time_limit" - ограничение времени выполнения задания в секундах.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    if text.lstrip().startswith('['):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def assemble_programs(paths, labels=None):
+    """Ассемблирование каждой различной программы один раз
+
+    Если передан словарь labels, в него записываются таблицы меток программ.
+    """
+    programs = {}
+    for path in paths:
+        if path not in programs:
+            obj = assemble_cached(path)
+            programs[path] = obj.code
+            if labels is not None:
+                labels[path] = obj.symbols
+    return programs
+
+
+def _dump_addresses(dump):
+    for item in dump:
+        if isinstance(item, (list, tuple)):
+            yield from range(item[0], item[1] + 1)
+        else:
+            yield item
+
+
+def execute_job(processor, program, job, labels=None):
+    """Выполнение одного задания на подготовленном процессоре
+
+    program - список машинных кодов или Processor.snapshot() с уже загруженной программой,
+    labels - таблица меток программы для статистики переходов
+    """
+    if isinstance(program, Snapshot):
+        processor.restore(program)
+    else:
+        processor.restore(EMPTY_SNAPSHOT)
+        processor.load_program(program)
+    for address, values in job.get('data', {}).items():
+        processor.load_data(values, int(address))
+    predictor = job.get('predictor')
+    processor.branch_predictor = make_predictor(predictor) if predictor else None
+    run = processor.run(job.get('max_steps', DEFAULT_MAX_STEPS), job.get('time_limit'))
+    result = {
+        'program': job['program'],
+        'halted': processor.halted,
+        'stop_reason': run.reason,
+        'steps': processor.step_count,
+        'ACC': processor.ACC,
+        'memory': {str(addr): processor.memory[addr] for addr in _dump_addresses(job.get('dump', ()))
+                   if 0 <= addr < len(processor.memory)},
+    }
+    if predictor:
+        result['branches'] = processor.branch_predictor.report(labels)
+        processor.branch_predictor = None
+    return result
+
+
+def _init_worker(programs, engine, labels=None):
+    global _worker_programs, _worker_labels, _worker_snapshots, _worker_processor
+    _worker_programs = programs
+    _worker_labels = labels or {}
+    _worker_snapshots = {}
+    _worker_processor = Processor(engine=engine)
+
+
+def _program_snapshot(path):
+    # Программа загружается в память один раз, дальше задания стартуют с её снимка
+    snapshot = _worker_snapshots.get(path)
+    if snapshot is None:
+        processor = Processor()
+        processor.load_program(_worker_programs[path])
+        snapshot = _worker_snapshots[path] = processor.snapshot()
+    return snapshot
+
+
+def _run_chunk(chunk):
+    results = []
+    for index, job in chunk:
+        try:
+            result = execute_job(_worker_processor, _program_snapshot(job['program']), job,
+                                 _worker_labels.get(job['program']))
+        except Exception as e:
+            result = {'program': job.get('program'), 'error': str(e)}
+        result['index'] = index
+        results.append(result)
+    return results
+
+
+def _chunks(jobs, chunksize):
+    chunk = []
+    for item in enumerate(jobs):
+        chunk.append(item)
+        if len(chunk) == chunksize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_batch(jobs, workers=None, chunksize=None, ordered=True, engine='jit'):
+    """Выполнение заданий на пуле процессов, результаты возвращаются по мере готовности
+
+    При ordered=True результаты идут в порядке заданий, иначе - в порядке завершения пачек.
+    Каждый результат содержит 'index' - номер задания в списке jobs.
+    """
+    jobs = list(jobs)
+    workers = workers or os.cpu_count() or 1
+    if chunksize is None:
+        # Несколько пачек на процесс сглаживают разную длительность заданий
+        chunksize = max(1, len(jobs) // (workers * 4))
+    labels = {}
+    programs = assemble_programs((job['program'] for job in jobs), labels)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(programs, engine, labels)) as executor:
+        futures = [executor.submit(_run_chunk, chunk) for chunk in _chunks(jobs, chunksize)]
+        if ordered:
+            for future in futures:
+                yield from future.result()
+        else:
+            for future in as_completed(futures):
+                yield from future.result()
@@ -0,0 +1,254 @@
+"""
+Набор тестов производительности по программам programs/variant9_*.asm
+Каждый вариант семейства (max, sum, convolution) выполняется на одинаковых
+сгенерированных данных заданных размеров всеми движками Processor. Результаты -
+шаги, такты (по модели времени), время и команд в секунду - сохраняются в JSON/CSV
+и сравниваются с сохранённым базовым прогоном
+"""
+
+import csv
+import glob
+import json
+import math
+import os
+import platform
+import random
+import time
+
+from assembler import Assembler
+from objfile import assemble_cached
+from processor import Processor, ENGINES
+
+PROGRAMS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'programs')
+
+DEFAULT_SIZES = (6, 19)
+DEFAULT_MAX_VALUE = 100
+DEFAULT_MAX_STEPS = 100_000_000
+DEFAULT_TOLERANCE = 0.2      # допустимое замедление относительно базового прогона
+DEFAULT_MIN_TIME = 0.05      # короткие программы повторяются, пока суммарное время меньше этого
+MAX_REPEATS = 1000
+
+FIELDS = ('family', 'program', 'engine', 'size', 'steps', 'cycles', 'wall_time',
+          'instructions_per_second', 'correct')
+
+
+def _array_data(size, rng, max_value):
+    return {300: [size] + [rng.randrange(max_value + 1) for _ in range(size)]}
+
+
+def _pair_data(size, rng, max_value):
+    data = _array_data(size, rng, max_value)
+    data[320] = [size] + [rng.randrange(max_value + 1) for _ in range(size)]
+    return data
+
+
+def _dot(data):
+    return sum(a * b for a, b in zip(data[300][1:], data[320][1:])) & 0xFFFF
+
+
+# Семейство -> (генератор данных, ожидаемое значение ячейки 100, наибольший размер массива)
+FAMILIES = {
+    'max': (_array_data, lambda data: max(data[300][1:], default=0), 3794),
+    'sum': (_array_data, lambda data: sum(data[300][1:]) & 0xFFFF, 3794),
+    # Массив B начинается с адреса 320, поэтому в A помещается не больше 19 элементов
+    'convolution': (_pair_data, _dot, 19),
+}
+
+
+# Варианты, обрабатывающие фиксированное число элементов: наибольший поддерживаемый размер.
+# Большие размеры для них пропускаются, чтобы «верно» отмечало только настоящие расхождения
+PROGRAM_SIZE_LIMITS = {
+    'variant9_sum_registers': 4,
+    'variant9_convolution_registers': 6,
+    'variant9_convolution_registers_pure': 6,
+}
+
+
+def family_programs(family, programs_dir=PROGRAMS_DIR):
+    """Варианты семейства: programs/variant9_<семейство>*.asm"""
+    return sorted(glob.glob(os.path.join(programs_dir, f'variant9_{family}*.asm')))
+
+
+def make_inputs(family, size, seed=0, max_value=DEFAULT_MAX_VALUE):
+    """Данные для всех вариантов семейства одного размера; зависят только от аргументов"""
+    generate = FAMILIES[family][0]
+    return generate(size, random.Random(f"{seed}:{family}:{size}"), max_value)
+
+
+def _assemble(path):
+    return assemble_cached(path).code
+
+
+def _prepare(program, data, engine):
+    processor = Processor(engine=engine)
+    processor.load_program(program)
+    for address, values in data.items():
+        processor.load_data(values, address)
+    return processor
+
+
+def measure(program, data, engine, repeat=3, max_steps=DEFAULT_MAX_STEPS, min_time=DEFAULT_MIN_TIME):
+    """Лучшее время выполнения программы движком: (процессор, время в секундах)
+
+    Не меньше repeat прогонов и, для коротких программ, пока суммарное время меньше min_time.
+    """
+    best = None
+    total = 0.0
+    runs = 0
+    while runs < repeat or (total < min_time and runs < MAX_REPEATS):
+        processor = _prepare(program, data, engine)
+        elapsed = processor.run(max_steps).elapsed
+        total += elapsed
+        runs += 1
+        if best is None or elapsed < best[1]:
+            best = (processor, elapsed)
+    return best
+
+
+def run_benchmarks(families=None, sizes=DEFAULT_SIZES, engines=ENGINES, repeat=3, seed=0,
+                   max_value=DEFAULT_MAX_VALUE, timing=False, max_steps=DEFAULT_MAX_STEPS,
+                   min_time=DEFAULT_MIN_TIME, programs_dir=PROGRAMS_DIR):
+    """Прогон всех вариантов семейств на всех движках, возвращает список строк-словарей FIELDS
+
+    Размеры больше допустимого для семейства или варианта (PROGRAM_SIZE_LIMITS) пропускаются. timing - дополнительно считать
+    такты модели времени (один прогон эталонным интерпретатором на вариант и размер).
+    """
+    rows = []
+    for family in families or FAMILIES:
+        if family not in FAMILIES:
+            raise ValueError(f"Неизвестное семейство программ: {family}")
+        expected = FAMILIES[family][1]
+        limit = FAMILIES[family][2]
+        for path in family_programs(family, programs_dir):
+            program = _assemble(path)
+            name = os.path.splitext(os.path.basename(path))[0]
+            program_limit = min(limit, PROGRAM_SIZE_LIMITS.get(name, limit))
+            for size in sizes:
+                if size > program_limit:
+                    continue
+                data = make_inputs(family, size, seed, max_value)
+                cycles = None
+                if timing:
+                    processor = _prepare(program, data, 'interpreter')
+                    processor.enable_timing()
+                    cycles = processor.run(max_steps).cycles
+                for engine in engines:
+                    processor, elapsed = measure(program, data, engine, repeat, max_steps, min_time)
+                    rows.append({
+                        'family': family,
+                        'program': name,
+                        'engine': engine,
+                        'size': size,
+                        'steps': processor.step_count,
+                        'cycles': cycles,
+                        'wall_time': elapsed,
+                        'instructions_per_second': processor.step_count / elapsed if elapsed > 0 else None,
+                        'correct': processor.halted and processor.memory[100] == expected(data),
+                    })
+    return rows
+
+
+def generate_source(lines, seed=0):
+    """Сгенерированная программа из lines строк: метки, переходы вперёд и назад, комментарии"""
+    rng = random.Random(f"{seed}:source:{lines}")
+    operands = ('5', '#17', '(200)', 'R3', '(R4)', '#1', '100')
+    result = []
+    for i in range(lines):
+        if i % 10 and rng.random() < 0.05:
+            result.append(f"; блок {i // 10}")
+            continue
+        label = f"L{i}: " if i % 10 == 0 else "    "
+        mnemonic = rng.choice(('LOAD', 'LOAD', 'STORE', 'ADD', 'SUB', 'CMP', 'JMP', 'JZ', 'JNZ'))
+        if mnemonic in ('JMP', 'JZ', 'JNZ'):
+            target = min(lines - 1, max(0, i + rng.randrange(-40, 60))) // 10 * 10
+            operand = f"L{target}"
+        else:
+            operand = rng.choice(operands)
+        comment = "    ; шаг" if rng.random() < 0.3 else ""
+        result.append(f"{label}{mnemonic} {operand}{comment}")
+    result.append("    HALT")
+    return '\n'.join(result)
+
+
+def measure_assembler(lines=100_000, seed=0, repeat=3):
+    """Лучшее время ассемблирования сгенерированной программы: assemble() и assemble_stream()"""
+    source = generate_source(lines, seed)
+    results = {}
+    for mode in ('assemble', 'assemble_stream'):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            getattr(Assembler(), mode)(source)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[mode] = {'lines': lines, 'wall_time': best, 'lines_per_second': lines / best}
+    results['speedup'] = results['assemble']['wall_time'] / results['assemble_stream']['wall_time']
+    return results
+
+
+def environment(**settings):
+    """Сведения о прогоне для сравнения результатов между машинами"""
+    return {'python': platform.python_version(), 'implementation': platform.python_implementation(),
+            'machine': platform.machine(), 'system': platform.system(), **settings}
+
+
+def write_json(path, rows, meta=None):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'meta': meta or {}, 'results': rows}, f, ensure_ascii=False, indent=2)
+
+
+def write_csv(path, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def load_results(path):
+    """Результаты из файла write_json"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)['results']
+
+
+def compare(rows, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Расхождения с базовым прогоном: список словарей с полем problem
+
+    'steps' - другое число шагов у варианта (изменилось поведение программы или движка),
+    'slower' - среднее геометрическое отношения скоростей движка к базовым ниже 1 - tolerance.
+    Отдельные короткие прогоны шумят, поэтому замедление оценивается по движку в целом,
+    а самые замедлившиеся варианты приводятся в поле slowest.
+    """
+    base = {(row['program'], row['engine'], row['size']): row for row in baseline}
+    problems = []
+    ratios = {}
+    for row in rows:
+        old = base.get((row['program'], row['engine'], row['size']))
+        if old is None:
+            continue
+        if row['steps'] != old['steps']:
+            problems.append({'problem': 'steps', 'program': row['program'], 'engine': row['engine'],
+                             'size': row['size'], 'baseline': old['steps'], 'value': row['steps']})
+            continue
+        speed, old_speed = row['instructions_per_second'], old['instructions_per_second']
+        if speed and old_speed:
+            ratios.setdefault(row['engine'], []).append((speed / old_speed, row['program'], row['size']))
+
+    for engine, items in ratios.items():
+        ratio = math.exp(sum(math.log(r) for r, _, _ in items) / len(items))
+        if ratio < 1 - tolerance:
+            slowest = sorted(items)[:3]
+            problems.append({'problem': 'slower', 'engine': engine, 'ratio': ratio,
+                             'slowest': [{'program': p, 'size': n, 'ratio': r} for r, p, n in slowest]})
+    return problems
+
+
+def format_table(rows):
+    """Текстовая таблица результатов"""
+    lines = [f"{'программа':38s} {'движок':12s} {'N':>4s} {'шагов':>10s} {'тактов':>10s} "
+             f"{'команд/с':>12s}  верно"]
+    for row in rows:
+        cycles = f"{row['cycles']:10d}" if row['cycles'] is not None else f"{'':10s}"
+        speed = row['instructions_per_second'] or 0
+        lines.append(f"{row['program']:38s} {row['engine']:12s} {row['size']:4d} {row['steps']:10d} "
+                     f"{cycles} {speed:12.0f}  {'да' if row['correct'] else 'нет'}")
+    return lines
@@ -0,0 +1,308 @@
+"""
+Точки останова, точки наблюдения за памятью и условные остановы
+Точки останова - множество адресов команд, точки наблюдения - маска на каждую ячейку
+памяти, проверяемая только командами с обращением к памяти. Условия вида
+'mem[100] > 50 and R2 == 3' компилируются один раз в функцию от процессора
+"""
+
+import ast
+from collections import namedtuple
+
+from cache import data_accesses
+from predecode import (
+    predecode, execute_entry,
+    OP_LOAD, OP_STORE, OP_ADD, OP_SUB, OP_CMP, OP_HALT,
+    MODE_DIRECT, MODE_INDIRECT, MODE_REG_INDIRECT, FLAG_BITS,
+)
+
+WATCH_READ = 0x1
+WATCH_WRITE = 0x2
+
+_MEMORY_OPS = (OP_LOAD, OP_STORE, OP_ADD, OP_SUB, OP_CMP)
+_MEMORY_MODES = (MODE_DIRECT, MODE_INDIRECT, MODE_REG_INDIRECT)
+
+# Причина последнего останова: kind - 'breakpoint', 'watch_read', 'watch_write' или
+# 'condition', pc - адрес команды, address - ячейка памяти для точек наблюдения,
+# expression - текст сработавшего условия
+Stop = namedtuple('Stop', ('kind', 'pc', 'address', 'expression'))
+
+# Разрешённые в условиях узлы синтаксического дерева
+_ALLOWED_NODES = (
+    ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub, ast.UAdd,
+    ast.Invert, ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.FloorDiv, ast.Mod, ast.BitAnd,
+    ast.BitOr, ast.BitXor, ast.LShift, ast.RShift, ast.Compare, ast.Eq, ast.NotEq, ast.Lt,
+    ast.LtE, ast.Gt, ast.GtE, ast.Constant, ast.Name, ast.Subscript, ast.Load,
+)
+
+
+class _ConditionCompiler(ast.NodeTransformer):
+    """Замена имён ACC, PC, IR, STEP, R0-R15, ZF/SF/CF/OF и mem[...] на обращения к процессору p"""
+
+    def __init__(self, memory_size=None):
+        self.memory_size = memory_size
+
+    def visit_Name(self, node):
+        name = node.id
+        if name in ('ACC', 'PC', 'IR'):
+            return self._attr(name)
+        if name == 'STEP':
+            return self._attr('step_count')
+        if name == 'mem':
+            return self._attr('memory')
+        if name in FLAG_BITS:
+            # (p.flags_word & бит) != 0
+            return ast.Compare(
+                left=ast.BinOp(left=self._attr('flags_word'), op=ast.BitAnd(),
+                               right=ast.Constant(FLAG_BITS[name])),
+                ops=[ast.NotEq()], comparators=[ast.Constant(0)])
+        if name[0] == 'R' and name[1:].isdigit() and 0 <= int(name[1:]) < 16:
+            return ast.Subscript(value=self._attr('registers'), slice=ast.Constant(int(name[1:])),
+                                 ctx=ast.Load())
+        raise ValueError(f"Неизвестное имя в условии: {name}")
+
+    def visit_Subscript(self, node):
+        if not (isinstance(node.value, ast.Name) and node.value.id == 'mem'):
+            raise ValueError("Индексировать можно только mem")
+        if self.memory_size is not None and not any(isinstance(child, ast.Name)
+                                                    for child in ast.walk(node.slice)):
+            # Постоянный адрес проверяется при компиляции, а не на каждом шаге
+            try:
+                address = eval(compile(ast.fix_missing_locations(ast.Expression(node.slice)),
+                                       '<condition>', 'eval'), {'__builtins__': {}})
+            except ArithmeticError as error:
+                raise ValueError(f"Ошибка в адресе mem[...]: {error}")
+            if not 0 <= address < self.memory_size:
+                raise ValueError(f"Адрес mem[{address}] вне памяти (0-{self.memory_size - 1})")
+        return self.generic_visit(node)
+
+    @staticmethod
+    def _attr(name):
+        return ast.Attribute(value=ast.Name(id='p', ctx=ast.Load()), attr=name, ctx=ast.Load())
+
+
+def compile_condition(text, memory_size=None):
+    """Компиляция условия в функцию condition(processor) -> bool
+
+    memory_size - размер памяти для проверки постоянных адресов mem[...]. Ошибки вычисления
+    (деление на ноль, адрес вне памяти) функция возвращает как ValueError с текстом условия.
+    """
+    try:
+        tree = ast.parse(text.strip(), mode='eval')
+    except SyntaxError:
+        raise ValueError(f"Некорректное условие: {text}")
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED_NODES) or (isinstance(node, ast.Constant)
+                                                     and not isinstance(node.value, int)):
+            raise ValueError(f"Недопустимая конструкция в условии: {text}")
+    body = _ConditionCompiler(memory_size).visit(tree.body)
+    function = ast.Expression(ast.Lambda(
+        args=ast.arguments(posonlyargs=[], args=[ast.arg(arg='p')], kwonlyargs=[],
+                           kw_defaults=[], defaults=[]),
+        body=body))
+    ast.fix_missing_locations(function)
+    evaluate = eval(compile(function, '<condition>', 'eval'), {'__builtins__': {}})
+
+    def condition(processor):
+        try:
+            return evaluate(processor)
+        except (ArithmeticError, IndexError) as error:
+            raise ValueError(f"Не удалось вычислить условие {text.strip()}: {error}") from None
+    return condition
+
+
+class Breakpoints:
+    """Точки останова процессора
+
+    Точка останова срабатывает перед выполнением команды по её адресу (кроме команды,
+    на которой остановил предыдущий run(), чтобы продолжение не останавливалось сразу же).
+    Точка наблюдения и условие без адреса срабатывают после выполнения команды.
+    """
+
+    def __init__(self, memory_size=4096):
+        self.points = {}             # адрес -> (текст условия, функция) или None
+        self.watch = bytearray(memory_size)
+        self.watching = 0            # число ячеек под наблюдением
+        self.conditions = []         # (текст, функция) условий без адреса
+        self.stop = None             # Stop последнего останова или None
+
+    def add(self, pc, condition=None):
+        """Точка останова по адресу pc, с условием - только если оно истинно"""
+        self.points[pc] = ((condition, compile_condition(condition, len(self.watch)))
+                           if condition else None)
+
+    def remove(self, pc):
+        self.points.pop(pc, None)
+
+    def watch_range(self, start, end=None, read=False, write=True):
+        """Наблюдение за ячейками [start, end] (end включительно) на чтение и/или запись"""
+        end = self._check_range(start, end)
+        mask = (WATCH_READ if read else 0) | (WATCH_WRITE if write else 0)
+        for addr in range(start, end + 1):
+            self.watch[addr] |= mask
+        self.watching = sum(1 for flags in self.watch if flags)
+
+    def unwatch_range(self, start, end=None):
+        end = self._check_range(start, end)
+        for addr in range(start, end + 1):
+            self.watch[addr] = 0
+        self.watching = sum(1 for flags in self.watch if flags)
+
+    def _check_range(self, start, end):
+        end = start if end is None else end
+        if not 0 <= start <= end < len(self.watch):
+            raise ValueError(f"Некорректный диапазон наблюдения {start}-{end}: "
+                             f"память 0-{len(self.watch) - 1}")
+        return end
+
+    def add_condition(self, text):
+        """Условие, проверяемое после каждой команды"""
+        self.conditions.append((text, compile_condition(text, len(self.watch))))
+
+    def resume_pc(self):
+        """Адрес ещё не выполненной команды, на которой остановил предыдущий run(), или -1"""
+        stop = self.stop
+        if stop is None or stop.kind not in ('breakpoint', 'condition'):
+            return -1
+        return stop.pc
+
+    def clear(self):
+        self.points.clear()
+        self.watch[:] = bytes(len(self.watch))
+        self.watching = 0
+        self.conditions.clear()
+
+    def __bool__(self):
+        return bool(self.points or self.watching or self.conditions)
+
+    def watch_hit(self, word, memory, registers):
+        """Первое наблюдаемое обращение команды word: (вид, адрес) или None"""
+        for addr, write, _ in data_accesses(word, memory, registers):
+            if self.watch[addr] & (WATCH_WRITE if write else WATCH_READ):
+                return ('watch_write' if write else 'watch_read'), addr
+        return None
+
+    def condition_hit(self, processor):
+        for text, condition in self.conditions:
+            if condition(processor):
+                return text
+        return None
+
+
+def _sync(processor, acc, pc, ir, flag_src, entry_flag_src, step_count):
+    processor.ACC = acc
+    processor.PC = pc
+    processor.IR = ir
+    processor.step_count = step_count
+    if flag_src is not entry_flag_src:
+        processor.update_flags(flag_src)
+
+
+def run_breakpoints(processor, max_steps=10000):
+    """Выполнение до HALT, исчерпания max_steps или срабатывания точки останова
+
+    Причина останова - в processor.breakpoints.stop. Возвращает not processor.halted.
+    Точка останова на первой команде пропускается, только если на ней остановил
+    предыдущий вызов: продолжение с места останова не останавливается сразу же.
+    """
+    bp = processor.breakpoints
+    skip = bp.resume_pc()
+    bp.stop = None
+    if processor._instrumented():
+        return _run_stepping(processor, bp, max_steps, skip)
+    if processor.halted:
+        return False
+
+    mem = processor.memory
+    regs = processor.registers
+    size = len(mem)
+    points = bp.points
+    watch = bp.watch if bp.watching else None
+    conditions = bp.conditions
+
+    acc = processor.ACC
+    pc = processor.PC
+    ir = processor.IR
+    base = processor.step_count
+    # Флаги - по последнему результату АЛУ, как в run_predecoded
+    flag_src = entry_flag_src = 0.0 if processor.flags_word & FLAG_BITS['ZF'] else 1.0
+    halted = False
+    steps = 0
+
+    # Состояние возвращается процессору и при ошибке вычисления условия
+    try:
+        while steps < max_steps:
+            if pc >= size:
+                halted = True
+                break
+            if pc in points and (steps or pc != skip):
+                point = points[pc]
+                if point is None:
+                    bp.stop = Stop('breakpoint', pc, None, None)
+                    break
+                # Условие читает состояние процессора
+                _sync(processor, acc, pc, ir, flag_src, entry_flag_src, base + steps)
+                entry_flag_src = flag_src
+                if point[1](processor):
+                    bp.stop = Stop('condition', pc, None, point[0])
+                    break
+
+            entry = predecode(mem[pc])
+            op = entry[3]
+            hit = None
+            if watch is not None and op in _MEMORY_OPS and entry[2] in _MEMORY_MODES:
+                if entry[2] == MODE_DIRECT:
+                    # Прямая адресация - одна ячейка, без разбора обращений
+                    if watch[entry[1]] & (WATCH_WRITE if op == OP_STORE else WATCH_READ):
+                        hit = ('watch_write' if op == OP_STORE else 'watch_read'), entry[1]
+                else:
+                    hit = bp.watch_hit(entry[4], mem, regs)
+
+            ir = entry[4]
+            next_pc, acc, flag_src, _ = execute_entry(entry, pc, acc, flag_src, mem, regs)
+            steps += 1
+            if op == OP_HALT:
+                halted = True
+                break
+            if hit is not None:
+                bp.stop = Stop(hit[0], pc, hit[1], None)
+                pc = next_pc
+                break
+            pc = next_pc
+            if conditions:
+                _sync(processor, acc, pc, ir, flag_src, entry_flag_src, base + steps)
+                entry_flag_src = flag_src
+                text = bp.condition_hit(processor)
+                if text is not None:
+                    bp.stop = Stop('condition', pc, None, text)
+                    break
+    finally:
+        _sync(processor, acc, pc, ir, flag_src, entry_flag_src, base + steps)
+        processor.halted = halted
+    return not halted
+
+
+def _run_stepping(processor, bp, max_steps, skip=-1):
+    """Точки останова поверх Processor.step() - при подключённых моделях и журнале"""
+    steps = 0
+    while not processor.halted and steps < max_steps:
+        pc = processor.PC
+        if pc in bp.points and (steps or pc != skip):
+            point = bp.points[pc]
+            if point is None or point[1](processor):
+                bp.stop = Stop('breakpoint' if point is None else 'condition', pc, None,
+                               None if point is None else point[0])
+                break
+        hit = None
+        if bp.watching and pc < len(processor.memory):
+            hit = bp.watch_hit(processor.memory[pc], processor.memory, processor.registers)
+        if not processor.step():
+            break
+        steps += 1
+        if hit is not None:
+            bp.stop = Stop(hit[0], pc, hit[1], None)
+            break
+        text = bp.condition_hit(processor)
+        if text is not None:
+            bp.stop = Stop('condition', processor.PC, None, text)
+            break
+    return not processor.halted
@@ -0,0 +1,273 @@
+"""
+Модель множественно-ассоциативного кэша между процессором и памятью
+Кэш не хранит данные - только теги строк: значения всегда читаются из памяти процессора,
+модель считает попадания, промахи, вытеснения и трафик между кэшем и памятью
+"""
+
+import random
+
+from predecode import (
+    decode, OP_LOAD, OP_STORE, OP_ADD, OP_SUB, OP_CMP,
+    MODE_DIRECT, MODE_INDIRECT, MODE_REG_INDIRECT,
+)
+
+POLICIES = ('lru', 'fifo', 'random')
+WRITE_POLICIES = ('write-back', 'write-through')
+
+# Виды обращений: выборка команды и обращения к данным
+ACCESS_FETCH = 'fetch'
+ACCESS_DIRECT = 'direct'
+ACCESS_INDIRECT = 'indirect'
+ACCESS_REG_INDIRECT = 'reg_indirect'
+
+_MODE_ACCESS = {MODE_DIRECT: ACCESS_DIRECT, MODE_INDIRECT: ACCESS_INDIRECT,
+                MODE_REG_INDIRECT: ACCESS_REG_INDIRECT}
+
+
+def data_accesses(word, memory, registers):
+    """Обращения команды word к памяти данных: список (адрес, запись, вид)
+
+    Вычисляется по состоянию до выполнения команды. Для (addr) первым идёт чтение
+    ячейки с адресом, затем обращение к самому операнду.
+    """
+    op, mode, arg = decode(word)
+    if op not in (OP_LOAD, OP_STORE, OP_ADD, OP_SUB, OP_CMP) or mode not in _MODE_ACCESS:
+        return []
+    kind = _MODE_ACCESS[mode]
+    write = op == OP_STORE
+    size = len(memory)
+    if mode == MODE_DIRECT:
+        return [(arg, write, kind)] if arg < size else []
+    if mode == MODE_INDIRECT:
+        addr = memory[arg]
+        accesses = [(arg, False, kind)]
+    else:
+        addr = registers[arg] & 0xFFFF
+        accesses = []
+    if addr < size:
+        accesses.append((addr, write, kind))
+    return accesses
+
+
+class Cache:
+    """Множественно-ассоциативный кэш с настраиваемыми вытеснением и политикой записи
+
+    size и line_size задаются в словах, associativity - число строк в наборе.
+    """
+
+    def __init__(self, size=256, line_size=4, associativity=2, policy='lru',
+                 write_policy='write-back', hit_latency=1, miss_latency=10, seed=0):
+        if policy not in POLICIES:
+            raise ValueError(f"Неизвестная политика вытеснения: {policy}")
+        if write_policy not in WRITE_POLICIES:
+            raise ValueError(f"Неизвестная политика записи: {write_policy}")
+        if size <= 0 or line_size <= 0 or associativity <= 0 or size % (line_size * associativity):
+            raise ValueError("Размер кэша должен делиться на line_size * associativity")
+        self.size = size
+        self.line_size = line_size
+        self.associativity = associativity
+        self.set_count = size // (line_size * associativity)
+        self.policy = policy
+        self.write_policy = write_policy
+        self.hit_latency = hit_latency
+        self.miss_latency = miss_latency
+        self._random = random.Random(seed)
+        self.reset()
+
+    def reset(self):
+        """Очистка кэша и статистики"""
+        # sets[i] - номера строк в наборе i, от давних к недавним (LRU) или по порядку загрузки (FIFO)
+        self.sets = [[] for _ in range(self.set_count)]
+        self.dirty = set()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writebacks = 0          # грязные строки, записанные в память при вытеснении
+        self.memory_reads = 0        # слов прочитано из памяти
+        self.memory_writes = 0       # слов записано в память
+        self.by_kind = {}            # вид обращения -> [попадания, промахи]
+        # В общем кэше команд и данных: строка -> вид последнего обращения к ней и
+        # число вытеснений строк кода обращениями к данным и наоборот
+        self.line_kinds = {}
+        self.conflicts = {'code_by_data': 0, 'data_by_code': 0}
+
+    def access(self, addr, write=False, kind=ACCESS_DIRECT):
+        """Обращение к адресу addr, возвращает True при попадании"""
+        line = addr // self.line_size
+        ways = self.sets[line % self.set_count]
+        stats = self.by_kind.get(kind)
+        if stats is None:
+            stats = self.by_kind[kind] = [0, 0]
+
+        if line in ways:
+            self.hits += 1
+            stats[0] += 1
+            if self.policy == 'lru':
+                ways.remove(line)
+                ways.append(line)
+            self.line_kinds[line] = kind
+            self._write(line, write)
+            return True
+
+        self.misses += 1
+        stats[1] += 1
+        if write and self.write_policy == 'write-through':
+            # Без выделения строки при записи: слово уходит сразу в память
+            self.memory_writes += 1
+            return False
+        self._allocate(line, kind)
+        self._write(line, write)
+        return False
+
+    def contains(self, addr):
+        """Есть ли адрес в кэше (без учёта в статистике)"""
+        line = addr // self.line_size
+        return line in self.sets[line % self.set_count]
+
+    def fill(self, addr, kind=ACCESS_FETCH):
+        """Загрузка строки с адресом addr без учёта обращения (например, из буфера предвыборки)"""
+        line = addr // self.line_size
+        if line not in self.sets[line % self.set_count]:
+            self._allocate(line, kind)
+
+    def _allocate(self, line, kind):
+        ways = self.sets[line % self.set_count]
+        if len(ways) >= self.associativity:
+            victim = ways.pop(self._random.randrange(len(ways)) if self.policy == 'random' else 0)
+            self.evictions += 1
+            if victim in self.dirty:
+                self.dirty.discard(victim)
+                self.writebacks += 1
+                self.memory_writes += self.line_size
+            victim_kind = self.line_kinds.pop(victim, kind)
+            if (victim_kind == ACCESS_FETCH) != (kind == ACCESS_FETCH):
+                self.conflicts['code_by_data' if victim_kind == ACCESS_FETCH else 'data_by_code'] += 1
+        ways.append(line)
+        self.line_kinds[line] = kind
+        self.memory_reads += self.line_size
+
+    def _write(self, line, write):
+        if not write:
+            return
+        if self.write_policy == 'write-back':
+            self.dirty.add(line)
+        else:
+            self.memory_writes += 1
+
+    def access_instruction(self, word, memory, registers):
+        """Обращения команды к данным через кэш, возвращает суммарную задержку в тактах"""
+        cycles = 0
+        for addr, write, kind in data_accesses(word, memory, registers):
+            cycles += self.hit_latency if self.access(addr, write, kind) else self.miss_latency
+        return cycles
+
+    @property
+    def accesses(self):
+        return self.hits + self.misses
+
+    @property
+    def hit_rate(self):
+        return self.hits / self.accesses if self.accesses else 0.0
+
+    def report(self):
+        """Статистика кэша в виде словаря"""
+        return {
+            'config': {'size': self.size, 'line_size': self.line_size,
+                       'associativity': self.associativity, 'policy': self.policy,
+                       'write_policy': self.write_policy},
+            'accesses': self.accesses,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate,
+            'evictions': self.evictions,
+            'writebacks': self.writebacks,
+            'memory_reads': self.memory_reads,
+            'memory_writes': self.memory_writes,
+            'by_kind': {kind: {'hits': hits, 'misses': misses}
+                        for kind, (hits, misses) in self.by_kind.items()},
+            'conflicts': dict(self.conflicts),
+        }
+
+
+class FetchUnit:
+    """Выборка команд через кэш команд с необязательным буфером предвыборки
+
+    При промахе буфер заполняется следующими prefetch строками; промах кэша, попавший
+    в буфер, переносит строку из буфера в кэш и стоит как попадание. Кэш может быть
+    общим с кэшем данных - тогда в его статистике видны конфликты кода и данных.
+    """
+
+    def __init__(self, cache, prefetch=0):
+        self.cache = cache
+        self.prefetch = prefetch
+        self.reset()
+
+    def reset(self):
+        self.buffer = []             # номера строк в буфере предвыборки
+        self.fetches = 0
+        self.hits = 0
+        self.prefetch_hits = 0
+        self.misses_by_block = {}    # начало базового блока -> промахи выборки
+        self._block = None
+        self._last_pc = None
+
+    def fetch(self, pc):
+        """Выборка команды по адресу pc, возвращает задержку в тактах"""
+        cache = self.cache
+        self.fetches += 1
+        if self._last_pc is None or pc != self._last_pc + 1:
+            self._block = pc
+        self._last_pc = pc
+
+        line = pc // cache.line_size
+        if line in self.buffer and not cache.contains(pc):
+            self.buffer.remove(line)
+            cache.fill(pc, ACCESS_FETCH)
+            self.prefetch_hits += 1
+            self.hits += 1
+            return cache.hit_latency
+        if cache.access(pc, False, ACCESS_FETCH):
+            self.hits += 1
+            return cache.hit_latency
+
+        self.misses_by_block[self._block] = self.misses_by_block.get(self._block, 0) + 1
+        if self.prefetch:
+            self.buffer = [line + i for i in range(1, self.prefetch + 1)]
+        return cache.miss_latency
+
+    @property
+    def hit_rate(self):
+        return self.hits / self.fetches if self.fetches else 0.0
+
+    def report(self):
+        """Статистика выборки и кэша команд"""
+        return {
+            'fetches': self.fetches,
+            'hits': self.hits,
+            'hit_rate': self.hit_rate,
+            'prefetch': self.prefetch,
+            'prefetch_hits': self.prefetch_hits,
+            'misses_by_block': {f"{start:04X}": misses
+                                for start, misses in sorted(self.misses_by_block.items())},
+            'cache': self.cache.report(),
+        }
+
+
+def parse_cache_spec(text):
+    """Разбор описания кэша 'размер:строка:ассоциативность[:вытеснение[:запись]]'
+
+    Например '256:4:2:lru:write-back'.
+    """
+    parts = text.split(':')
+    if not 3 <= len(parts) <= 5:
+        raise ValueError(f"Ожидается размер:строка:ассоциативность[:вытеснение[:запись]], получено: {text}")
+    try:
+        size, line_size, associativity = (int(p) for p in parts[:3])
+    except ValueError:
+        raise ValueError(f"Некорректное описание кэша: {text}")
+    options = {}
+    if len(parts) > 3:
+        options['policy'] = parts[3]
+    if len(parts) > 4:
+        options['write_policy'] = parts[4]
+    return Cache(size, line_size, associativity, **options)
@@ -0,0 +1,459 @@
+"""
+Консольный запуск эмулятора без графического интерфейса
+Пример: python -m emulator run programs/variant9_max.asm --data 300:6,12,3,27,9,1,18 --dump 100
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from assembler import Assembler
+from cache import parse_cache_spec
+from pipeline import Pipeline
+from predictor import make_predictor
+from profiler import GROUPINGS, SORT_KEYS
+from processor import Processor, ENGINES
+
+# Пакетное выполнение, тесты производительности, регрессия, фаззинг и объектные файлы
+# импортируются в своих командах: regression и fuzz загружают NumPy, а run и profile
+# должны запускаться за десятки миллисекунд. Значения по умолчанию их параметров
+# подставляются в командах (None в разборе аргументов)
+
+
+def parse_data_segment(text):
+    """Разбор сегмента данных вида 'адрес:v1,v2,...'"""
+    address, sep, values = text.partition(':')
+    if not sep:
+        raise argparse.ArgumentTypeError(f"Ожидается адрес:значения, получено: {text}")
+    try:
+        return int(address), [int(v) for v in values.split(',') if v.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Некорректный сегмент данных: {text}")
+
+
+def parse_dump_range(text):
+    """Разбор адреса или диапазона адресов 'начало-конец' для вывода памяти"""
+    start, sep, end = text.partition('-')
+    try:
+        start = int(start)
+        end = int(end) if sep else start
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Некорректный адрес: {text}")
+    return range(start, end + 1)
+
+
+def resolve_address(text, labels):
+    """Адрес команды: число или метка программы"""
+    if text in labels:
+        return labels[text]
+    try:
+        return int(text, 0)
+    except ValueError:
+        raise ValueError(f"Неизвестная метка или адрес: {text}")
+
+
+def load_object_file(path):
+    """Объектный файл (.emo) как есть, исходный текст - через кэш ассемблирования"""
+    from objfile import OBJECT_SUFFIX, assemble_cached, read_object
+    if path.endswith(OBJECT_SUFFIX):
+        return read_object(path)
+    return assemble_cached(path)
+
+
+def run_program(program, data_segments, max_steps, engine='predecoded', dump=(), timing=False,
+                data_cache=None, fetch_cache=None, prefetch=0, pipeline=None, predictor=None, labels=None,
+                trace=None, trace_capacity=1_000_000, breaks=(), watches=(), conditions=(), detect_loops=False,
+                time_limit=None, max_cycles=None):
+    """Выполнение программы (коды или ObjectFile) на новом процессоре, возвращает словарь с результатами"""
+    processor = Processor(engine=engine)
+    if timing:
+        processor.enable_timing()
+    if data_cache is not None:
+        processor.enable_data_cache(data_cache)
+    if fetch_cache is not None:
+        processor.enable_fetch_cache(fetch_cache, prefetch)
+    if pipeline is not None:
+        processor.enable_pipeline(pipeline)
+    if predictor is not None:
+        processor.enable_branch_predictor(predictor)
+    if trace is not None:
+        processor.enable_trace(trace, trace_capacity)
+    if breaks or watches or conditions:
+        breakpoints = processor.enable_breakpoints()
+        for pc in breaks:
+            breakpoints.add(pc)
+        for cells in watches:
+            breakpoints.watch_range(cells.start, cells.stop - 1)
+        for text in conditions:
+            breakpoints.add_condition(text)
+    if detect_loops:
+        processor.enable_loop_detection()
+    if hasattr(program, 'code'):
+        # objfile.ObjectFile
+        processor.load_object(program)
+    else:
+        processor.load_program(program)
+    for address, values in data_segments:
+        processor.load_data(values, address)
+
+    tracer = processor.tracer
+    try:
+        run = processor.run(max_steps, time_limit, max_cycles)
+    finally:
+        processor.disable_trace()
+    wall_time = run.elapsed
+
+    result = {
+        'halted': processor.halted,
+        'stop_reason': run.reason,
+        'steps': processor.step_count,
+        'wall_time': wall_time,
+        'instructions_per_second': processor.step_count / wall_time if wall_time > 0 else None,
+        'state': processor.get_state(),
+        'memory': {str(addr): processor.memory[addr] for cells in dump for addr in cells
+                   if 0 <= addr < len(processor.memory)},
+    }
+    if timing:
+        result['cycles'] = processor.cycle_count
+        result['cpi'] = processor.cycle_count / processor.step_count if processor.step_count else None
+        result['cycle_breakdown'] = processor.timing.report()
+    if data_cache is not None:
+        result['data_cache'] = data_cache.report()
+    if fetch_cache is not None:
+        result['fetch'] = processor.fetch_unit.report()
+    if pipeline is not None:
+        result['pipeline'] = pipeline.report()
+    if predictor is not None:
+        result['branches'] = processor.branch_predictor.report(labels)
+    if processor.breakpoints is not None:
+        stop = processor.breakpoints.stop
+        result['stop'] = stop._asdict() if stop is not None else None
+    if detect_loops:
+        verdict = processor.loop_detector.verdict
+        result['loop'] = verdict._asdict() if verdict is not None else None
+    if tracer is not None:
+        result['trace'] = {'path': tracer.path, 'records': min(tracer.written, tracer.capacity),
+                           'written': tracer.written}
+    return result
+
+
+def cmd_run(args):
+    program = load_object_file(args.program)
+    labels = program.symbols
+    fetch_cache = args.fetch_cache
+    if args.unified:
+        if args.data_cache is None:
+            raise ValueError("--unified требует --data-cache")
+        fetch_cache = args.data_cache
+    pipeline = None
+    if args.pipeline:
+        pipeline = Pipeline(forwarding=not args.no_forwarding, shared_memory=args.shared_memory)
+    result = run_program(program, args.data, args.max_steps, args.engine, args.dump, args.timing,
+                         args.data_cache, fetch_cache, args.prefetch, pipeline, args.predictor, labels,
+                         args.trace, args.trace_capacity,
+                         [resolve_address(text, labels) for text in args.breaks], args.watches, args.stop_when,
+                         args.detect_loops, args.time_limit, args.max_cycles)
+    result = {'program': args.program, 'engine': args.engine, **result}
+    print(json.dumps(result, ensure_ascii=False, indent=args.indent))
+    return 0
+
+
+def cmd_assemble(args):
+    from objfile import DEFAULT_CACHE_DIR, OBJECT_SUFFIX, assemble_cached, write_object, with_data
+    cache_dir = None if args.no_cache else args.cache_dir or DEFAULT_CACHE_DIR
+    obj = with_data(assemble_cached(args.program, cache_dir), args.data)
+    output = args.output or os.path.splitext(args.program)[0] + OBJECT_SUFFIX
+    write_object(output, obj)
+    print(json.dumps({'program': args.program, 'output': output, 'words': len(obj.code),
+                      'data_segments': len(obj.data), 'symbols': len(obj.symbols),
+                      'bytes': os.path.getsize(output)}, ensure_ascii=False))
+    return 0
+
+
+def cmd_cache(args):
+    from objfile import DEFAULT_CACHE_DIR, clear_cache
+    cache_dir = args.cache_dir or DEFAULT_CACHE_DIR
+    removed = clear_cache(cache_dir)
+    print(json.dumps({'cache_dir': cache_dir, 'removed': removed}, ensure_ascii=False))
+    return 0
+
+
+def cmd_profile(args):
+    with open(args.program, 'r', encoding='utf-8') as f:
+        source_code = f.read()
+    assembler = Assembler()
+    instructions = assembler.assemble(source_code)
+    program = [instr['instruction'] for instr in instructions]
+
+    processor = Processor()
+    profiler = processor.enable_profiler()
+    processor.load_program(program)
+    for address, values in args.data:
+        processor.load_data(values, address)
+    processor.run(args.max_steps)
+
+    rows = profiler.report(assembler.labels, program, args.by, args.sort, args.top)
+    print(f"Шагов: {processor.step_count}, остановлен: {processor.halted}")
+    print("\n".join(profiler.format_report(rows)))
+    if not args.no_listing:
+        print()
+        print("\n".join(profiler.annotate(instructions)))
+    return 0
+
+
+def cmd_batch(args):
+    from batch import load_manifest, run_batch
+    jobs = load_manifest(args.manifest)
+    start = time.perf_counter()
+    total_steps = 0
+    for result in run_batch(jobs, args.workers, args.chunksize, not args.unordered, args.engine):
+        total_steps += result.get('steps', 0)
+        print(json.dumps(result, ensure_ascii=False))
+    wall_time = time.perf_counter() - start
+    summary = {'jobs': len(jobs), 'steps': total_steps, 'wall_time': wall_time,
+               'instructions_per_second': total_steps / wall_time if wall_time > 0 else None}
+    print(json.dumps(summary, ensure_ascii=False), file=sys.stderr)
+    return 0
+
+
+def cmd_bench(args):
+    from benchmark import (DEFAULT_SIZES, DEFAULT_MAX_VALUE, DEFAULT_TOLERANCE, DEFAULT_MIN_TIME,
+                           run_benchmarks, measure_assembler, environment, write_json, write_csv, load_results,
+                           compare, format_table)
+    _defaults(args, sizes=list(DEFAULT_SIZES), max_value=DEFAULT_MAX_VALUE, tolerance=DEFAULT_TOLERANCE,
+              min_time=DEFAULT_MIN_TIME)
+    if args.assembler:
+        result = measure_assembler(args.assembler, args.seed, args.repeat)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return 0
+    rows = run_benchmarks(args.families, args.sizes, args.engines, args.repeat, args.seed,
+                          args.max_value, args.timing, min_time=args.min_time)
+    print("\n".join(format_table(rows)))
+    if args.json:
+        write_json(args.json, rows, environment(seed=args.seed, max_value=args.max_value, repeat=args.repeat))
+    if args.csv:
+        write_csv(args.csv, rows)
+    if args.baseline:
+        problems = compare(rows, load_results(args.baseline), args.tolerance)
+        for problem in problems:
+            print(json.dumps(problem, ensure_ascii=False), file=sys.stderr)
+        if problems:
+            print(f"Расхождений с базовым прогоном: {len(problems)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+def cmd_regress(args):
+    from regression import (CHECK_ENGINES, DEFAULT_COUNT, DEFAULT_SEED, DEFAULT_MAX_STEPS,
+                            update_golden, check_golden, format_failure)
+    _defaults(args, count=DEFAULT_COUNT, seed=DEFAULT_SEED, max_steps=DEFAULT_MAX_STEPS,
+              engines=list(CHECK_ENGINES))
+    _check_engines(args.engines, CHECK_ENGINES)
+    if args.update:
+        for path in update_golden(args.programs, args.count, args.seed, args.max_steps, workers=args.workers):
+            print(f"Записан эталон {path}")
+        return 0
+    checked, failures = check_golden(args.programs, args.engines, args.trace, args.fail_fast,
+                                     workers=args.workers)
+    for failure in failures:
+        print("\n".join(format_failure(failure)))
+    print(f"Проверено наборов: {checked}, расхождений: {len(failures)}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+FINDING_KINDS = ('crash', 'divergence', 'roundtrip', 'encode')
+
+
+def _defaults(args, **defaults):
+    """Подстановка значений по умолчанию из модуля команды для параметров, не заданных явно"""
+    for name, value in defaults.items():
+        if getattr(args, name) is None:
+            setattr(args, name, value)
+
+
+def _check_engines(engines, known):
+    for engine in engines:
+        if engine not in known:
+            raise ValueError(f"Неизвестный движок: {engine} (доступны: {', '.join(known)})")
+
+
+def cmd_fuzz(args):
+    from fuzz import (DEFAULT_ITERATIONS, DEFAULT_LENGTH, DEFAULT_INVALID_RATIO,
+                      fuzz, replay, write_reproducer, format_finding)
+    from regression import CHECK_ENGINES
+    _defaults(args, iterations=DEFAULT_ITERATIONS, length=DEFAULT_LENGTH, invalid_ratio=DEFAULT_INVALID_RATIO,
+              engines=list(CHECK_ENGINES))
+    _check_engines(args.engines, CHECK_ENGINES)
+    if args.replay:
+        failing = 0
+        for path in args.replay:
+            found = replay(path)
+            failing += bool(found)
+            print(f"{path}: {'воспроизводится' if found else 'не воспроизводится'}")
+        return 1 if failing else 0
+
+    unique = fuzz(args.iterations, args.seed, args.engines, args.max_steps, args.length,
+                  args.invalid_ratio, args.workers)
+    reported = 0
+    for finding, count in unique.values():
+        if finding['kind'] in args.ignore:
+            continue
+        reported += 1
+        print("\n".join(format_finding(finding, count)))
+        if args.out:
+            print(f"  сохранено: {write_reproducer(finding, args.out)}")
+    print(f"Итераций: {args.iterations}, находок: {reported}", file=sys.stderr)
+    return 1 if reported else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='emulator', description="Эмулятор процессора - Вариант №9")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="ассемблировать и выполнить программу")
+    run_parser.add_argument('program', help="файл с программой на ассемблере")
+    run_parser.add_argument('--data', action='append', default=[], type=parse_data_segment,
+                            metavar='ADDR:V1,V2,...', help="загрузить значения в память начиная с адреса")
+    run_parser.add_argument('--dump', action='append', default=[], type=parse_dump_range,
+                            metavar='ADDR[-ADDR]', help="вывести ячейки памяти после выполнения")
+    run_parser.add_argument('--max-steps', type=int, default=10000, help="ограничение числа шагов")
+    run_parser.add_argument('--time-limit', type=float, default=None, help="ограничение времени выполнения, с")
+    run_parser.add_argument('--max-cycles', type=int, default=None,
+                            help="ограничение числа тактов модели времени (вместе с --timing)")
+    run_parser.add_argument('--engine', choices=ENGINES, default='predecoded', help="движок выполнения")
+    run_parser.add_argument('--timing', action='store_true', help="считать такты по модели времени (timing.py)")
+    run_parser.add_argument('--data-cache', type=parse_cache_spec, default=None,
+                            metavar='SIZE:LINE:WAYS[:POLICY[:WRITE]]',
+                            help="кэш данных, например 256:4:2:lru:write-back")
+    run_parser.add_argument('--fetch-cache', type=parse_cache_spec, default=None,
+                            metavar='SIZE:LINE:WAYS[:POLICY]', help="кэш команд, формат как у --data-cache")
+    run_parser.add_argument('--prefetch', type=int, default=0, help="строк в буфере предвыборки команд")
+    run_parser.add_argument('--unified', action='store_true', help="общий кэш команд и данных (--data-cache)")
+    run_parser.add_argument('--pipeline', action='store_true', help="модель конвейера IF/ID/EX/MEM/WB")
+    run_parser.add_argument('--no-forwarding', action='store_true', help="конвейер без проброса результатов")
+    run_parser.add_argument('--shared-memory', action='store_true',
+                            help="выборка команд и MEM конвейера через один порт памяти")
+    run_parser.add_argument('--predictor', type=make_predictor, default=None, metavar='SPEC',
+                            help="предсказатель JZ/JNZ: never, always, btfn, 1bit[:N], 2bit[:N], gshare[:H[:N]]")
+    run_parser.add_argument('--trace', default=None, metavar='PATH',
+                            help="записать двоичную трассу выполнения в файл (tracing.py)")
+    run_parser.add_argument('--trace-capacity', type=int, default=1_000_000,
+                            help="записей в кольцевом буфере трассы")
+    run_parser.add_argument('--break', dest='breaks', action='append', default=[], metavar='PC|LABEL',
+                            help="остановиться перед командой по адресу или метке")
+    run_parser.add_argument('--watch', dest='watches', action='append', default=[], type=parse_dump_range,
+                            metavar='ADDR[-ADDR]', help="остановиться после записи в ячейки")
+    run_parser.add_argument('--stop-when', action='append', default=[], metavar='EXPR',
+                            help="остановиться, когда условие истинно, например 'mem[100] > 50 and R2 == 3'")
+    run_parser.add_argument('--detect-loops', action='store_true',
+                            help="остановиться при доказанном зацикливании (повтор состояния)")
+    run_parser.add_argument('--indent', type=int, default=None, help="отступ в выводе JSON")
+    run_parser.set_defaults(handler=cmd_run)
+
+    assemble_parser = commands.add_parser('assemble', help="ассемблировать программу в объектный файл")
+    assemble_parser.add_argument('program', help="файл с программой на ассемблере")
+    assemble_parser.add_argument('-o', '--output', default=None,
+                                 help="объектный файл (по умолчанию - имя программы с .emo)")
+    assemble_parser.add_argument('--data', action='append', default=[], type=parse_data_segment,
+                                 metavar='ADDR:V1,V2,...', help="сегмент данных в объектном файле")
+    assemble_parser.add_argument('--cache-dir', default=None,
+                                 help="каталог кэша (по умолчанию EMULATOR_CACHE или ~/.cache/emulator)")
+    assemble_parser.add_argument('--no-cache', action='store_true', help="ассемблировать без кэша")
+    assemble_parser.set_defaults(handler=cmd_assemble)
+
+    cache_parser = commands.add_parser('cache', help="управление кэшем ассемблирования")
+    cache_parser.add_argument('action', choices=('clear',), help="clear - удалить объектные файлы кэша")
+    cache_parser.add_argument('--cache-dir', default=None,
+                              help="каталог кэша (по умолчанию EMULATOR_CACHE или ~/.cache/emulator)")
+    cache_parser.set_defaults(handler=cmd_cache)
+
+    profile_parser = commands.add_parser('profile', help="выполнить программу с профилировщиком")
+    profile_parser.add_argument('program', help="файл с программой на ассемблере")
+    profile_parser.add_argument('--data', action='append', default=[], type=parse_data_segment,
+                                metavar='ADDR:V1,V2,...', help="загрузить значения в память начиная с адреса")
+    profile_parser.add_argument('--max-steps', type=int, default=10000, help="ограничение числа шагов")
+    profile_parser.add_argument('--by', choices=GROUPINGS, default='label', help="группировка отчёта")
+    profile_parser.add_argument('--sort', choices=SORT_KEYS, default='steps', help="порядок строк отчёта")
+    profile_parser.add_argument('--top', type=int, default=None, help="показать только N первых строк")
+    profile_parser.add_argument('--no-listing', action='store_true', help="не выводить листинг со счётчиками")
+    profile_parser.set_defaults(handler=cmd_profile)
+
+    batch_parser = commands.add_parser('batch', help="выполнить задания из манифеста на пуле процессов")
+    batch_parser.add_argument('manifest', help="JSON-массив или JSON Lines с заданиями")
+    batch_parser.add_argument('--workers', type=int, default=None, help="число процессов (по умолчанию - число ядер)")
+    batch_parser.add_argument('--chunksize', type=int, default=None, help="заданий в одной пачке")
+    batch_parser.add_argument('--unordered', action='store_true', help="выводить результаты по мере готовности")
+    batch_parser.add_argument('--engine', choices=ENGINES, default='jit', help="движок выполнения")
+    batch_parser.set_defaults(handler=cmd_batch)
+
+    bench_parser = commands.add_parser('bench', help="тесты производительности программ programs/ на всех движках")
+    bench_parser.add_argument('--families', nargs='+', default=None,
+                              help="семейства программ benchmark.FAMILIES (по умолчанию все)")
+    bench_parser.add_argument('--sizes', nargs='+', type=int, default=None,
+                              help="размеры массивов (по умолчанию 6 19)")
+    bench_parser.add_argument('--engines', nargs='+', choices=ENGINES, default=list(ENGINES), help="движки")
+    bench_parser.add_argument('--repeat', type=int, default=3, help="повторов, учитывается лучшее время")
+    bench_parser.add_argument('--min-time', type=float, default=None,
+                              help="повторять короткие программы, пока суммарное время меньше, с")
+    bench_parser.add_argument('--seed', type=int, default=0, help="зерно генератора входных данных")
+    bench_parser.add_argument('--max-value', type=int, default=None, help="наибольшее значение элемента")
+    bench_parser.add_argument('--timing', action='store_true', help="считать такты по модели времени")
+    bench_parser.add_argument('--json', default=None, metavar='PATH', help="сохранить результаты в JSON")
+    bench_parser.add_argument('--csv', default=None, metavar='PATH', help="сохранить результаты в CSV")
+    bench_parser.add_argument('--baseline', default=None, metavar='PATH',
+                              help="сравнить с базовым прогоном (JSON из --json), код 1 при регрессии")
+    bench_parser.add_argument('--tolerance', type=float, default=None,
+                              help="допустимое замедление относительно базового прогона (доля)")
+    bench_parser.add_argument('--assembler', type=int, default=None, metavar='LINES',
+                              help="вместо программ измерить ассемблер на сгенерированном тексте из LINES строк")
+    bench_parser.set_defaults(handler=cmd_bench)
+
+    regress_parser = commands.add_parser('regress', help="сравнение всех движков с эталонными результатами golden/")
+    regress_parser.add_argument('programs', nargs='*', help="имена программ без .asm (по умолчанию все programs/)")
+    regress_parser.add_argument('--update', action='store_true',
+                                help="перезаписать эталоны результатами эталонного интерпретатора")
+    regress_parser.add_argument('--engines', nargs='+', default=None,
+                                help="проверяемые движки (по умолчанию все и lockstep)")
+    regress_parser.add_argument('--trace', action='store_true',
+                                help="пошагово сравнивать каждый движок с интерпретатором на всех наборах")
+    regress_parser.add_argument('--fail-fast', action='store_true', help="остановиться на первом расхождении")
+    regress_parser.add_argument('--workers', type=int, default=None, help="число процессов (по умолчанию - число ядер)")
+    regress_parser.add_argument('--count', type=int, default=None, help="наборов данных на программу (--update)")
+    regress_parser.add_argument('--seed', type=int, default=None, help="зерно генератора данных (--update)")
+    regress_parser.add_argument('--max-steps', type=int, default=None,
+                                help="ограничение числа шагов (--update)")
+    regress_parser.set_defaults(handler=cmd_regress)
+
+    fuzz_parser = commands.add_parser('fuzz', help="случайные программы на всех движках и проверка ассемблера")
+    fuzz_parser.add_argument('--iterations', type=int, default=None, help="число случайных программ")
+    fuzz_parser.add_argument('--seed', type=int, default=0, help="зерно первой итерации")
+    fuzz_parser.add_argument('--workers', type=int, default=None, help="число процессов (по умолчанию - число ядер)")
+    fuzz_parser.add_argument('--engines', nargs='+', default=None,
+                             help="проверяемые движки (по умолчанию все и lockstep)")
+    fuzz_parser.add_argument('--max-steps', type=int, default=2000, help="ограничение числа шагов программы")
+    fuzz_parser.add_argument('--length', type=int, default=None, help="команд в программе")
+    fuzz_parser.add_argument('--invalid-ratio', type=float, default=None,
+                             help="доля программ из произвольных слов")
+    fuzz_parser.add_argument('--ignore', action='append', default=[], choices=FINDING_KINDS,
+                             help="не сообщать о находках этого вида")
+    fuzz_parser.add_argument('--out', default=None, metavar='DIR', help="сохранить воспроизводящие примеры в JSON")
+    fuzz_parser.add_argument('--replay', nargs='+', default=None, metavar='FILE',
+                             help="повторно проверить сохранённые примеры")
+    fuzz_parser.set_defaults(handler=cmd_fuzz)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.handler(args)
+    except (OSError, ValueError) as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
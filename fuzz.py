@@ -0,0 +1,397 @@
+"""
+Случайное тестирование эмулятора и ассемблера
+Каждая итерация строит случайную программу - корректный исходный текст или произвольные
+16-битные слова (неизвестные коды операций, операнды вне диапазонов) - и выполняет её всеми
+движками: целиком и порциями по несколько шагов. Итоговое состояние сравнивается с эталонным
+интерпретатором. Дополнительно проверяются дизассемблирование -> ассемблирование -> кодирование
+каждого слова и кодирование случайных строк ассемблера. Падения и расхождения уменьшаются
+дельта-отладкой до небольших воспроизводящих примеров
+"""
+
+import hashlib
+import json
+import os
+import random
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+from assembler import Assembler
+from predecode import (
+    decode,
+    OP_LOAD, OP_STORE, OP_ADD, OP_SUB, OP_CMP, OP_JMP, OP_JZ, OP_JNZ, OP_HALT, OP_NOP,
+    MODE_DIRECT, MODE_IMMEDIATE, MODE_INDIRECT, MODE_REGISTER, MODE_REG_INDIRECT, MODE_ZERO, MODE_NONE,
+)
+from processor import Processor
+from regression import CHECK_ENGINES, _Machine, diff_snapshots
+
+DEFAULT_ITERATIONS = 1000
+DEFAULT_MAX_STEPS = 2000
+DEFAULT_LENGTH = 32
+DEFAULT_INVALID_RATIO = 0.3
+LINES_PER_ITERATION = 8
+
+# Порции выполнения по очереди: продолжение run() с середины блока, цикла, бюджета
+CHUNK_SIZES = (1, 3, 17, 250, 4096)
+
+DATA_ADDRESS = 128
+DATA_SIZE = 32
+
+# Способы адресации, которые движки действительно выполняют (decode): команда -> способы
+SUPPORTED_MODES = {
+    'LOAD': ('direct', 'indirect', 'immediate', 'register', 'reg_indirect'),
+    'STORE': ('direct', 'indirect', 'register', 'reg_indirect'),
+    'ADD': ('direct', 'indirect', 'immediate', 'register'),
+    'SUB': ('direct', 'indirect', 'immediate', 'register'),
+    'CMP': ('direct', 'indirect', 'immediate', 'register'),
+}
+
+# Допустимые значения операнда по документации: способ -> граница (не включительно)
+OPERAND_LIMITS = {'direct': 256, 'indirect': 256, 'immediate': 512, 'register': 16,
+                  'reg_indirect': 16}
+# Адрес перехода - все 12 бит операнда
+
+JUMP_LIMIT = 4096
+
+_MODES = {'direct': MODE_DIRECT, 'indirect': MODE_INDIRECT, 'immediate': MODE_IMMEDIATE,
+          'register': MODE_REGISTER, 'reg_indirect': MODE_REG_INDIRECT}
+_OPS = {'LOAD': OP_LOAD, 'STORE': OP_STORE, 'ADD': OP_ADD, 'SUB': OP_SUB, 'CMP': OP_CMP,
+        'JMP': OP_JMP, 'JZ': OP_JZ, 'JNZ': OP_JNZ}
+_MODE_NAMES = {mode: name for name, mode in _MODES.items()}
+_MNEMONICS = {op: name for name, op in _OPS.items()}
+_JUMPS = ('JMP', 'JZ', 'JNZ')
+
+# Значения операнда у границ диапазонов кодирования - в них чаще всего ошибки
+_BOUNDARIES = (0, 1, 15, 16, 255, 256, 511, 512, 1023, 1024, 1039, 1040, 1055, 1056, 4095, 4096)
+
+
+def format_operand(operand_type, value):
+    """Текст операнда ассемблера"""
+    if operand_type == 'immediate':
+        return f"#{value}"
+    if operand_type == 'indirect':
+        return f"({value})"
+    if operand_type == 'register':
+        return f"R{value}"
+    if operand_type == 'reg_indirect':
+        return f"(R{value})"
+    return str(value)
+
+
+def random_source(rng, length=DEFAULT_LENGTH):
+    """Корректная программа: только поддерживаемые движками способы адресации и значения операндов"""
+    lines = []
+    for _ in range(length):
+        mnemonic = rng.choice(('LOAD', 'LOAD', 'STORE', 'ADD', 'SUB', 'CMP', 'JMP', 'JZ', 'JNZ', 'HALT'))
+        if mnemonic == 'HALT':
+            lines.append('HALT')
+        elif mnemonic in _JUMPS:
+            lines.append(f"{mnemonic} {rng.randrange(length + 4)}")
+        else:
+            operand_type = rng.choice(SUPPORTED_MODES[mnemonic])
+            lines.append(f"{mnemonic} {format_operand(operand_type, rng.randrange(OPERAND_LIMITS[operand_type]))}")
+    return '\n'.join(lines)
+
+
+def random_words(rng, length=DEFAULT_LENGTH):
+    """Произвольные слова: любые коды операций 0-15 и операнды, часто у границ диапазонов"""
+    words = []
+    for _ in range(length):
+        operand = rng.choice(_BOUNDARIES[:-1]) if rng.random() < 0.3 else rng.randrange(4096)
+        words.append((rng.randrange(16) << 12) | operand)
+    return words
+
+
+def random_data(rng):
+    return {DATA_ADDRESS: [rng.randrange(0x10000) for _ in range(DATA_SIZE)]}
+
+
+def random_line(rng):
+    """Случайная строка ассемблера с любым способом адресации и значением: (команда, способ, значение)"""
+    mnemonic = rng.choice(tuple(_OPS))
+    operand_type = rng.choice(tuple(_MODES))
+    value = rng.choice(_BOUNDARIES) if rng.random() < 0.5 else rng.randrange(4200)
+    return mnemonic, operand_type, value
+
+
+def describe_word(word):
+    """Как движки выполняют слово (по decode), в синтаксисе ассемблера"""
+    op, mode, arg = decode(word)
+    if op == OP_NOP:
+        return f"нет операции (код {word >> 12})"
+    if op == OP_HALT:
+        return 'HALT'
+    mnemonic = _MNEMONICS[op]
+    if mode == MODE_NONE:
+        return f"{mnemonic} {arg}"
+    if mode == MODE_ZERO:
+        return f"{mnemonic} <операнд 0>"
+    return f"{mnemonic} {format_operand(_MODE_NAMES[mode], arg)}"
+
+
+def _finding(kind, signature, **fields):
+    return {'kind': kind, 'signature': [kind, *signature], **fields}
+
+
+def _crash(engine, error):
+    frame = traceback.extract_tb(error.__traceback__)[-1]
+    location = f"{os.path.basename(frame.filename)}:{frame.lineno}"
+    return _finding('crash', (engine, type(error).__name__, location), engine=engine,
+                    error=f"{type(error).__name__}: {error}", location=location)
+
+
+def _run(engine, words, data, max_steps, chunked):
+    machine = _Machine(engine, words, data)
+    if not chunked:
+        machine.run(max_steps)
+    else:
+        done = i = 0
+        while done < max_steps:
+            chunk = min(CHUNK_SIZES[i % len(CHUNK_SIZES)], max_steps - done)
+            machine.run(chunk)
+            done += chunk
+            i += 1
+    return machine.snapshot()
+
+
+def check_engines(words, data, engines=CHECK_ENGINES, max_steps=DEFAULT_MAX_STEPS):
+    """Выполнение программы движками целиком и порциями CHUNK_SIZES, список находок
+
+    Находка 'crash' - исключение движка, 'divergence' - итоговое состояние отличается
+    от состояния эталонного интерпретатора после того же числа шагов.
+    """
+    try:
+        expected = _run('interpreter', words, data, max_steps, False)
+    except Exception as e:
+        return [_crash('interpreter', e)]
+
+    findings = []
+    for engine in engines:
+        for chunked in (False, True):
+            if engine == 'interpreter' and not chunked:
+                continue
+            try:
+                actual = _run(engine, words, data, max_steps, chunked)
+            except Exception as e:
+                findings.append(_crash(engine, e))
+                continue
+            if actual != expected:
+                differences = diff_snapshots(expected, actual)
+                fields = sorted({field.split('[')[0].rstrip('0123456789') for field, _, _ in differences})
+                findings.append(_finding('divergence', (engine, chunked, *fields), engine=engine,
+                                         chunked=chunked, differences=differences))
+    return findings
+
+
+def _disassembler():
+    global _DISASSEMBLER
+    if _DISASSEMBLER is None:
+        _DISASSEMBLER = Processor()
+    return _DISASSEMBLER
+
+
+_DISASSEMBLER = None
+
+
+def check_roundtrip(words):
+    """Дизассемблирование -> ассемблирование -> кодирование должно сохранять смысл каждого слова
+
+    Слова с неизвестным кодом операции (9-15) мнемоники не имеют и пропускаются.
+    """
+    findings = []
+    for word in sorted(set(words)):
+        text = _disassembler().disassemble_instruction(word)
+        if text.startswith('UNKNOWN'):
+            continue
+        try:
+            encoded = Assembler().parse_line(text)['instruction']
+        except ValueError as e:
+            findings.append(_finding('roundtrip', (word >> 12, 'error'), word=word, text=text, error=str(e)))
+            continue
+        if decode(encoded) != decode(word):
+            findings.append(_finding('roundtrip', (word >> 12, 'decode'), word=word, text=text,
+                                     encoded=encoded, expected=decode(word), decoded=decode(encoded)))
+    return findings
+
+
+def _encode_signature(mnemonic, operand_type, value):
+    """Признак находки кодирования строки или None, если строка кодируется верно или отвергается"""
+    text = f"{mnemonic} {format_operand(operand_type, value)}"
+    try:
+        word = Assembler().parse_line(text)['instruction']
+    except ValueError:
+        return None
+    if mnemonic in _JUMPS:
+        expected = (_OPS[mnemonic], MODE_NONE, value)
+    else:
+        expected = (_OPS[mnemonic], _MODES[operand_type], value)
+    if decode(word) == expected:
+        return None
+    # Один признак на класс ошибки: переход с адресацией, отличной от прямой; значение
+    # вне диапазона способа адресации; команда, не поддерживающая способ адресации
+    if mnemonic in _JUMPS and operand_type != 'direct':
+        return ('jump', operand_type)
+    if value >= (JUMP_LIMIT if mnemonic in _JUMPS else OPERAND_LIMITS[operand_type]):
+        return ('range', operand_type)
+    return (mnemonic, operand_type)
+
+
+def check_encode(mnemonic, operand_type, value):
+    """Строка ассемблера должна кодироваться в слово, которое движки выполняют так, как она написана
+
+    Находка уменьшается до наименьшего значения операнда с тем же признаком.
+    """
+    signature = _encode_signature(mnemonic, operand_type, value)
+    if signature is None:
+        return []
+    value = next(v for v in range(value + 1) if _encode_signature(mnemonic, operand_type, v) == signature)
+    text = f"{mnemonic} {format_operand(operand_type, value)}"
+    word = Assembler().parse_line(text)['instruction']
+    return [_finding('encode', signature, mnemonic=mnemonic, operand_type=operand_type, value=value,
+                     text=text, word=word, decoded=describe_word(word))]
+
+
+def minimize(items, still_fails):
+    """Дельта-отладка (ddmin): уменьшение списка, пока still_fails(список) истинно"""
+    n = 2
+    while len(items) >= 2:
+        chunk = -(-len(items) // n)
+        for start in range(0, len(items), chunk):
+            candidate = items[:start] + items[start + chunk:]
+            if still_fails(candidate):
+                items = candidate
+                n = max(n - 1, 2)
+                break
+        else:
+            if n >= len(items):
+                break
+            n = min(len(items), n * 2)
+    return items
+
+
+def minimize_engine_finding(finding, words, data, max_steps):
+    """Наименьшие программа, данные и бюджет шагов, на которых находка воспроизводится"""
+    engines = (finding['engine'],)
+    signature = finding['signature']
+
+    def still_fails(words, data=data, max_steps=max_steps):
+        return any(f['signature'] == signature for f in check_engines(words, data, engines, max_steps))
+
+    if data and still_fails(words, {}):
+        data = {}
+    words = minimize(words, lambda candidate: still_fails(candidate, data))
+    # Наименьший бюджет шагов - двоичным поиском (расхождение обычно сохраняется с ростом бюджета)
+    low, high = 1, max_steps
+    while low < high:
+        middle = (low + high) // 2
+        if still_fails(words, data, middle):
+            high = middle
+        else:
+            low = middle + 1
+    if still_fails(words, data, low):
+        max_steps = low
+    for f in check_engines(words, data, engines, max_steps):
+        if f['signature'] == signature:
+            finding = f
+    return {**finding, 'words': words, 'data': data, 'max_steps': max_steps}
+
+
+def fuzz_iteration(task):
+    """Одна итерация: программа по зерну, все проверки, уменьшение найденного"""
+    seed, engines, max_steps, length, invalid_ratio = task
+    rng = random.Random(seed)
+    if rng.random() < invalid_ratio:
+        source = None
+        words = random_words(rng, length)
+    else:
+        source = random_source(rng, length)
+        words = [instr['instruction'] for instr in Assembler().assemble(source)]
+    data = random_data(rng)
+
+    findings = []
+    for finding in check_engines(words, data, engines, max_steps):
+        findings.append(minimize_engine_finding(finding, words, data, max_steps))
+    findings.extend(check_roundtrip(words))
+    for _ in range(LINES_PER_ITERATION):
+        findings.extend(check_encode(*random_line(rng)))
+    for finding in findings:
+        finding['seed'] = seed
+    return findings
+
+
+def fuzz(iterations=DEFAULT_ITERATIONS, seed=0, engines=CHECK_ENGINES, max_steps=DEFAULT_MAX_STEPS,
+         length=DEFAULT_LENGTH, invalid_ratio=DEFAULT_INVALID_RATIO, workers=None):
+    """Итерации seed .. seed + iterations - 1 на пуле процессов
+
+    Возвращает словарь: признак находки -> (первая находка с этим признаком, число повторов).
+    Находки с одинаковым признаком (вид, движок, исключение и место или различающиеся поля)
+    считаются одной ошибкой.
+    """
+    tasks = [(s, tuple(engines), max_steps, length, invalid_ratio) for s in range(seed, seed + iterations)]
+    unique = {}
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        for findings in executor.map(fuzz_iteration, tasks, chunksize=max(1, iterations // 64)):
+            for finding in findings:
+                key = json.dumps(finding['signature'])
+                if key in unique:
+                    unique[key] = (unique[key][0], unique[key][1] + 1)
+                else:
+                    unique[key] = (finding, 1)
+    return unique
+
+
+def listing(words):
+    """Дизассемблированный текст программы по адресам"""
+    return [f"{addr:04X}: {word:04X}  {_disassembler().disassemble_instruction(word)}"
+            for addr, word in enumerate(words)]
+
+
+def write_reproducer(finding, directory):
+    """Сохранение находки в directory/<вид>-<хеш признака>.json, возвращает путь"""
+    os.makedirs(directory, exist_ok=True)
+    digest = hashlib.sha1(json.dumps(finding['signature']).encode()).hexdigest()[:10]
+    path = os.path.join(directory, f"{finding['kind']}-{digest}.json")
+    record = dict(finding)
+    if 'words' in record:
+        record['listing'] = listing(record['words'])
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(record, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def replay(path):
+    """Повторная проверка сохранённой находки, возвращает находки с тем же признаком"""
+    with open(path, 'r', encoding='utf-8') as f:
+        finding = json.load(f)
+    kind = finding['kind']
+    if kind in ('crash', 'divergence'):
+        data = {int(address): values for address, values in finding['data'].items()}
+        found = check_engines(finding['words'], data, (finding['engine'],), finding['max_steps'])
+    elif kind == 'roundtrip':
+        found = check_roundtrip([finding['word']])
+    else:
+        found = check_encode(finding['mnemonic'], finding['operand_type'], finding['value'])
+    return [f for f in found if f['signature'] == finding['signature']]
+
+
+def format_finding(finding, count=1):
+    """Краткое описание находки"""
+    kind = finding['kind']
+    if kind == 'crash':
+        head = f"падение {finding['engine']}: {finding['error']} ({finding['location']})"
+    elif kind == 'divergence':
+        mode = "порциями" if finding['chunked'] else "целиком"
+        head = f"расхождение {finding['engine']} ({mode}) с интерпретатором"
+    elif kind == 'roundtrip':
+        head = f"слово {finding['word']:04X} -> '{finding['text']}' -> " + (
+            f"ошибка: {finding['error']}" if 'error' in finding else f"{finding['encoded']:04X}")
+    else:
+        head = (f"'{finding['text']}' кодируется как {finding['word']:04X} "
+                f"и выполняется как '{finding['decoded']}'")
+    lines = [f"[{kind}] {head}" + (f" - повторов: {count}" if count > 1 else "")]
+    if 'words' in finding:
+        lines.append(f"  зерно {finding['seed']}, шагов {finding['max_steps']}, данные: "
+                     f"{'есть' if finding['data'] else 'нет'}")
+        lines.extend(f"    {line}" for line in listing(finding['words']))
+    for field, old, new in finding.get('differences', ()):
+        lines.append(f"    {field:12s} {old} -> {new}")
+    return lines
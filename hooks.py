@@ -0,0 +1,92 @@
+"""
+Точки наблюдения за выполнением: выборка команды, чтение и запись памяти, запись
+регистра, выполненный переход и останов
+Обработчики подключаются через Processor.add_hook(). Пока ни одного обработчика нет,
+Processor.hooks равен None и run() выполняет программу быстрыми движками без проверок
+"""
+
+from cache import data_accesses
+from predecode import decode, OP_STORE, OP_JMP, OP_JZ, OP_JNZ, OP_HALT, MODE_REGISTER, FLAG_ZF
+
+# События и аргументы обработчиков (первый аргумент - процессор):
+#   fetch(processor, pc, word)                  - команда word выбрана по адресу pc
+#   mem_read(processor, addr, value)            - чтение ячейки памяти
+#   mem_write(processor, addr, old, new)        - запись в ячейку памяти
+#   reg_write(processor, reg, old, new)         - запись в регистр R0-R15
+#   branch(processor, pc, target)               - выполненный переход JMP/JZ/JNZ
+#   halt(processor, pc)                         - останов по HALT или выходу PC за пределы памяти
+HOOK_EVENTS = ('fetch', 'mem_read', 'mem_write', 'reg_write', 'branch', 'halt')
+
+
+class Hooks:
+    """Обработчики событий процессора по видам событий"""
+
+    __slots__ = ('fetch', 'mem_read', 'mem_write', 'reg_write', 'branch', 'halt',
+                 '_writes', '_register')
+
+    def __init__(self):
+        for event in HOOK_EVENTS:
+            setattr(self, event, [])
+        self._writes = ()        # (адрес, старое значение) записей текущей команды
+        self._register = None    # (регистр, старое значение) для STORE Rn
+
+    def add(self, event, callback):
+        self._callbacks(event).append(callback)
+
+    def remove(self, event, callback):
+        callbacks = self._callbacks(event)
+        if callback in callbacks:
+            callbacks.remove(callback)
+
+    def _callbacks(self, event):
+        if event not in HOOK_EVENTS:
+            raise ValueError(f"Неизвестное событие: {event}")
+        return getattr(self, event)
+
+    def __bool__(self):
+        return any(getattr(self, event) for event in HOOK_EVENTS)
+
+    def before(self, processor, pc):
+        """События до выполнения команды processor.IR: выборка и чтения памяти"""
+        word = processor.IR
+        for callback in self.fetch:
+            callback(processor, pc, word)
+
+        self._writes = ()
+        self._register = None
+        if self.mem_read or self.mem_write:
+            memory = processor.memory
+            writes = []
+            for addr, write, _ in data_accesses(word, memory, processor.registers):
+                if write:
+                    writes.append((addr, memory[addr]))
+                else:
+                    for callback in self.mem_read:
+                        callback(processor, addr, memory[addr])
+            self._writes = writes
+        if self.reg_write:
+            op, mode, arg = decode(word)
+            if op == OP_STORE and mode == MODE_REGISTER:
+                self._register = (arg, processor.registers[arg])
+
+    def after(self, processor, pc):
+        """События после выполнения команды: записи, переход, останов"""
+        for addr, old in self._writes:
+            new = processor.memory[addr]
+            for callback in self.mem_write:
+                callback(processor, addr, old, new)
+        if self._register is not None:
+            reg, old = self._register
+            new = processor.registers[reg]
+            for callback in self.reg_write:
+                callback(processor, reg, old, new)
+
+        op, _, arg = decode(processor.IR)
+        if op == OP_HALT:
+            for callback in self.halt:
+                callback(processor, pc)
+        elif self.branch and op in (OP_JMP, OP_JZ, OP_JNZ):
+            taken = op == OP_JMP or bool(processor.flags_word & FLAG_ZF) == (op == OP_JZ)
+            if taken:
+                for callback in self.branch:
+                    callback(processor, pc, arg)
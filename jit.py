@@ -0,0 +1,283 @@
+"""
+JIT-компиляция базовых блоков в функции Python
+Базовый блок - последовательность команд от точки входа до первого перехода (JMP/JZ/JNZ) или HALT.
+Холодные блоки выполняются по одной команде, блок, выполненный JIT_THRESHOLD раз,
+компилируется в функцию Python и дальше выполняется целиком за один вызов. Блоки хранятся
+в кэше процесса, так что повторные прогоны программы не разогревают их заново
+"""
+
+from functools import lru_cache
+
+from predecode import (
+    decode, predecode, execute_entry, read_operand, match_multiply_loop, fast_forward,
+    MULTIPLY_LOOP_LENGTH,
+    OP_LOAD, OP_STORE, OP_ADD, OP_SUB, OP_CMP, OP_JMP, OP_JZ, OP_JNZ, OP_HALT,
+    MODE_DIRECT, MODE_IMMEDIATE, MODE_INDIRECT, MODE_REGISTER, MODE_REG_INDIRECT,
+    H_HALT, H_LOAD_DIRECT, H_LOAD_REG,
+)
+
+JIT_THRESHOLD = 16        # сколько раз блок выполняется до компиляции
+MAX_BLOCK_LENGTH = 64     # длинные участки без переходов режутся на несколько блоков
+
+_TERMINATORS = (OP_JMP, OP_JZ, OP_JNZ, OP_HALT)
+
+
+class Block:
+    """Базовый блок, найденный в памяти во время выполнения"""
+
+    __slots__ = ('start', 'end', 'words', 'entries', 'length', 'halts', 'count', 'fn', 'loop')
+
+    def __init__(self, start, words):
+        self.start = start
+        self.end = start + len(words)
+        self.words = words
+        self.entries = [predecode(word) for word in words]
+        self.length = len(words)
+        self.halts = self.entries[-1][3] == OP_HALT
+        self.count = 0
+        self.fn = None
+        self.loop = None      # цикл умножения с заголовком в начале блока, см. match_multiply_loop
+
+
+# Найденные блоки процесса: (адрес, размер памяти) -> Block. Блок со счётчиком выполнений и
+# скомпилированной функцией переживает run(): повторные прогоны той же программы (batch, bench,
+# порции бюджетов run()) не ищут и не разогревают блоки заново. Перед использованием слова
+# блока сверяются с памятью, поэтому другая программа или изменённый код получают новый блок
+_block_cache = {}
+
+
+def cached_block(memory, start):
+    """Базовый блок с адреса start: из кэша процесса, если его слова не менялись"""
+    size = len(memory)
+    blk = _block_cache.get((start, size))
+    if blk is None or tuple(memory[start:blk.end]) != blk.words:
+        blk = _block_cache[(start, size)] = find_block(memory, start)
+    return blk
+
+
+def find_block(memory, start):
+    """Поиск базового блока, начинающегося с адреса start"""
+    size = len(memory)
+    words = []
+    pc = start
+    while pc < size and len(words) < MAX_BLOCK_LENGTH:
+        word = memory[pc]
+        words.append(word)
+        pc += 1
+        if decode(word)[0] in _TERMINATORS:
+            break
+    block = Block(start, tuple(words))
+    if block.entries[0][0] in (H_LOAD_DIRECT, H_LOAD_REG):
+        block.loop = match_multiply_loop(memory, start)
+    return block
+
+
+def _value_expr(lines, mode, arg, size):
+    """Выражение для значения операнда LOAD/ADD/SUB/CMP"""
+    if mode == MODE_DIRECT:
+        return f"mem[{arg}]"
+    if mode == MODE_IMMEDIATE:
+        return str(arg)
+    if mode == MODE_REGISTER:
+        return f"(regs[{arg}] & 0xFFFF)"
+    if mode == MODE_INDIRECT:
+        lines.append(f"    a = mem[{arg}]")
+        return f"(mem[a] if a < {size} else 0)"
+    if mode == MODE_REG_INDIRECT:
+        lines.append(f"    a = regs[{arg}] & 0xFFFF")
+        return f"(mem[a] if a < {size} else 0)"
+    return "0"
+
+
+def block_source(start, words, size):
+    """Исходный код функции Python для базового блока
+
+    Функция получает (mem, regs, owner, invalidate, acc, flag_src) и возвращает
+    (pc, acc, flag_src, число выполненных команд). Запись в ячейку, занятую
+    найденным блоком, вызывает invalidate(addr) и досрочно завершает блок.
+    """
+    lines = ["def block(mem, regs, owner, invalidate, acc, flag_src):"]
+    # Флаги после LOAD/ADD/SUB вычисляются по ACC, поэтому отдельное
+    # присваивание flag_src нужно только для CMP
+    flag = "flag_src"
+    pc = start
+
+    for count, word in enumerate(words, 1):
+        op, mode, arg = decode(word)
+        next_pc = pc + 1
+
+        if op == OP_LOAD:
+            if mode == MODE_IMMEDIATE:
+                lines.append(f"    acc = {arg}")
+            else:
+                lines.append(f"    acc = {_value_expr(lines, mode, arg, size)} & 0xFFFF")
+            flag = "acc"
+        elif op == OP_ADD:
+            lines.append(f"    acc = (acc + {_value_expr(lines, mode, arg, size)}) & 0xFFFF")
+            flag = "acc"
+        elif op == OP_SUB:
+            lines.append(f"    acc = (acc - {_value_expr(lines, mode, arg, size)}) & 0xFFFF")
+            flag = "acc"
+        elif op == OP_CMP:
+            lines.append(f"    flag_src = acc - {_value_expr(lines, mode, arg, size)}")
+            flag = "flag_src"
+        elif op == OP_STORE:
+            exit_line = f"return {next_pc}, acc, {flag}, {count}"
+            if mode == MODE_REGISTER:
+                lines.append(f"    regs[{arg}] = acc & 0xFFFF")
+            elif mode == MODE_DIRECT:
+                lines.append(f"    mem[{arg}] = acc & 0xFFFF")
+                lines.append(f"    if owner[{arg}] is not None:")
+                lines.append(f"        invalidate({arg})")
+                lines.append(f"        {exit_line}")
+            else:
+                if mode == MODE_INDIRECT:
+                    lines.append(f"    a = mem[{arg}]")
+                else:
+                    lines.append(f"    a = regs[{arg}] & 0xFFFF")
+                lines.append(f"    if a < {size}:")
+                lines.append(f"        mem[a] = acc & 0xFFFF")
+                lines.append(f"        if owner[a % {size}] is not None:")
+                lines.append(f"            invalidate(a % {size})")
+                lines.append(f"            {exit_line}")
+        elif op == OP_JMP:
+            lines.append(f"    return {arg}, acc, {flag}, {count}")
+        elif op == OP_JZ:
+            lines.append(f"    return ({arg} if {flag} == 0 else {next_pc}), acc, {flag}, {count}")
+        elif op == OP_JNZ:
+            lines.append(f"    return ({next_pc} if {flag} == 0 else {arg}), acc, {flag}, {count}")
+        elif op == OP_HALT:
+            lines.append(f"    return {pc}, acc, {flag}, {count}")
+        pc = next_pc
+
+    if decode(words[-1])[0] not in _TERMINATORS:
+        lines.append(f"    return {pc}, acc, {flag}, {len(words)}")
+    return "\n".join(lines) + "\n"
+
+
+@lru_cache(maxsize=4096)
+def compile_block(start, words, size):
+    """Компиляция базового блока; результат зависит только от адреса и слов блока"""
+    namespace = {}
+    exec(compile(block_source(start, words, size), f"<block {start:04X}>", "exec"), namespace)
+    return namespace["block"]
+
+
+def run_jit(processor, max_steps=10000, threshold=JIT_THRESHOLD, profile=None):
+    """Выполнение программы с JIT-компиляцией горячих базовых блоков
+
+    Семантика совпадает с Processor.run: те же значения ACC, PC, IR, флагов,
+    регистров, памяти и step_count. Возвращает not processor.halted.
+    profile - Profiler: холодные команды учитываются по адресам, выполнения
+    скомпилированных блоков - одним счётчиком на блок.
+    """
+    if processor.halted:
+        return False
+
+    mem = processor.memory
+    regs = processor.registers
+    size = len(mem)
+    if processor.PC >= size and max_steps > 0:
+        processor.halted = True
+        return False
+
+    # blocks[pc] - блок с точкой входа pc, owner[addr] - блоки, содержащие addr.
+    # Лишний элемент blocks[size] всегда пуст и ловит выход PC за пределы памяти
+    blocks = [None] * (size + 1)
+    owner = [None] * size
+
+    def invalidate(addr):
+        for blk in owner[addr]:
+            if blocks[blk.start] is blk:
+                blocks[blk.start] = None
+            for a in range(blk.start, blk.end):
+                if a != addr:
+                    owner[a].remove(blk)
+                    if not owner[a]:
+                        owner[a] = None
+        owner[addr] = None
+
+    acc = processor.ACC
+    pc = processor.PC
+    ir = processor.IR
+    # Как в run_predecoded: float до первой операции АЛУ, флаги пересчитываются при выходе
+    flag_src = entry_flag_src = 0.0 if processor.flags['ZF'] else 1.0
+    halted = False
+    steps = 0
+    if profile is not None:
+        counts = profile.counts
+        block_runs = profile.block_runs
+
+    while steps < max_steps:
+        blk = blocks[pc]
+        if blk is None:
+            if pc >= size:
+                halted = True
+                break
+            blk = blocks[pc] = cached_block(mem, pc)
+            for a in range(blk.start, blk.end):
+                if owner[a] is None:
+                    owner[a] = [blk]
+                else:
+                    owner[a].append(blk)
+
+        loop = blk.loop
+        if loop is not None:
+            iterations = fast_forward(loop, mem, regs, max_steps - steps)
+            if iterations:
+                acc = flag_src = read_operand(*loop.counter, mem, regs)
+                for mode, addr in (loop.counter, loop.product):
+                    if mode == MODE_DIRECT and owner[addr] is not None:
+                        invalidate(addr)
+                ir = loop.words[-1]
+                steps += iterations * MULTIPLY_LOOP_LENGTH
+                if profile is not None:
+                    for addr in range(loop.start, loop.start + MULTIPLY_LOOP_LENGTH):
+                        counts[addr] += iterations
+                continue
+
+        fn = blk.fn
+        if fn is not None and blk.length <= max_steps - steps:
+            pc, acc, flag_src, n = fn(mem, regs, owner, invalidate, acc, flag_src)
+            steps += n
+            if profile is not None:
+                key = (blk.start, n)
+                block_runs[key] = block_runs.get(key, 0) + 1
+            ir = blk.words[n - 1]
+            if blk.halts and n == blk.length:
+                halted = True
+                break
+            continue
+
+        if fn is None:
+            blk.count += 1
+            if blk.count >= threshold:
+                blk.fn = compile_block(blk.start, blk.words, size)
+                continue
+
+        # Холодный блок (или остаток бюджета меньше блока): по одной команде
+        for entry in blk.entries:
+            if steps >= max_steps:
+                break
+            if profile is not None:
+                counts[pc] += 1
+            pc, acc, flag_src, written = execute_entry(entry, pc, acc, flag_src, mem, regs)
+            ir = entry[4]
+            steps += 1
+            if entry[0] == H_HALT:
+                halted = True
+                break
+            if written >= 0 and owner[written] is not None:
+                invalidate(written)
+                break
+        if halted:
+            break
+
+    processor.ACC = acc
+    processor.PC = pc
+    processor.IR = ir
+    processor.halted = halted
+    processor.step_count += steps
+    if flag_src is not entry_flag_src:
+        processor.update_flags(flag_src)
+    return not halted
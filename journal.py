@@ -0,0 +1,167 @@
+"""
+Журнал выполнения для обратного хода (step_back, run_back_to, goto)
+Перед каждым шагом в кольцевой буфер пишется компактная запись отмены: PC, ACC, IR,
+флаги и старое значение ячейки памяти или регистра, которые изменит STORE.
+Раз в keyframe_interval шагов сохраняется снимок состояния: переход к произвольному
+шагу - поиск ближайшего снимка и повторное выполнение не больше keyframe_interval шагов
+"""
+
+from array import array
+from bisect import bisect_right
+
+from predecode import predecode, run_predecoded, OP_STORE, MODE_DIRECT, MODE_INDIRECT, MODE_REGISTER
+
+DEFAULT_CAPACITY = 1_000_000     # сколько последних шагов можно отменить
+KEYFRAME_INTERVAL = 4096
+
+# Вид записи в слове изменения: старое значение - биты 0-15, адрес - 16-27, вид - 28-29
+_WRITE_NONE = 0
+_WRITE_MEMORY = 1
+_WRITE_REGISTER = 2
+
+
+class Journal:
+    """Кольцевой журнал отмены шагов одного процессора
+
+    История верна, пока состояние процессора меняется только выполнением команд:
+    после load_data(), restore() и т.п. журнал нужно начать заново через start().
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, keyframe_interval=KEYFRAME_INTERVAL):
+        if capacity < 1 or keyframe_interval < 1:
+            raise ValueError("Размер журнала и интервал снимков должны быть положительными")
+        self.capacity = capacity
+        self.keyframe_interval = keyframe_interval
+        # states[i]: PC | ACC << 16 | IR << 32 | флаги << 48 | halted << 52 до шага
+        self.states = array('Q')
+        self.writes = array('L')
+        self.origin = 0    # шаг, с которого начата история (states[0])
+        self.first = 0     # самый ранний шаг, к которому можно вернуться
+        self.end = 0       # шаг, на котором заканчивается записанная история
+        self.keyframe_steps = []
+        self.keyframes = []
+
+    def start(self, processor):
+        """Начало истории с текущего состояния процессора"""
+        del self.states[:]
+        del self.writes[:]
+        self.origin = self.first = self.end = processor.step_count
+        self.keyframe_steps = [processor.step_count]
+        self.keyframes = [processor.snapshot()]
+
+    def __len__(self):
+        return self.end - self.first
+
+    def record(self, processor):
+        """Запись отмены для шага, который processor сейчас выполнит"""
+        step = processor.step_count
+        if step != self.end:
+            self._truncate(step)
+
+        pc = processor.PC
+        _, arg, mode, op, word = predecode(processor.memory[pc])
+        write = _WRITE_NONE << 28
+        if op == OP_STORE:
+            if mode == MODE_REGISTER:
+                write = _WRITE_REGISTER << 28 | arg << 16 | processor.registers[arg]
+            else:
+                memory = processor.memory
+                if mode == MODE_DIRECT:
+                    addr = arg
+                elif mode == MODE_INDIRECT:
+                    addr = memory[arg]
+                else:
+                    addr = processor.registers[arg]
+                if addr < len(memory):
+                    write = _WRITE_MEMORY << 28 | addr << 16 | memory[addr]
+
+        state = (pc | (processor.ACC & 0xFFFF) << 16 | processor.IR << 32
+                 | processor.flags_word << 48 | processor.halted << 52)
+        if len(self.states) < self.capacity:
+            self.states.append(state)
+            self.writes.append(write)
+        else:
+            slot = (step - self.origin) % self.capacity
+            self.states[slot] = state
+            self.writes[slot] = write
+        self.end = step + 1
+
+        if self.end - self.first > self.capacity:
+            self.first = self.end - self.capacity
+            # Снимки старше доступной истории больше не нужны
+            drop = bisect_right(self.keyframe_steps, self.first) - 1
+            if drop > 0:
+                del self.keyframe_steps[:drop]
+                del self.keyframes[:drop]
+        if step % self.keyframe_interval == 0 and self.keyframe_steps[-1] != step:
+            self.keyframe_steps.append(step)
+            self.keyframes.append(processor.snapshot())
+
+    def _truncate(self, step):
+        # Выполнение с шага внутри истории: дальнейшая история больше не верна
+        if not self.first <= step <= self.end:
+            raise ValueError(f"Шаг {step} вне журнала [{self.first}, {self.end}]")
+        if len(self.states) < self.capacity:
+            del self.states[step - self.origin:]
+            del self.writes[step - self.origin:]
+        self.end = step
+        keep = bisect_right(self.keyframe_steps, step)
+        del self.keyframe_steps[keep:]
+        del self.keyframes[keep:]
+
+    def step_back(self, processor):
+        """Отмена последнего шага, False если история закончилась"""
+        step = processor.step_count
+        if step <= self.first or step > self.end:
+            return False
+        slot = (step - 1 - self.origin) % self.capacity
+        state = self.states[slot]
+        write = self.writes[slot]
+
+        kind = write >> 28
+        if kind == _WRITE_MEMORY:
+            processor.memory[(write >> 16) & 0xFFF] = write & 0xFFFF
+        elif kind == _WRITE_REGISTER:
+            processor.registers[(write >> 16) & 0xFFF] = write & 0xFFFF
+        processor.PC = state & 0xFFFF
+        processor.ACC = (state >> 16) & 0xFFFF
+        processor.IR = (state >> 32) & 0xFFFF
+        processor.flags_word = (state >> 48) & 0xF
+        processor.halted = bool(state >> 52)
+        processor.step_count = step - 1
+        return True
+
+    def run_back_to(self, processor, pc):
+        """Обратный ход до ближайшего предыдущего шага с PC == pc"""
+        while self.step_back(processor):
+            if processor.PC == pc:
+                return True
+        return False
+
+    def goto(self, processor, step):
+        """Переход к состоянию перед шагом step
+
+        Назад и вперёд в пределах записанной истории - от ближайшего снимка повторным
+        выполнением, история при этом сохраняется. Дальше конца истории выполнение
+        продолжается с записью в журнал. Возвращает итоговый step_count.
+        """
+        if step < self.first:
+            raise ValueError(f"Шаг {step} уже вытеснен из журнала (самый ранний - {self.first})")
+        if step > self.end:
+            self.goto(processor, self.end)
+            processor.run(step - self.end)
+            return processor.step_count
+
+        current = processor.step_count
+        index = bisect_right(self.keyframe_steps, step) - 1
+        keyframe = self.keyframe_steps[index]
+        if self.first <= current <= self.end and abs(step - current) <= step - keyframe:
+            if step < current:
+                while processor.step_count > step:
+                    self.step_back(processor)
+                return step
+        else:
+            processor.restore(self.keyframes[index])
+        # Повторное выполнение детерминировано и совпадает с записанной историей
+        run_predecoded(processor, step - processor.step_count)
+        return processor.step_count
@@ -0,0 +1,189 @@
+"""
+Векторный движок: одна программа выполняется над N наборами данных в параллельных дорожках
+Состояния N процессоров хранятся в массивах NumPy. На каждом шаге выбирается наименьший PC
+среди активных дорожек, и команда по этому адресу выполняется сразу во всех дорожках,
+где PC совпадает; остальные дорожки ждут. Остановленные дорожки (HALT, выход за пределы
+памяти, исчерпание шагов) маскируются
+"""
+
+from array import array
+
+import numpy as np
+
+from predecode import (
+    decode,
+    OP_LOAD, OP_STORE, OP_ADD, OP_SUB, OP_CMP, OP_JMP, OP_JZ, OP_JNZ, OP_HALT,
+    MODE_DIRECT, MODE_IMMEDIATE, MODE_INDIRECT, MODE_REGISTER, MODE_REG_INDIRECT,
+)
+from processor import Processor, MEMORY_SIZE, REGISTER_COUNT, FLAG_ZF, FLAG_SF, FLAG_CF, FLAG_OF
+
+
+class LockstepProcessor:
+    """N процессоров, выполняющих одну программу в режиме lockstep
+
+    Память и регистры хранятся как [адрес, дорожка]: обращение к одной ячейке
+    во всех дорожках читает непрерывную строку массива.
+    """
+
+    def __init__(self, lanes):
+        self.lanes = lanes
+        self.ACC = np.zeros(lanes, dtype=np.int64)
+        self.PC = np.zeros(lanes, dtype=np.int64)
+        self.IR = np.zeros(lanes, dtype=np.int64)
+        self.registers = np.zeros((REGISTER_COUNT, lanes), dtype=np.uint16)
+        self.flags_word = np.zeros(lanes, dtype=np.uint8)
+        self.memory = np.zeros((MEMORY_SIZE, lanes), dtype=np.uint16)
+        self.halted = np.zeros(lanes, dtype=bool)
+        self.step_count = np.zeros(lanes, dtype=np.int64)
+
+    def load_program(self, program, start_address=0):
+        program = np.asarray(program, dtype=np.int64)[:MEMORY_SIZE - start_address] & 0xFFFF
+        self.memory[start_address:start_address + len(program)] = program[:, None]
+        self.PC[:] = start_address
+
+    def load_data(self, data, start_address=200, lane=None):
+        """Загрузка данных во все дорожки (lane=None) или в одну дорожку"""
+        data = np.asarray(data, dtype=np.int64)[:max(0, MEMORY_SIZE - start_address)] & 0xFFFF
+        if lane is None:
+            self.memory[start_address:start_address + len(data)] = data[:, None]
+        else:
+            self.memory[start_address:start_address + len(data), lane] = data
+
+    def load_lane_data(self, data, start_address=200):
+        """Загрузка матрицы данных [N, k]: строка i - данные дорожки i"""
+        data = np.asarray(data, dtype=np.int64)[:, :max(0, MEMORY_SIZE - start_address)] & 0xFFFF
+        self.memory[start_address:start_address + data.shape[1]] = data.T
+
+    def _set_flags(self, sel, result):
+        flags = (result == 0) * FLAG_ZF
+        flags |= ((result & 0x8000) != 0) * FLAG_SF
+        flags |= ((result > 0xFFFF) | (result < -0x10000)) * FLAG_CF
+        flags |= ((result > 0x7FFF) | (result < -0x8000)) * FLAG_OF
+        self.flags_word[sel] = flags
+
+    def _set_acc(self, sel, acc):
+        # Для значения 0..0xFFFF: CF = 0, OF совпадает с SF
+        self.ACC[sel] = acc
+        self.flags_word[sel] = (acc == 0) * FLAG_ZF | (acc >> 15) * (FLAG_SF | FLAG_OF)
+
+    def _read_operand(self, sel, mode, arg):
+        if mode == MODE_DIRECT:
+            return self.memory[arg, sel].astype(np.int64)
+        if mode == MODE_IMMEDIATE:
+            return np.int64(arg)
+        if mode == MODE_REGISTER:
+            return self.registers[arg, sel].astype(np.int64)
+        if mode in (MODE_INDIRECT, MODE_REG_INDIRECT):
+            addr = (self.memory if mode == MODE_INDIRECT else self.registers)[arg, sel].astype(np.int64)
+            inside = addr < MEMORY_SIZE
+            value = self.memory[np.where(inside, addr, 0), np.arange(self.lanes)[sel]].astype(np.int64)
+            return np.where(inside, value, 0)
+        return np.int64(0)
+
+    def _execute(self, sel, pc, word):
+        """Выполнение команды word по адресу pc в дорожках sel (срез или массив индексов)"""
+        op, mode, arg = decode(word)
+
+        if op in (OP_LOAD, OP_ADD, OP_SUB, OP_CMP):
+            value = self._read_operand(sel, mode, arg)
+            if op == OP_CMP:
+                self._set_flags(sel, self.ACC[sel] - value)
+            elif op == OP_LOAD:
+                self._set_acc(sel, value & 0xFFFF)
+            elif op == OP_ADD:
+                self._set_acc(sel, (self.ACC[sel] + value) & 0xFFFF)
+            else:
+                self._set_acc(sel, (self.ACC[sel] - value) & 0xFFFF)
+            self.PC[sel] = pc + 1
+
+        elif op == OP_STORE:
+            value = self.ACC[sel] & 0xFFFF
+            if mode == MODE_DIRECT:
+                self.memory[arg, sel] = value
+            elif mode == MODE_REGISTER:
+                self.registers[arg, sel] = value
+            else:
+                addr = (self.memory if mode == MODE_INDIRECT else self.registers)[arg, sel].astype(np.int64)
+                lanes = np.arange(self.lanes)[sel]
+                inside = addr < MEMORY_SIZE
+                self.memory[addr[inside], lanes[inside]] = value[inside]
+            self.PC[sel] = pc + 1
+
+        elif op == OP_JMP:
+            self.PC[sel] = arg
+        elif op == OP_JZ:
+            self.PC[sel] = np.where(self.flags_word[sel] & FLAG_ZF, arg, pc + 1)
+        elif op == OP_JNZ:
+            self.PC[sel] = np.where(self.flags_word[sel] & FLAG_ZF, pc + 1, arg)
+        elif op == OP_HALT:
+            self.halted[sel] = True
+        else:
+            self.PC[sel] = pc + 1
+
+        self.IR[sel] = word
+        self.step_count[sel] += 1
+
+    def run(self, max_steps=10000):
+        """Выполнение во всех дорожках, каждая делает не больше max_steps шагов
+
+        Возвращает массив not halted по дорожкам, как Processor.run для каждой дорожки.
+        """
+        limit = self.step_count + max_steps
+        active = ~self.halted & (self.step_count < limit)
+        idle_pc = MEMORY_SIZE + 1
+
+        while active.any():
+            pcs = np.where(active, self.PC, idle_pc)
+            pc = int(pcs.min())
+            if pc >= MEMORY_SIZE:
+                # Во всех оставшихся дорожках PC вышел за пределы памяти
+                self.halted |= active
+                break
+
+            selected = pcs == pc
+            # Когда дорожки не разошлись, срез дешевле выборки по индексам
+            sel = slice(None) if selected.all() else np.flatnonzero(selected)
+            words = self.memory[pc, sel]
+            word = int(words[0])
+            if (words == word).all():
+                self._execute(sel, pc, word)
+            else:
+                # Самомодифицирующийся код: в дорожках по одному адресу разные команды
+                lanes = np.arange(self.lanes)[sel]
+                for word in np.unique(words):
+                    self._execute(lanes[words == word], pc, int(word))
+            active[sel] = ~self.halted[sel] & (self.step_count[sel] < limit[sel])
+        return ~self.halted
+
+    def get_processor(self, lane):
+        """Состояние одной дорожки в виде обычного Processor"""
+        processor = Processor()
+        processor.ACC = int(self.ACC[lane])
+        processor.PC = int(self.PC[lane])
+        processor.IR = int(self.IR[lane])
+        processor.registers[:] = array('H', np.ascontiguousarray(self.registers[:, lane]).tobytes())
+        processor.flags_word = int(self.flags_word[lane])
+        processor.memory[:] = array('H', np.ascontiguousarray(self.memory[:, lane]).tobytes())
+        processor.halted = bool(self.halted[lane])
+        processor.step_count = int(self.step_count[lane])
+        return processor
+
+
+def run_datasets(program, datasets, max_steps=10000):
+    """Выполнение программы над списком наборов данных [{адрес: значения}, ...]
+
+    Возвращает LockstepProcessor после выполнения; дорожка i соответствует datasets[i].
+    """
+    machine = LockstepProcessor(len(datasets))
+    machine.load_program(program)
+    segments = [{int(address): values for address, values in d.items()} for d in datasets]
+    for address in sorted({address for d in segments for address in d}):
+        rows = [d.get(address) for d in segments]
+        if all(row is not None and len(row) == len(rows[0]) for row in rows):
+            machine.load_lane_data(rows, address)
+        else:
+            for lane, row in enumerate(rows):
+                if row is not None:
+                    machine.load_data(row, address, lane)
+    machine.run(max_steps)
+    return machine
@@ -0,0 +1,189 @@
+"""
+Обнаружение зацикливания по хешу состояния
+Состояние (PC, ACC, флаги, регистры и хеш памяти) хешируется только в заголовках циклов -
+после выполненного перехода назад. Хеш памяти - сумма хешей ячеек, при проверке
+пересчитываются только ячейки, в которые была запись. Совпадение хешей проверяется
+точно: если через найденный период состояние повторяется целиком, программа детерминированно
+зациклилась
+"""
+
+from array import array
+from collections import namedtuple
+
+from cache import data_accesses
+from predecode import predecode, execute_entry, OP_JMP, OP_JZ, OP_JNZ, OP_HALT, FLAG_BITS
+
+_MASK = (1 << 64) - 1
+_BRANCHES = (OP_JMP, OP_JZ, OP_JNZ)
+_BRANCH_OPCODES = (0x6, 0x7, 0x8)
+
+# Доказанное зацикливание: адреса команд цикла start-end (включительно), длина периода
+# в шагах и шаг, на котором повторяющееся состояние встретилось впервые
+Loop = namedtuple('Loop', ('start', 'end', 'period', 'first_step'))
+
+
+def _cell_hash(addr, value):
+    """Хеш ячейки: перемешивание адреса и значения (splitmix64)"""
+    x = ((addr << 16) | value) * 0x9E3779B97F4A7C15 & _MASK
+    x = (x ^ (x >> 30)) * 0xBF58476D1CE4E5B9 & _MASK
+    x = (x ^ (x >> 27)) * 0x94D049BB133111EB & _MASK
+    return x ^ (x >> 31)
+
+
+class LoopDetector:
+    """Поиск повторяющегося состояния в заголовках циклов
+
+    history - сколько хешей состояний хранить; при переполнении история начинается
+    заново, поэтому циклы с очень длинным периодом могут остаться незамеченными.
+    """
+
+    def __init__(self, history=1 << 16):
+        self.history = history
+        self.verdict = None          # Loop после доказанного зацикливания
+        self.start(array('H'))
+
+    def start(self, memory):
+        """Начало наблюдения с текущего содержимого памяти"""
+        self.verdict = None
+        self.proven = None           # (период, первый шаг) до построения вердикта
+        self.seen = {}               # хеш состояния -> шаг
+        self.candidate = None        # (шаг, период, состояние, память) для точной проверки
+        self.shadow = array('H', memory)
+        self.dirty = set()           # ячейки, записанные после последней проверки
+        self.memory_hash = sum(_cell_hash(addr, value) for addr, value in enumerate(memory)) & _MASK
+
+    def _update_memory_hash(self, memory):
+        shadow = self.shadow
+        h = self.memory_hash
+        for addr in self.dirty:
+            value = memory[addr]
+            old = shadow[addr]
+            if value != old:
+                h = (h + _cell_hash(addr, value) - _cell_hash(addr, old)) & _MASK
+                shadow[addr] = value
+        self.dirty.clear()
+        self.memory_hash = h
+        return h
+
+    def check(self, processor, step, pc, acc, flags):
+        """Проверка в заголовке цикла pc на шаге step, возвращает True при доказанном зацикливании"""
+        memory = processor.memory
+        registers = processor.registers.tobytes()
+        key = hash((pc, acc, flags, registers, self._update_memory_hash(memory)))
+
+        candidate = self.candidate
+        if candidate is not None and step >= candidate[0] + candidate[1]:
+            self.candidate = None
+            if (step == candidate[0] + candidate[1] and (pc, acc, flags, registers) == candidate[2]
+                    and memory.tobytes() == candidate[3]):
+                self.proven = (candidate[1], candidate[0] - candidate[1])
+                return True
+
+        previous = self.seen.get(key)
+        if previous is not None and self.candidate is None:
+            # Совпадение хешей: состояние запоминается целиком и сравнивается через период
+            self.candidate = (step, step - previous, (pc, acc, flags, registers), memory.tobytes())
+        if len(self.seen) >= self.history:
+            self.seen.clear()
+        self.seen[key] = step
+        return False
+
+    def finish(self, processor):
+        """Вердикт после доказанного зацикливания: диапазон адресов - один период на копии процессора"""
+        if self.proven is None:
+            return
+        period, first_step = self.proven
+        clone = processor.fork('interpreter')
+        low = high = clone.PC
+        for _ in range(period):
+            clone.step()
+            low = min(low, clone.PC)
+            high = max(high, clone.PC)
+        self.verdict = Loop(low, high, period, first_step)
+
+
+def run_loop_detection(processor, max_steps=10000, resume=False):
+    """Выполнение до HALT, исчерпания max_steps или доказанного зацикливания
+
+    Вердикт - в processor.loop_detector.verdict. Возвращает not processor.halted.
+    resume - продолжение того же наблюдения (следующая порция run() с бюджетами): история
+    хешей и хеш памяти не сбрасываются.
+    """
+    detector = processor.loop_detector
+    if not resume:
+        detector.start(processor.memory)
+    if processor._instrumented():
+        return _run_stepping(processor, detector, max_steps)
+    if processor.halted:
+        return False
+
+    mem = processor.memory
+    regs = processor.registers
+    size = len(mem)
+    dirty = detector.dirty
+
+    acc = processor.ACC
+    pc = processor.PC
+    ir = processor.IR
+    base = processor.step_count
+    entry_flags = processor.flags_word
+    # Флаги - по последнему результату АЛУ, как в run_predecoded
+    flag_src = entry_flag_src = 0.0 if entry_flags & FLAG_BITS['ZF'] else 1.0
+    halted = False
+    steps = 0
+
+    while steps < max_steps:
+        if pc >= size:
+            halted = True
+            break
+        entry = predecode(mem[pc])
+        op = entry[3]
+        next_pc, acc, flag_src, written = execute_entry(entry, pc, acc, flag_src, mem, regs)
+        ir = entry[4]
+        steps += 1
+        if op == OP_HALT:
+            halted = True
+            break
+        if written >= 0:
+            dirty.add(written)
+        if next_pc <= pc and op in _BRANCHES:
+            if flag_src is entry_flag_src:
+                flags = entry_flags
+            else:
+                processor.update_flags(flag_src)
+                flags = processor.flags_word
+            if detector.check(processor, base + steps, next_pc, acc, flags):
+                pc = next_pc
+                break
+        pc = next_pc
+
+    processor.ACC = acc
+    processor.PC = pc
+    processor.IR = ir
+    processor.step_count = base + steps
+    processor.halted = halted
+    if flag_src is not entry_flag_src:
+        processor.update_flags(flag_src)
+    detector.finish(processor)
+    return not halted
+
+
+def _run_stepping(processor, detector, max_steps):
+    """Обнаружение зацикливания поверх Processor.step() - при подключённых моделях и журнале"""
+    mem = processor.memory
+    steps = 0
+    while not processor.halted and steps < max_steps:
+        pc = processor.PC
+        if pc < len(mem):
+            for addr, write, _ in data_accesses(mem[pc], mem, processor.registers):
+                if write:
+                    detector.dirty.add(addr)
+        if not processor.step():
+            break
+        steps += 1
+        if (not processor.halted and processor.PC <= pc and (processor.IR >> 12) in _BRANCH_OPCODES
+                and detector.check(processor, processor.step_count, processor.PC,
+                                   processor.ACC, processor.flags_word)):
+            break
+    detector.finish(processor)
+    return not processor.halted
@@ -0,0 +1,205 @@
+"""
+Двоичный объектный формат и кэш ассемблирования на диске
+Объектный файл - заголовок, машинные коды, сегменты данных, таблица меток и номера
+строк исходного текста. Слова хранятся массивами little-endian и читаются в array('H')
+одним копированием, Processor.load_object переносит их в память срезом. Кэш хранит
+объектные файлы под хешем содержимого .asm: неизменённый файл не ассемблируется повторно
+"""
+
+import functools
+import hashlib
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from collections import namedtuple
+
+import assembler
+from assembler import Assembler
+
+MAGIC = b'EMUOBJ\x00\x00'
+VERSION = 1
+
+# Заголовок: сигнатура, версия, адрес загрузки кода, адрес запуска, число слов кода,
+# сегментов данных, меток и номеров строк
+_HEADER = struct.Struct('<8sIHHIIII')
+# Сегмент данных: адрес, число слов (далее слова)
+_SEGMENT = struct.Struct('<HI')
+# Метка: адрес, длина имени в байтах UTF-8 (далее имя)
+_SYMBOL = struct.Struct('<IH')
+
+OBJECT_SUFFIX = '.emo'
+# Каталог кэша: переменная окружения EMULATOR_CACHE или ~/.cache/emulator
+DEFAULT_CACHE_DIR = os.environ.get('EMULATOR_CACHE') or os.path.join(
+    os.path.expanduser('~'), '.cache', 'emulator')
+
+# Объектный файл: code - array('H') машинных кодов с адреса start, entry - начальный PC,
+# data - список (адрес, array('H')), symbols - {метка: адрес}, lines - array('I') с
+# номером строки исходного текста для каждого слова кода (или пустой)
+ObjectFile = namedtuple('ObjectFile', ('code', 'start', 'entry', 'data', 'symbols', 'lines'))
+
+
+def data_segments(data):
+    """Сегменты данных объектного файла из {адрес: значения} или пар (адрес, значения)"""
+    items = data.items() if isinstance(data, dict) else data
+    return [(address, array('H', [value & 0xFFFF for value in values])) for address, values in items]
+
+
+def from_assembly(assembly, data=None, start=0):
+    """Объектный файл из результата Assembler.assemble_stream и сегментов данных {адрес: значения}"""
+    return ObjectFile(array('H', assembly.words), start, start, data_segments(data or ()),
+                      {name: address + start for name, address in assembly.labels.items()},
+                      array('I', assembly.lines))
+
+
+def with_data(obj, data):
+    """Объектный файл с добавленными сегментами данных"""
+    return obj._replace(data=obj.data + data_segments(data))
+
+
+def _little_endian(words):
+    if sys.byteorder == 'big':
+        words = array(words.typecode, words)
+        words.byteswap()
+    return words.tobytes()
+
+
+def _read_array(typecode, buffer, offset, count):
+    words = array(typecode)
+    end = offset + count * words.itemsize
+    if end > len(buffer):
+        raise ValueError("Объектный файл обрезан")
+    words.frombytes(buffer[offset:end])
+    if sys.byteorder == 'big':
+        words.byteswap()
+    return words, end
+
+
+def pack(obj):
+    """Объектный файл в байты"""
+    symbols = [(name.encode('utf-8'), address) for name, address in obj.symbols.items()]
+    parts = [_HEADER.pack(MAGIC, VERSION, obj.start, obj.entry, len(obj.code), len(obj.data),
+                          len(symbols), len(obj.lines)),
+             _little_endian(obj.code)]
+    for address, values in obj.data:
+        parts.append(_SEGMENT.pack(address, len(values)))
+        parts.append(_little_endian(values))
+    for name, address in symbols:
+        parts.append(_SYMBOL.pack(address, len(name)))
+        parts.append(name)
+    parts.append(_little_endian(obj.lines))
+    return b''.join(parts)
+
+
+def unpack(buffer):
+    """Объектный файл из байтов (bytes, bytearray, mmap); ValueError при неверном формате"""
+    buffer = memoryview(buffer)
+    if len(buffer) < _HEADER.size:
+        raise ValueError("Объектный файл обрезан")
+    magic, version, start, entry, code_size, segment_count, symbol_count, line_count = \
+        _HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise ValueError("Не объектный файл эмулятора")
+    if version != VERSION:
+        raise ValueError(f"Неподдерживаемая версия объектного файла: {version}")
+
+    code, offset = _read_array('H', buffer, _HEADER.size, code_size)
+    try:
+        data = []
+        for _ in range(segment_count):
+            address, size = _SEGMENT.unpack_from(buffer, offset)
+            values, offset = _read_array('H', buffer, offset + _SEGMENT.size, size)
+            data.append((address, values))
+        symbols = {}
+        for _ in range(symbol_count):
+            address, size = _SYMBOL.unpack_from(buffer, offset)
+            offset += _SYMBOL.size
+            if offset + size > len(buffer):
+                raise ValueError("Объектный файл обрезан")
+            symbols[bytes(buffer[offset:offset + size]).decode('utf-8')] = address
+            offset += size
+    except struct.error:
+        raise ValueError("Объектный файл обрезан")
+    lines, _ = _read_array('I', buffer, offset, line_count)
+    return ObjectFile(code, start, entry, data, symbols, lines)
+
+
+def write_object(path, obj):
+    with open(path, 'wb') as f:
+        f.write(pack(obj))
+
+
+def read_object(path):
+    with open(path, 'rb') as f:
+        return unpack(f.read())
+
+
+@functools.lru_cache(maxsize=None)
+def _assembler_digest():
+    # Ключ кэша зависит от ассемблера: после его изменения старые объектные файлы не используются
+    with open(assembler.__file__, 'rb') as f:
+        return hashlib.sha256(f.read()).digest()
+
+
+def cache_key(source):
+    """Ключ кэша для исходного текста (bytes): хеш формата, ассемблера и содержимого"""
+    digest = hashlib.sha256(MAGIC + VERSION.to_bytes(4, 'little') + _assembler_digest())
+    digest.update(source)
+    return digest.hexdigest()
+
+
+def _store(cache_dir, key, obj):
+    # Запись во временный файл и переименование: параллельные процессы не видят
+    # недописанный объектный файл. Кэш необязателен, ошибки записи пропускаются
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=cache_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(pack(obj))
+            os.replace(tmp, os.path.join(cache_dir, key + OBJECT_SUFFIX))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+    except OSError:
+        pass
+
+
+def assemble_source(source, cache_dir=DEFAULT_CACHE_DIR):
+    """Объектный файл для исходного текста (str или bytes в UTF-8) через кэш
+
+    cache_dir=None - без кэша. Повреждённый объектный файл в кэше ассемблируется заново.
+    """
+    if isinstance(source, str):
+        source = source.encode('utf-8')
+    if cache_dir is None:
+        return from_assembly(Assembler().assemble_stream(source.decode('utf-8')))
+    key = cache_key(source)
+    try:
+        return read_object(os.path.join(cache_dir, key + OBJECT_SUFFIX))
+    except (OSError, ValueError):
+        pass
+    obj = from_assembly(Assembler().assemble_stream(source.decode('utf-8')))
+    _store(cache_dir, key, obj)
+    return obj
+
+
+def assemble_cached(path, cache_dir=DEFAULT_CACHE_DIR):
+    """Объектный файл для .asm-файла: из кэша, если содержимое файла не менялось"""
+    with open(path, 'rb') as f:
+        return assemble_source(f.read(), cache_dir)
+
+
+def clear_cache(cache_dir=DEFAULT_CACHE_DIR):
+    """Удаление объектных файлов кэша, возвращает их число"""
+    removed = 0
+    try:
+        names = os.listdir(cache_dir)
+    except FileNotFoundError:
+        return 0
+    for name in names:
+        if name.endswith(OBJECT_SUFFIX):
+            os.unlink(os.path.join(cache_dir, name))
+            removed += 1
+    return removed
@@ -0,0 +1,263 @@
+"""
+Модель пятистадийного конвейера IF/ID/EX/MEM/WB
+Команды выполняет обычный интерпретатор, модель по потоку выполненных команд
+вычисляет, в каком такте каждая команда входит в каждую стадию: конфликты по ACC,
+флагам и регистрам (с пробросом результатов и без), штрафы переходов, многотактовый
+MEM косвенной адресации и, при общей памяти, конфликт выборки команды с MEM.
+Архитектурное состояние процессора модель не меняет
+"""
+
+from array import array
+
+from predecode import (
+    decode,
+    OP_LOAD, OP_STORE, OP_ADD, OP_SUB, OP_CMP, OP_JMP, OP_JZ, OP_JNZ,
+    MODE_DIRECT, MODE_INDIRECT, MODE_REGISTER, MODE_REG_INDIRECT,
+)
+
+STAGES = ('IF', 'ID', 'EX', 'MEM', 'WB')
+IF, ID, EX, MEM, WB = range(5)
+
+# Причины простоев
+STALL_CAUSES = ('raw_acc', 'raw_flags', 'raw_register', 'load_use', 'branch', 'memory', 'structural')
+
+_MEMORY_CYCLES = {MODE_DIRECT: 1, MODE_INDIRECT: 2, MODE_REG_INDIRECT: 1}
+
+
+class _Info:
+    """Зависимости команды: какие значения читает и пишет и в каких стадиях"""
+
+    __slots__ = ('reads_acc', 'reads_flags', 'reads_reg', 'writes_acc', 'writes_flags',
+                 'writes_reg', 'ready', 'memory_cycles', 'branch')
+
+    def __init__(self, word):
+        op, mode, arg = decode(word)
+        memory_cycles = _MEMORY_CYCLES.get(mode, 0)
+        # Операнд из памяти готов только после MEM: АЛУ работает в MEM, иначе - в EX
+        alu_stage = MEM if memory_cycles else EX
+        self.reads_acc = None        # стадия, в которой нужен ACC
+        self.reads_flags = None
+        self.reads_reg = None        # (номер регистра, стадия)
+        self.writes_acc = self.writes_flags = False
+        self.writes_reg = None
+        self.ready = alu_stage       # в конце какой стадии готов результат
+        self.memory_cycles = memory_cycles if op in (OP_LOAD, OP_STORE, OP_ADD, OP_SUB, OP_CMP) else 0
+        self.branch = op if op in (OP_JMP, OP_JZ, OP_JNZ) else None
+
+        if op in (OP_LOAD, OP_ADD, OP_SUB, OP_CMP):
+            if op != OP_LOAD:
+                self.reads_acc = alu_stage
+            if op != OP_CMP:
+                self.writes_acc = True
+            self.writes_flags = True
+            if mode in (MODE_REGISTER, MODE_REG_INDIRECT):
+                self.reads_reg = (arg, EX)
+        elif op == OP_STORE:
+            if mode == MODE_REGISTER:
+                self.reads_acc = EX
+                self.writes_reg = arg
+                self.ready = EX
+            else:
+                self.reads_acc = MEM
+                if mode == MODE_REG_INDIRECT:
+                    self.reads_reg = (arg, EX)
+        elif op in (OP_JZ, OP_JNZ):
+            self.reads_flags = EX
+
+
+class Pipeline:
+    """Потактовая модель конвейера по потоку выполненных команд
+
+    forwarding - проброс результатов из EX/MEM в следующие команды, без него
+    команда ждёт в ID записи результата в WB. Условные переходы предсказывает
+    предсказатель процессора (без него - как невыполняемые), неверное предсказание
+    обнаруживается в EX; цель JMP и предсказанного перехода известна в ID. shared_memory - выборка
+    команды и MEM используют один порт памяти (машина фон Неймана).
+    """
+
+    def __init__(self, forwarding=True, shared_memory=False, occupancy_limit=1_000_000, diagram_limit=64):
+        self.forwarding = forwarding
+        self.shared_memory = shared_memory
+        self.occupancy_limit = occupancy_limit
+        self.diagram_limit = diagram_limit
+        self._info = {}
+        self.reset()
+
+    def reset(self):
+        self.instructions = 0
+        self.stalls = dict.fromkeys(STALL_CAUSES, 0)
+        self.branches = 0
+        self.mispredictions = 0
+        self._prev = None            # такты входа предыдущей команды в стадии и длительность MEM
+        self._redirect = 0           # самый ранний такт выборки после перехода
+        # Производители значений: (такт готовности для проброса, такт WB, производитель из памяти)
+        self._acc = self._flags = None
+        self._regs = {}
+        self._memory_busy = set()
+        self.occupancy = array('B')  # число команд в конвейере по тактам
+        self.history = []            # (pc, слово, такты стадий, длительность MEM) первых команд
+
+    @property
+    def cycles(self):
+        """Тактов от выборки первой команды до завершения WB последней"""
+        return self._prev[0][WB] + 1 if self._prev else 0
+
+    @property
+    def cpi(self):
+        return self.cycles / self.instructions if self.instructions else 0.0
+
+    def _info_for(self, word):
+        info = self._info.get(word)
+        if info is None:
+            info = self._info[word] = _Info(word)
+        return info
+
+    def _hazard(self, times, stage, producer, cause, use_stage):
+        """Такт не раньше которого команда может войти в stage из-за producer"""
+        if producer is None:
+            return times
+        ready, wb, from_memory = producer
+        if self.forwarding:
+            if use_stage != stage:
+                return times
+            if ready > times:
+                self.stalls['load_use' if from_memory and use_stage == EX else cause] += ready - times
+                return ready
+        elif stage == ID and wb > times:
+            self.stalls[cause] += wb - times
+            return wb
+        return times
+
+    def issue(self, word, pc, next_pc, predicted=None):
+        """Учёт выполненной команды word по адресу pc, next_pc - PC после неё
+
+        predicted - верно ли предсказатель процессора предсказал условный переход;
+        без предсказателя переходы предсказываются невыполняемыми.
+        """
+        info = self._info_for(word)
+        prev = self._prev
+        if prev is None:
+            prev_times, prev_mem = (-1, 0, 0, 0, 0), 1
+        else:
+            prev_times, prev_mem = prev
+
+        # IF: стадия освобождается, когда предыдущая команда переходит в ID
+        t_if = prev_times[ID] if prev is not None else 0
+        if self._redirect > t_if:
+            self.stalls['branch'] += self._redirect - t_if
+            t_if = self._redirect
+        if self.shared_memory:
+            while t_if in self._memory_busy:
+                self.stalls['structural'] += 1
+                t_if += 1
+
+        # ID: без проброса здесь ждём записи результатов в WB
+        t_id = max(t_if + 1, prev_times[EX])
+        if not self.forwarding:
+            if info.reads_acc is not None:
+                t_id = self._hazard(t_id, ID, self._acc, 'raw_acc', info.reads_acc)
+            if info.reads_flags is not None:
+                t_id = self._hazard(t_id, ID, self._flags, 'raw_flags', info.reads_flags)
+            if info.reads_reg is not None:
+                t_id = self._hazard(t_id, ID, self._regs.get(info.reads_reg[0]), 'raw_register', EX)
+
+        t_ex = max(t_id + 1, prev_times[MEM])
+        t_mem = max(t_ex + 1, prev_times[WB])
+        if self.forwarding:
+            if info.reads_reg is not None:
+                t_ex = self._hazard(t_ex, EX, self._regs.get(info.reads_reg[0]), 'raw_register', EX)
+            if info.reads_acc == EX:
+                t_ex = self._hazard(t_ex, EX, self._acc, 'raw_acc', EX)
+            if info.reads_flags == EX:
+                t_ex = self._hazard(t_ex, EX, self._flags, 'raw_flags', EX)
+            t_mem = max(t_ex + 1, prev_times[WB])
+            if info.reads_acc == MEM:
+                t_mem = self._hazard(t_mem, MEM, self._acc, 'raw_acc', MEM)
+
+        mem_cycles = max(1, info.memory_cycles)
+        if mem_cycles > 1:
+            self.stalls['memory'] += mem_cycles - 1
+        t_wb = max(t_mem + mem_cycles, prev_times[WB] + 1)
+        times = (t_if, t_id, t_ex, t_mem, t_wb)
+
+        if info.memory_cycles and self.shared_memory:
+            self._memory_busy.update(range(t_mem, t_mem + info.memory_cycles))
+            if len(self._memory_busy) > 4096:
+                self._memory_busy = {t for t in self._memory_busy if t >= t_if}
+
+        # Результаты команды для следующих
+        ready = (t_ex + 1) if info.ready == EX else (t_mem + mem_cycles)
+        produced = (ready, t_wb, info.ready == MEM)
+        if info.writes_acc:
+            self._acc = produced
+        if info.writes_flags:
+            self._flags = produced
+        if info.writes_reg is not None:
+            self._regs[info.writes_reg] = produced
+
+        # Переходы: цель JMP и верно предсказанного выполняемого перехода известна в ID,
+        # неверное предсказание условного перехода обнаруживается в EX
+        if info.branch is not None:
+            taken = next_pc != pc + 1
+            if info.branch == OP_JMP:
+                self._redirect = t_id + 1
+            else:
+                self.branches += 1
+                if predicted is None:
+                    predicted = not taken
+                if not predicted:
+                    self.mispredictions += 1
+                    self._redirect = t_ex + 1
+                elif taken:
+                    self._redirect = t_id + 1
+
+        self._record(pc, word, times, mem_cycles)
+        self._prev = (times, mem_cycles)
+        self.instructions += 1
+
+    def _record(self, pc, word, times, mem_cycles):
+        if len(self.history) < self.diagram_limit:
+            self.history.append((pc, word, times, mem_cycles))
+        end = min(times[WB] + 1, self.occupancy_limit)
+        occupancy = self.occupancy
+        if len(occupancy) < end:
+            occupancy.extend(bytes(end - len(occupancy)))
+        for t in range(times[IF], end):
+            occupancy[t] += 1
+
+    def report(self):
+        """CPI, простои по причинам и загрузка конвейера"""
+        cycles = self.cycles
+        histogram = {}
+        for count in self.occupancy[:cycles]:
+            histogram[count] = histogram.get(count, 0) + 1
+        tracked = min(cycles, len(self.occupancy))
+        return {
+            'forwarding': self.forwarding,
+            'shared_memory': self.shared_memory,
+            'instructions': self.instructions,
+            'cycles': cycles,
+            'cpi': self.cpi,
+            'stalls': dict(self.stalls),
+            'branches': self.branches,
+            'mispredictions': self.mispredictions,
+            'average_occupancy': sum(self.occupancy[:tracked]) / tracked if tracked else 0.0,
+            'occupancy_histogram': dict(sorted(histogram.items())),
+        }
+
+    def diagram(self, disassemble=None):
+        """Диаграмма прохождения первых команд по стадиям (-- - простой в стадии)"""
+        if not self.history:
+            return ""
+        width = self.history[-1][2][WB] + 1
+        lines = ["     " + "".join(f"{t:>4}" for t in range(width))]
+        for pc, word, times, mem_cycles in self.history:
+            cells = ["    "] * width
+            ends = times[1:] + (times[WB] + 1,)
+            for stage, (start, end) in enumerate(zip(times, ends)):
+                busy = start + (mem_cycles if stage == MEM else 1)
+                for t in range(start, end):
+                    cells[t] = f"{STAGES[stage]:>4}" if t < busy else "  --"
+            text = disassemble(word) if disassemble else f"{word:04X}"
+            lines.append(f"{pc:04X} " + "".join(cells) + f"  {text}")
+        return "\n".join(lines)
@@ -0,0 +1,407 @@
+"""
+Движок выполнения с предварительным декодированием команд
+Каждое слово памяти декодируется один раз в запись (операция, способ адресации, операнд),
+дальнейшее выполнение идёт по таблице таких записей без повторного разбора IR
+"""
+
+from functools import lru_cache
+
+# Операции
+OP_LOAD = 0
+OP_STORE = 1
+OP_ADD = 2
+OP_SUB = 3
+OP_CMP = 4
+OP_JMP = 5
+OP_JZ = 6
+OP_JNZ = 7
+OP_HALT = 8
+OP_NOP = 9        # неизвестный код операции: только PC += 1
+
+# Способы получения операнда
+MODE_DIRECT = 0        # M[arg]
+MODE_IMMEDIATE = 1     # arg
+MODE_INDIRECT = 2      # M[M[arg]]
+MODE_REGISTER = 3      # Rarg
+MODE_REG_INDIRECT = 4  # M[Rarg]
+MODE_ZERO = 5          # операнд вне допустимых диапазонов, значение 0
+MODE_NONE = 6          # переходы, HALT
+
+# Биты упакованного регистра флагов (Processor.flags_word)
+FLAG_ZF = 0x1         # Флаг нуля
+FLAG_SF = 0x2         # Флаг знака
+FLAG_CF = 0x4         # Флаг переноса
+FLAG_OF = 0x8         # Флаг переполнения
+FLAG_BITS = {'ZF': FLAG_ZF, 'SF': FLAG_SF, 'CF': FLAG_CF, 'OF': FLAG_OF}
+
+_OPCODE_TO_OP = {
+    0x0: OP_HALT,
+    0x1: OP_LOAD,
+    0x2: OP_STORE,
+    0x3: OP_ADD,
+    0x4: OP_SUB,
+    0x5: OP_CMP,
+    0x6: OP_JMP,
+    0x7: OP_JZ,
+    0x8: OP_JNZ,
+}
+
+# Обработчики движка: специализированные пары (операция, адресация) для частых
+# команд и общие обработчики для остальных. Порядок совпадает с порядком проверок
+# в цикле run_predecoded и подобран по частоте команд в programs/*.asm
+H_LOAD_DIRECT = 0
+H_STORE_DIRECT = 1
+H_LOAD_REG = 2
+H_STORE_REG = 3
+H_JZ = 4
+H_ADD_IMM = 5      # ADD #v и SUB #v (вычитание хранится как прибавление -v по модулю 2^16)
+H_JMP = 6
+H_ADD_DIRECT = 7
+H_ADD_REG = 8
+H_LOAD_IMM = 9
+H_CMP_DIRECT = 10
+H_CMP_REG = 11
+H_LOAD = 12        # LOAD с остальными способами адресации
+H_ALU = 13         # ADD/SUB/CMP с остальными способами адресации
+H_STORE = 14       # STORE (addr) / STORE (Rk)
+H_JNZ = 15
+H_HALT = 16
+H_NOP = 17
+H_MULTIPLY_LOOP = 18   # заголовок цикла умножения сложением, см. match_multiply_loop
+
+_SPECIALIZED = {
+    (OP_LOAD, MODE_REGISTER): H_LOAD_REG,
+    (OP_STORE, MODE_REGISTER): H_STORE_REG,
+    (OP_ADD, MODE_IMMEDIATE): H_ADD_IMM,
+    (OP_SUB, MODE_IMMEDIATE): H_ADD_IMM,
+    (OP_STORE, MODE_DIRECT): H_STORE_DIRECT,
+    (OP_LOAD, MODE_DIRECT): H_LOAD_DIRECT,
+    (OP_ADD, MODE_REGISTER): H_ADD_REG,
+    (OP_LOAD, MODE_IMMEDIATE): H_LOAD_IMM,
+    (OP_ADD, MODE_DIRECT): H_ADD_DIRECT,
+    (OP_CMP, MODE_REGISTER): H_CMP_REG,
+    (OP_CMP, MODE_DIRECT): H_CMP_DIRECT,
+}
+
+_GENERIC = {
+    OP_LOAD: H_LOAD,
+    OP_ADD: H_ALU,
+    OP_SUB: H_ALU,
+    OP_CMP: H_ALU,
+    OP_STORE: H_STORE,
+    OP_JMP: H_JMP,
+    OP_JZ: H_JZ,
+    OP_JNZ: H_JNZ,
+    OP_HALT: H_HALT,
+    OP_NOP: H_NOP,
+}
+
+
+def decode(word):
+    """Разбор слова на (операция, способ адресации, операнд) по диапазонам execute_instruction"""
+    opcode = (word >> 12) & 0xF
+    operand = word & 0xFFF
+    op = _OPCODE_TO_OP.get(opcode, OP_NOP)
+
+    if op in (OP_LOAD, OP_ADD, OP_SUB, OP_CMP):
+        if operand < 256:
+            return op, MODE_DIRECT, operand
+        if operand < 512:
+            return op, MODE_INDIRECT, operand - 256
+        if operand < 1024:
+            return op, MODE_IMMEDIATE, operand - 512
+        if operand < 1040:
+            return op, MODE_REGISTER, operand - 1024
+        # Косвенно-регистровое чтение поддерживает только LOAD
+        if operand < 1056 and op == OP_LOAD:
+            return op, MODE_REG_INDIRECT, operand - 1040
+        return op, MODE_ZERO, 0
+
+    if op == OP_STORE:
+        if 1024 <= operand < 1040:
+            return op, MODE_REGISTER, operand - 1024
+        if 1040 <= operand < 1056:
+            return op, MODE_REG_INDIRECT, operand - 1040
+        if 256 <= operand < 512:
+            return op, MODE_INDIRECT, operand - 256
+        # Остальные значения операнда - прямой адрес, включая диапазон #value
+        return op, MODE_DIRECT, operand
+
+    if op in (OP_JMP, OP_JZ, OP_JNZ):
+        return op, MODE_NONE, operand
+
+    return op, MODE_NONE, 0
+
+
+@lru_cache(maxsize=None)
+def predecode(word):
+    """Запись таблицы движка для слова памяти: (обработчик, операнд, адресация, операция, слово)"""
+    op, mode, arg = decode(word)
+    handler = _SPECIALIZED.get((op, mode), _GENERIC[op])
+    if handler == H_ADD_IMM and op == OP_SUB:
+        arg = -arg & 0xFFFF
+    return handler, arg, mode, op, word
+
+
+# Цикл умножения сложением (MULT_LOOP в programs/variant9_convolution*.asm):
+#   H:   LOAD c    JZ exit    LOAD p    ADD a    STORE p    LOAD c    SUB #1    STORE c    JMP H
+# c и p - ячейки памяти (прямая адресация) или регистры, a - ячейка, регистр или #v
+MULTIPLY_LOOP_LENGTH = 9
+
+
+class MultiplyLoop:
+    """Найденный цикл умножения: счётчик и произведение - (способ адресации, адрес или регистр)"""
+
+    __slots__ = ('start', 'words', 'counter', 'product', 'addend')
+
+    def __init__(self, start, words, counter, product, addend):
+        self.start = start
+        self.words = words
+        self.counter = counter
+        self.product = product
+        self.addend = addend
+
+
+def match_multiply_loop(memory, pc):
+    """Цикл умножения с заголовком по адресу pc или None"""
+    end = pc + MULTIPLY_LOOP_LENGTH
+    if end > len(memory):
+        return None
+    words = tuple(memory[pc:end])
+    (op0, *counter), (op1, _, _), (op2, *product), (op3, *addend), (op4, *stored), \
+        (op5, *counter5), (op6, mode6, arg6), (op7, *counter7), (op8, _, target) = map(decode, words)
+    counter, product, addend = tuple(counter), tuple(product), tuple(addend)
+    if (op0, op1, op2, op3, op4, op5, op6, op7, op8) != (OP_LOAD, OP_JZ, OP_LOAD, OP_ADD, OP_STORE,
+                                                         OP_LOAD, OP_SUB, OP_STORE, OP_JMP):
+        return None
+    if (target != pc or (mode6, arg6) != (MODE_IMMEDIATE, 1) or tuple(stored) != product
+            or tuple(counter5) != counter or tuple(counter7) != counter or counter == product):
+        return None
+    for mode, arg in (counter, product):
+        if mode not in (MODE_DIRECT, MODE_REGISTER) or (mode == MODE_DIRECT and pc <= arg < end):
+            return None
+    if addend[0] not in (MODE_DIRECT, MODE_IMMEDIATE, MODE_REGISTER) or addend in (counter, product):
+        return None
+    return MultiplyLoop(pc, words, counter, product, addend)
+
+
+def fast_forward(loop, memory, registers, max_steps):
+    """Выполнение целых итераций цикла умножения одним обновлением
+
+    Выполняет не больше max_steps команд, возвращает число итераций k: произведение
+    увеличено на k * a по модулю 2^16, счётчик уменьшен на k. После итераций PC указывает
+    на заголовок, ACC и флаги - по значению счётчика, IR - JMP. При k = 0 (счётчик равен 0,
+    бюджет меньше итерации или код цикла изменён) заголовок выполняется обычным порядком.
+    """
+    mode, arg = loop.counter
+    count = memory[arg] if mode == MODE_DIRECT else registers[arg] & 0xFFFF
+    iterations = min(count, max_steps // MULTIPLY_LOOP_LENGTH)
+    if not iterations or tuple(memory[loop.start:loop.start + MULTIPLY_LOOP_LENGTH]) != loop.words:
+        return 0
+    addend = read_operand(*loop.addend, memory, registers)
+    product_mode, product_arg = loop.product
+    target = memory if product_mode == MODE_DIRECT else registers
+    target[product_arg] = ((target[product_arg] & 0xFFFF) + iterations * addend) & 0xFFFF
+    (memory if mode == MODE_DIRECT else registers)[arg] = count - iterations
+    return iterations
+
+
+def read_operand(mode, arg, memory, registers):
+    """Значение операнда для LOAD/ADD/SUB/CMP"""
+    if mode == MODE_DIRECT:
+        return memory[arg]
+    if mode == MODE_IMMEDIATE:
+        return arg
+    if mode == MODE_REGISTER:
+        return registers[arg] & 0xFFFF
+    if mode == MODE_INDIRECT:
+        addr = memory[arg]
+        return memory[addr] if addr < len(memory) else 0
+    if mode == MODE_REG_INDIRECT:
+        addr = registers[arg] & 0xFFFF
+        return memory[addr] if addr < len(memory) else 0
+    return 0
+
+
+def execute_entry(entry, pc, acc, flag_src, memory, registers):
+    """Выполнение одной предекодированной команды вне основного цикла движка
+
+    flag_src - результат, по которому вычисляются флаги (ZF <=> flag_src == 0).
+    Возвращает (pc, acc, flag_src, written), где written - адрес ячейки памяти,
+    в которую была запись, или -1. Для HALT PC не меняется.
+    """
+    handler, arg, mode, op, _ = entry
+
+    if op == OP_STORE:
+        if mode == MODE_REGISTER:
+            registers[arg] = acc & 0xFFFF
+            return pc + 1, acc, flag_src, -1
+        if mode == MODE_DIRECT:
+            addr = arg
+        elif mode == MODE_INDIRECT:
+            addr = memory[arg]
+        else:
+            addr = registers[arg] & 0xFFFF
+        if addr < len(memory):
+            memory[addr] = acc & 0xFFFF
+            return pc + 1, acc, flag_src, addr % len(memory)
+        return pc + 1, acc, flag_src, -1
+
+    if op == OP_JMP:
+        return arg, acc, flag_src, -1
+    if op == OP_JZ:
+        return (arg if flag_src == 0 else pc + 1), acc, flag_src, -1
+    if op == OP_JNZ:
+        return (pc + 1 if flag_src == 0 else arg), acc, flag_src, -1
+    if op == OP_HALT:
+        return pc, acc, flag_src, -1
+    if op == OP_NOP:
+        return pc + 1, acc, flag_src, -1
+
+    if handler == H_ADD_IMM:
+        acc = flag_src = (acc + arg) & 0xFFFF
+        return pc + 1, acc, flag_src, -1
+
+    value = read_operand(mode, arg, memory, registers)
+    if op == OP_LOAD:
+        acc = flag_src = value & 0xFFFF
+    elif op == OP_ADD:
+        acc = flag_src = (acc + value) & 0xFFFF
+    elif op == OP_SUB:
+        acc = flag_src = (acc - value) & 0xFFFF
+    else:
+        flag_src = acc - value
+    return pc + 1, acc, flag_src, -1
+
+
+def run_predecoded(processor, max_steps=10000):
+    """Выполнение программы по таблице предекодированных команд
+
+    Семантика совпадает с Processor.run: те же значения ACC, PC, IR, флагов,
+    регистров, памяти и step_count. Возвращает not processor.halted.
+    """
+    if processor.halted:
+        return False
+
+    mem = processor.memory
+    regs = processor.registers
+    size = len(mem)
+    if processor.PC >= size and max_steps > 0:
+        processor.halted = True
+        return False
+
+    # Таблица заполняется лениво по мере выполнения. Лишний элемент в конце
+    # всегда пуст: выход PC за пределы памяти проверяется только при промахе
+    code = [None] * (size + 1)
+
+    acc = processor.ACC
+    pc = processor.PC
+    ir = processor.IR
+    # Флаги вычисляются по последнему результату АЛУ только при выходе.
+    # До первой операции АЛУ здесь лежит float, равный 0 только при ZF:
+    # так JZ/JNZ проверяют одно сравнение, а при выходе видно, менялись ли флаги
+    flag_src = entry_flag_src = 0.0 if processor.flags['ZF'] else 1.0
+    halted = False
+    steps = 0
+
+    while steps < max_steps:
+        entry = code[pc]
+        if entry is None:
+            if pc >= size:
+                halted = True
+                break
+            entry = code[pc] = predecode(mem[pc])
+            if entry[0] in (H_LOAD_DIRECT, H_LOAD_REG):
+                loop = match_multiply_loop(mem, pc)
+                if loop is not None:
+                    entry = code[pc] = (H_MULTIPLY_LOOP, loop, entry[2], OP_LOAD, entry[4])
+        handler, arg, mode, op, ir = entry
+
+        if handler == H_LOAD_DIRECT:
+            acc = flag_src = mem[arg] & 0xFFFF
+            pc += 1
+        elif handler == H_STORE_DIRECT:
+            mem[arg] = acc & 0xFFFF
+            # Самомодифицирующийся код: запись сбрасывает декодированную команду
+            code[arg] = None
+            pc += 1
+        elif handler == H_LOAD_REG:
+            acc = flag_src = regs[arg] & 0xFFFF
+            pc += 1
+        elif handler == H_STORE_REG:
+            regs[arg] = acc & 0xFFFF
+            pc += 1
+        elif handler == H_JZ:
+            pc = arg if flag_src == 0 else pc + 1
+        elif handler == H_ADD_IMM:
+            acc = flag_src = (acc + arg) & 0xFFFF
+            pc += 1
+        elif handler == H_JMP:
+            pc = arg
+        elif handler == H_ADD_DIRECT:
+            acc = flag_src = (acc + mem[arg]) & 0xFFFF
+            pc += 1
+        elif handler == H_ADD_REG:
+            acc = flag_src = (acc + (regs[arg] & 0xFFFF)) & 0xFFFF
+            pc += 1
+        elif handler == H_LOAD_IMM:
+            acc = flag_src = arg
+            pc += 1
+        elif handler == H_CMP_DIRECT:
+            flag_src = acc - mem[arg]
+            pc += 1
+        elif handler == H_CMP_REG:
+            flag_src = acc - (regs[arg] & 0xFFFF)
+            pc += 1
+        elif handler == H_LOAD:
+            acc = flag_src = read_operand(mode, arg, mem, regs) & 0xFFFF
+            pc += 1
+        elif handler == H_ALU:
+            value = read_operand(mode, arg, mem, regs)
+            if op == OP_ADD:
+                acc = flag_src = (acc + value) & 0xFFFF
+            elif op == OP_SUB:
+                acc = flag_src = (acc - value) & 0xFFFF
+            else:
+                flag_src = acc - value
+            pc += 1
+        elif handler == H_STORE:
+            if mode == MODE_INDIRECT:
+                addr = mem[arg]
+            else:
+                addr = regs[arg] & 0xFFFF
+            if addr < size:
+                mem[addr] = acc & 0xFFFF
+                code[addr % size] = None
+            pc += 1
+        elif handler == H_JNZ:
+            pc = pc + 1 if flag_src == 0 else arg
+        elif handler == H_HALT:
+            halted = True
+            steps += 1
+            break
+        elif handler == H_MULTIPLY_LOOP:
+            iterations = fast_forward(arg, mem, regs, max_steps - steps)
+            # Счётчик после итераций (или текущий - для LOAD c) становится ACC
+            acc = flag_src = read_operand(mode, arg.counter[1], mem, regs)
+            if iterations:
+                for addr_mode, addr in (arg.counter, arg.product):
+                    if addr_mode == MODE_DIRECT:
+                        code[addr] = None
+                ir = arg.words[-1]
+                steps += iterations * MULTIPLY_LOOP_LENGTH
+                continue
+            pc += 1
+        else:
+            pc += 1
+
+        steps += 1
+
+    processor.ACC = acc
+    processor.PC = pc
+    processor.IR = ir
+    processor.halted = halted
+    processor.step_count += steps
+    if flag_src is not entry_flag_src:
+        processor.update_flags(flag_src)
+    return not halted
@@ -0,0 +1,173 @@
+"""
+Предсказатели условных переходов JZ/JNZ
+Предсказатель получает адрес перехода и адрес цели, предсказывает, будет ли переход
+выполнен, и обновляется по фактическому исходу. BranchPredictor.observe() делает
+оба шага и ведёт статистику неверных предсказаний по адресам переходов
+"""
+
+from assembler import label_at
+
+
+class BranchPredictor:
+    """Базовый класс предсказателя: наследники реализуют predict() и update()"""
+
+    name = 'base'
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Очистка состояния предсказателя и статистики"""
+        self.sites = {}      # адрес перехода -> [выполнений, выполнено переходов, неверных предсказаний]
+
+    def predict(self, pc, target):
+        raise NotImplementedError
+
+    def update(self, pc, target, taken):
+        pass
+
+    def observe(self, pc, target, taken):
+        """Предсказание и обучение на исходе перехода, возвращает True при верном предсказании"""
+        correct = self.predict(pc, target) == taken
+        self.update(pc, target, taken)
+        site = self.sites.get(pc)
+        if site is None:
+            site = self.sites[pc] = [0, 0, 0]
+        site[0] += 1
+        site[1] += taken
+        site[2] += not correct
+        return correct
+
+    @property
+    def branches(self):
+        return sum(site[0] for site in self.sites.values())
+
+    @property
+    def mispredictions(self):
+        return sum(site[2] for site in self.sites.values())
+
+    def report(self, labels=None):
+        """Статистика по предсказателю и по каждому переходу (с меткой, если даны labels)"""
+        branches = self.branches
+        sites = {}
+        for pc, (count, taken, wrong) in sorted(self.sites.items()):
+            site = {'executions': count, 'taken': taken, 'mispredictions': wrong,
+                    'accuracy': 1 - wrong / count}
+            if labels:
+                site['label'] = label_at(pc, labels)
+            sites[f"{pc:04X}"] = site
+        return {
+            'predictor': self.name,
+            'branches': branches,
+            'mispredictions': self.mispredictions,
+            'accuracy': 1 - self.mispredictions / branches if branches else None,
+            'sites': sites,
+        }
+
+
+class StaticPredictor(BranchPredictor):
+    """Статическое предсказание: 'always', 'never' или 'btfn' (назад - выполняется, вперёд - нет)"""
+
+    MODES = ('always', 'never', 'btfn')
+
+    def __init__(self, mode='never'):
+        if mode not in self.MODES:
+            raise ValueError(f"Неизвестный статический предсказатель: {mode}")
+        self.mode = mode
+        self.name = mode
+        super().__init__()
+
+    def predict(self, pc, target):
+        if self.mode == 'btfn':
+            return target <= pc
+        return self.mode == 'always'
+
+
+class OneBitPredictor(BranchPredictor):
+    """Таблица из entries однобитных счётчиков: повторяет последний исход"""
+
+    name = '1bit'
+
+    def __init__(self, entries=64):
+        self.entries = entries
+        super().__init__()
+
+    def reset(self):
+        super().reset()
+        self.table = bytearray(self.entries)
+
+    def predict(self, pc, target):
+        return bool(self.table[pc % self.entries])
+
+    def update(self, pc, target, taken):
+        self.table[pc % self.entries] = taken
+
+
+class TwoBitPredictor(BranchPredictor):
+    """Таблица из entries двухбитных насыщающихся счётчиков (0-1 - не выполняется, 2-3 - выполняется)"""
+
+    name = '2bit'
+
+    def __init__(self, entries=64, initial=1):
+        self.entries = entries
+        self.initial = initial
+        super().__init__()
+
+    def reset(self):
+        super().reset()
+        self.table = bytearray([self.initial] * self.entries)
+
+    def _index(self, pc):
+        return pc % self.entries
+
+    def predict(self, pc, target):
+        return self.table[self._index(pc)] >= 2
+
+    def update(self, pc, target, taken):
+        index = self._index(pc)
+        counter = self.table[index]
+        if taken:
+            if counter < 3:
+                self.table[index] = counter + 1
+        elif counter > 0:
+            self.table[index] = counter - 1
+
+
+class GSharePredictor(TwoBitPredictor):
+    """gshare: двухбитные счётчики, индекс - PC XOR глобальная история переходов"""
+
+    name = 'gshare'
+
+    def __init__(self, history_bits=6, entries=64, initial=1):
+        self.history_bits = history_bits
+        super().__init__(entries, initial)
+
+    def reset(self):
+        super().reset()
+        self.history = 0
+
+    def _index(self, pc):
+        return (pc ^ self.history) % self.entries
+
+    def update(self, pc, target, taken):
+        super().update(pc, target, taken)
+        self.history = ((self.history << 1) | taken) & ((1 << self.history_bits) - 1)
+
+
+def make_predictor(spec):
+    """Предсказатель по описанию: 'never', 'always', 'btfn', '1bit[:записей]',
+    '2bit[:записей]', 'gshare[:биты истории[:записей]]'"""
+    name, *params = spec.split(':')
+    try:
+        params = [int(p) for p in params]
+    except ValueError:
+        raise ValueError(f"Некорректное описание предсказателя: {spec}")
+    if name in StaticPredictor.MODES and not params:
+        return StaticPredictor(name)
+    if name == '1bit' and len(params) <= 1:
+        return OneBitPredictor(*params)
+    if name == '2bit' and len(params) <= 1:
+        return TwoBitPredictor(*params)
+    if name == 'gshare' and len(params) <= 2:
+        return GSharePredictor(*params)
+    raise ValueError(f"Неизвестный предсказатель: {spec}")
@@ -3,57 +3,230 @@
 Вариант №9: Поиск максимума в массиве и свертка двух массивов
 """
 
+import time
+from array import array
+from collections import namedtuple
+from collections.abc import Mapping
+
+from predecode import run_predecoded, FLAG_ZF, FLAG_SF, FLAG_CF, FLAG_OF, FLAG_BITS
+from jit import run_jit
+from journal import Journal
+from timing import TimingModel
+from cache import Cache, FetchUnit
+from pipeline import Pipeline
+from predictor import make_predictor
+from profiler import Profiler
+from tracing import TraceWriter
+from hooks import Hooks
+from breakpoints import Breakpoints, run_breakpoints
+from loopcheck import LoopDetector, run_loop_detection
+
+# Доступные движки выполнения для Processor.run
+ENGINES = ('interpreter', 'predecoded', 'jit')
+
+MEMORY_SIZE = 4096
+REGISTER_COUNT = 16
+
+_ZERO_MEMORY = array('H', bytes(2 * MEMORY_SIZE))
+_ZERO_REGISTERS = array('H', bytes(2 * REGISTER_COUNT))
+
+# Неизменяемый снимок состояния процессора. Память и регистры хранятся как bytes:
+# один снимок разделяется всеми процессорами, восстановленными из него, а restore()
+# копирует его одним блоком в уже выделенные массивы
+Snapshot = namedtuple('Snapshot', ('ACC', 'PC', 'IR', 'registers', 'flags_word',
+                                   'memory', 'halted', 'step_count'))
+
+# Состояние только что созданного процессора
+EMPTY_SNAPSHOT = Snapshot(0, 0, 0, _ZERO_REGISTERS.tobytes(), 0, _ZERO_MEMORY.tobytes(), False, 0)
+
+
+# Причины остановки run(): HALT, выход PC за пределы памяти, исчерпание бюджетов
+# команд, времени и тактов, точки останова (breakpoints.Stop.kind) и зацикливание
+STOP_REASONS = ('halt', 'end_of_memory', 'max_steps', 'time_limit', 'max_cycles',
+                'breakpoint', 'watch_read', 'watch_write', 'condition', 'loop')
+
+# Точки останова и обнаружение зацикливания выполняются разными циклами и вместе не работают
+_BREAKPOINTS_WITH_LOOPS = "Точки останова и обнаружение зацикливания нельзя включить одновременно"
+
+# Бюджеты времени и тактов проверяются между порциями из стольких команд
+BUDGET_CHECK_INTERVAL = 65536
+
+
+class RunResult(namedtuple('RunResult', ('reason', 'steps', 'elapsed', 'instructions_per_second',
+                                         'cycles', 'detail'))):
+    """Итог Processor.run(): причина остановки, выполнено команд, время в секундах, скорость,
+    такты (при подключённой модели времени) и подробности - breakpoints.Stop или loopcheck.Loop
+
+    Истинен, пока процессор не остановлен (как прежнее значение run()).
+    """
+
+    __slots__ = ()
+
+    def __bool__(self):
+        return self.reason not in ('halt', 'end_of_memory')
+
+
+class FlagsView(Mapping):
+    """Флаги процессора в виде словаря только для чтения поверх упакованного слова флагов"""
+
+    __slots__ = ('_processor',)
+
+    def __init__(self, processor):
+        self._processor = processor
+
+    def __getitem__(self, name):
+        return (self._processor.flags_word & FLAG_BITS[name]) != 0
+
+    def __iter__(self):
+        return iter(FLAG_BITS)
+
+    def __len__(self):
+        return len(FLAG_BITS)
+
+    def copy(self):
+        return dict(self)
+
+    def __repr__(self):
+        return repr(self.copy())
+
+
 class Processor:
-    def __init__(self):
+    # Память и регистры хранятся в array('H') (16 бит на ячейку), флаги - одним словом,
+    # у экземпляра нет __dict__: в пакетных прогонах живут тысячи процессоров
+    __slots__ = ('engine', 'ACC', 'PC', 'IR', 'registers', 'flags_word',
+                 'memory', 'halted', 'step_count', 'journal', 'timing', 'cycle_count',
+                 'data_cache', 'fetch_unit', 'pipeline', 'branch_predictor',
+                 'profiler', 'tracer', 'hooks', 'breakpoints', 'loop_detector')
+
+    # Коды операций
+    opcodes = {
+        'LOAD': 0x1,      # 0001
+        'STORE': 0x2,     # 0010
+        'ADD': 0x3,       # 0011
+        'SUB': 0x4,       # 0100
+        'CMP': 0x5,       # 0101
+        'JMP': 0x6,       # 0110
+        'JZ': 0x7,        # 0111
+        'JNZ': 0x8,       # 1000
+        'HALT': 0x0       # 0000
+    }
+
+    opcode_names = {v: k for k, v in opcodes.items()}
+
+    def __init__(self, engine='interpreter'):
+        if engine not in ENGINES:
+            raise ValueError(f"Неизвестный движок: {engine}")
+        self.engine = engine      # движок для run(), см. ENGINES
         self.ACC = 0          # Аккумулятор (16 бит)
         self.PC = 0           # Счетчик команд (16 бит)
         self.IR = 0           # Регистр команд (16 бит)
-        self.registers = [0] * 16  # Регистры общего назначения R0-R15
-        self.flags = {
-            'ZF': False,      # Флаг нуля
-            'SF': False,      # Флаг знака
-            'CF': False,      # Флаг переноса
-            'OF': False       # Флаг переполнения
-        }
+        self.registers = array('H', _ZERO_REGISTERS)  # Регистры общего назначения R0-R15
+        self.flags_word = 0   # Флаги ZF, SF, CF, OF (биты FLAG_*)
 
-        self.memory = [0] * 4096
+        self.memory = array('H', _ZERO_MEMORY)
         self.halted = False
         self.step_count = 0
-        
-        # Коды операций
-        self.opcodes = {
-            'LOAD': 0x1,      # 0001
-            'STORE': 0x2,     # 0010
-            'ADD': 0x3,       # 0011
-            'SUB': 0x4,       # 0100
-            'CMP': 0x5,       # 0101
-            'JMP': 0x6,       # 0110
-            'JZ': 0x7,        # 0111
-            'JNZ': 0x8,       # 1000
-            'HALT': 0x0       # 0000
-        }
+        self.journal = None   # журнал обратного хода, см. enable_journal()
+        self.timing = None    # модель времени выполнения, см. enable_timing()
+        self.cycle_count = 0
+        self.data_cache = None  # модель кэша данных, см. enable_data_cache()
+        self.fetch_unit = None  # выборка команд через кэш команд, см. enable_fetch_cache()
+        self.pipeline = None    # модель конвейера, см. enable_pipeline()
+        self.branch_predictor = None  # предсказатель JZ/JNZ, см. enable_branch_predictor()
+        self.profiler = None    # счётчики выполнений по адресам, см. enable_profiler()
+        self.tracer = None      # двоичная трасса, см. enable_trace()
+        self.hooks = None       # обработчики событий, см. add_hook()
+        self.breakpoints = None  # точки останова и наблюдения, см. enable_breakpoints()
+        self.loop_detector = None  # обнаружение зацикливания, см. enable_loop_detection()
+
+    @property
+    def flags(self):
+        return FlagsView(self)
 
-        self.opcode_names = {v: k for k, v in self.opcodes.items()}
-    
     def reset(self):
         self.ACC = 0
         self.PC = 0
         self.IR = 0
-        self.registers = [0] * 16
-        self.flags = {'ZF': False, 'SF': False, 'CF': False, 'OF': False}
+        self.registers[:] = _ZERO_REGISTERS
+        self.flags_word = 0
         self.halted = False
         self.step_count = 0
+        self.cycle_count = 0
+        # Подключённые модели начинают заново вместе с процессором: статистика и история
+        # предыдущего прогона не переходят в следующий
+        if self.timing is not None:
+            self.timing.reset()
+        if self.profiler is not None:
+            self.profiler.reset()
+        if self.data_cache is not None:
+            self.data_cache.reset()
+        if self.fetch_unit is not None:
+            self.fetch_unit.reset()
+            self.fetch_unit.cache.reset()
+        if self.pipeline is not None:
+            self.pipeline.reset()
+        if self.branch_predictor is not None:
+            self.branch_predictor.reset()
+        if self.breakpoints is not None:
+            self.breakpoints.stop = None
+        if self.loop_detector is not None:
+            self.loop_detector.start(self.memory)
+        if self.journal is not None:
+            self.journal.start(self)
+
+    def clear_memory(self):
+        self.memory[:] = _ZERO_MEMORY
+
+    def snapshot(self):
+        """Снимок текущего состояния для restore() и fork()"""
+        return Snapshot(self.ACC, self.PC, self.IR, self.registers.tobytes(), self.flags_word,
+                        self.memory.tobytes(), self.halted, self.step_count)
+
+    def restore(self, snapshot):
+        """Возврат к состоянию из снимка без выделения новой памяти"""
+        self.ACC = snapshot.ACC
+        self.PC = snapshot.PC
+        self.IR = snapshot.IR
+        memoryview(self.registers).cast('B')[:] = snapshot.registers
+        self.flags_word = snapshot.flags_word
+        memoryview(self.memory).cast('B')[:] = snapshot.memory
+        self.halted = snapshot.halted
+        self.step_count = snapshot.step_count
+
+    def fork(self, engine=None):
+        """Новый процессор с копией текущего состояния"""
+        child = Processor(engine or self.engine)
+        child.ACC = self.ACC
+        child.PC = self.PC
+        child.IR = self.IR
+        child.registers[:] = self.registers
+        child.flags_word = self.flags_word
+        child.memory[:] = self.memory
+        child.halted = self.halted
+        child.step_count = self.step_count
+        return child
     
+    def _write_memory(self, words, start_address):
+        # Слова копируются одним срезом через memoryview; не помещающиеся в память отбрасываются
+        if not (isinstance(words, array) and words.typecode == 'H'):
+            words = array('H', [value & 0xFFFF for value in words])
+        count = min(len(words), len(self.memory) - start_address)
+        if count > 0:
+            memoryview(self.memory)[start_address:start_address + count] = memoryview(words)[:count]
+
     def load_program(self, program, start_address=0):
-        for i, instruction in enumerate(program):
-            if start_address + i < len(self.memory):
-                self.memory[start_address + i] = instruction
+        self._write_memory(program, start_address)
         self.PC = start_address
     
     def load_data(self, data, start_address=200):
-        for i, value in enumerate(data):
-            if start_address + i < len(self.memory):
-                self.memory[start_address + i] = value
+        self._write_memory(data, start_address)
+
+    def load_object(self, obj):
+        """Загрузка объектного файла (objfile.ObjectFile): код, сегменты данных и начальный PC"""
+        self._write_memory(obj.code, obj.start)
+        for address, values in obj.data:
+            self._write_memory(values, address)
+        self.PC = obj.entry
     
     def get_operand_value(self, operand, addressing_mode='direct'):
         if isinstance(operand, int):
@@ -104,10 +277,16 @@ class Processor:
                 self.registers[reg_num] = value & 0xFFFF
     
     def update_flags(self, result):
-        self.flags['ZF'] = (result == 0)
-        self.flags['SF'] = (result & 0x8000) != 0
-        self.flags['CF'] = (result > 0xFFFF) or (result < -0x10000)
-        self.flags['OF'] = (result > 0x7FFF) or (result < -0x8000)
+        flags = 0
+        if result == 0:
+            flags |= FLAG_ZF
+        if result & 0x8000:
+            flags |= FLAG_SF
+        if result > 0xFFFF or result < -0x10000:
+            flags |= FLAG_CF
+        if result > 0x7FFF or result < -0x8000:
+            flags |= FLAG_OF
+        self.flags_word = flags
     
     def execute_instruction(self, opcode, operand):
         if opcode == self.opcodes['LOAD']:
@@ -125,18 +304,6 @@ class Processor:
                 reg_num = operand - 1040
                 addr = self.registers[reg_num] & 0xFFFF
                 value = self.memory[addr] if addr < len(self.memory) else 0
-            elif operand >= 1040 and operand < 1056:
-                reg_num = operand - 1040
-                addr = self.registers[reg_num] & 0xFFFF
-                value = self.memory[addr] if addr < len(self.memory) else 0
-            elif operand >= 1040 and operand < 1056:
-                reg_num = operand - 1040
-                addr = self.registers[reg_num] & 0xFFFF
-                value = self.memory[addr] if addr < len(self.memory) else 0
-            elif operand >= 1040 and operand < 1056:
-                reg_num = operand - 1040
-                addr = self.registers[reg_num] & 0xFFFF
-                value = self.memory[addr] if addr < len(self.memory) else 0
             else:
                 value = 0
             self.ACC = value & 0xFFFF
@@ -216,13 +383,13 @@ class Processor:
             self.PC = operand
             
         elif opcode == self.opcodes['JZ']:
-            if self.flags['ZF']:
+            if self.flags_word & FLAG_ZF:
                 self.PC = operand
             else:
                 self.PC += 1
                 
         elif opcode == self.opcodes['JNZ']:
-            if not self.flags['ZF']:
+            if not self.flags_word & FLAG_ZF:
                 self.PC = operand
             else:
                 self.PC += 1
@@ -232,14 +399,55 @@ class Processor:
             return
     
     def step(self):
+        if self._instrumented():
+            return self._step_instrumented()
+        return self._step()
+
+    def _step(self):
+        if self.halted:
+            return False
+
+        if self.PC >= len(self.memory):
+            self.halted = True
+            return False
+        
+        self.IR = self.memory[self.PC]
+
+        opcode = (self.IR >> 12) & 0xF
+        operand = self.IR & 0xFFF
+
+        self.execute_instruction(opcode, operand)
+        if opcode not in [self.opcodes['JMP'], self.opcodes['JZ'], self.opcodes['JNZ'], self.opcodes['HALT']]:
+            self.PC += 1
+        
+        self.step_count += 1
+        return True
+
+    def _step_instrumented(self):
+        """Шаг с журналом, моделями, трассой, профилем и обработчиками событий"""
         if self.halted:
             return False
 
         if self.PC >= len(self.memory):
             self.halted = True
+            if self.hooks is not None:
+                for callback in self.hooks.halt:
+                    callback(self, self.PC)
             return False
         
+        if self.journal is not None:
+            self.journal.record(self)
+        pc = self.PC
         self.IR = self.memory[self.PC]
+        fetch_cycles = memory_cycles = None
+        if self.fetch_unit is not None:
+            fetch_cycles = self.fetch_unit.fetch(pc)
+        if self.data_cache is not None:
+            memory_cycles = self.data_cache.access_instruction(self.IR, self.memory, self.registers)
+        if self.tracer is not None:
+            self.tracer.begin(self, pc)
+        if self.hooks is not None:
+            self.hooks.before(self, pc)
 
         opcode = (self.IR >> 12) & 0xF
         operand = self.IR & 0xFFF
@@ -249,22 +457,262 @@ class Processor:
             self.PC += 1
         
         self.step_count += 1
+        if self.profiler is not None:
+            self.profiler.counts[pc] += 1
+        if self.tracer is not None:
+            self.tracer.end(self)
+        if self.hooks is not None:
+            self.hooks.after(self, pc)
+        if self.timing is not None:
+            self.cycle_count += self.timing.account(self.IR, pc, self.PC, memory_cycles, fetch_cycles)
+        predicted = None
+        if self.branch_predictor is not None and opcode in (self.opcodes['JZ'], self.opcodes['JNZ']):
+            taken = bool(self.flags_word & FLAG_ZF) == (opcode == self.opcodes['JZ'])
+            predicted = self.branch_predictor.observe(pc, operand, taken)
+        if self.pipeline is not None:
+            self.pipeline.issue(self.IR, pc, self.PC, predicted)
         return True
     
-    def run(self, max_steps=10000):
+    def run(self, max_steps=10000, time_limit=None, max_cycles=None, check_interval=BUDGET_CHECK_INTERVAL):
+        """Выполнение до остановки или исчерпания бюджетов, возвращает RunResult
+
+        max_steps - не больше стольких команд, time_limit - секунд, max_cycles - тактов модели
+        времени (нужна enable_timing()). Бюджеты времени и тактов проверяются раз в
+        check_interval команд, поэтому могут быть превышены не больше чем на одну порцию.
+        """
+        if max_cycles is not None and self.timing is None:
+            raise ValueError("Бюджет тактов требует модели времени (enable_timing)")
+        if self.breakpoints and self.loop_detector is not None:
+            raise ValueError(_BREAKPOINTS_WITH_LOOPS)
+        start = time.perf_counter()
+        start_steps = self.step_count
+        start_cycles = self.cycle_count
+
+        reason = None
+        if time_limit is None and max_cycles is None:
+            self._run_engine(max_steps)
+            reason = self._stop_reason()
+        else:
+            remaining = max_steps
+            resume = False
+            while remaining > 0:
+                before = self.step_count
+                chunk = min(remaining, check_interval)
+                # Порции после первой продолжают тот же run(): состояние проверок сохраняется
+                self._run_engine(chunk, resume)
+                resume = True
+                remaining -= self.step_count - before
+                reason = self._stop_reason()
+                if reason is not None:
+                    break
+                if time_limit is not None and time.perf_counter() - start >= time_limit:
+                    reason = 'time_limit'
+                    break
+                if max_cycles is not None and self.cycle_count - start_cycles >= max_cycles:
+                    reason = 'max_cycles'
+                    break
+
+        elapsed = time.perf_counter() - start
+        steps = self.step_count - start_steps
+        detail = None
+        if reason in ('breakpoint', 'watch_read', 'watch_write', 'condition'):
+            detail = self.breakpoints.stop
+        elif reason == 'loop':
+            detail = self.loop_detector.verdict
+        return RunResult(reason or 'max_steps', steps, elapsed, steps / elapsed if elapsed > 0 else None,
+                         self.cycle_count - start_cycles if self.timing is not None else None, detail)
+
+    def _stop_reason(self):
+        """Причина остановки после выполнения движком или None, если бюджет команд не исчерпан"""
+        if self.halted:
+            return 'end_of_memory' if self.PC >= len(self.memory) else 'halt'
+        if self.breakpoints and self.breakpoints.stop is not None:
+            return self.breakpoints.stop.kind
+        if self.loop_detector is not None and self.loop_detector.verdict is not None:
+            return 'loop'
+        return None
+
+    def _run_engine(self, max_steps, resume=False):
+        if self.breakpoints:
+            # Причина останова - в self.breakpoints.stop
+            return run_breakpoints(self, max_steps)
+        if self.loop_detector is not None:
+            # Вердикт - в self.loop_detector.verdict
+            return run_loop_detection(self, max_steps, resume)
+        # Журнал и модели времени и кэшей учитывают каждый шаг, с ними выполняет интерпретатор
+        step = self._step
+        if self._models_attached():
+            step = self._step_instrumented
+        elif self.profiler is not None:
+            # JIT считает выполнения блоков целиком - самый дешёвый профиль
+            return run_jit(self, max_steps, profile=self.profiler)
+        elif self.engine == 'predecoded':
+            return run_predecoded(self, max_steps)
+        elif self.engine == 'jit':
+            return run_jit(self, max_steps)
+
         steps = 0
         while not self.halted and steps < max_steps:
-            if not self.step():
+            if not step():
                 break
             steps += 1
         return not self.halted
-    
+
+    def _instrumented(self):
+        """Нужен ли пошаговый _step_instrumented: без него журнал, модели, трасса, обработчики
+        и профиль не увидят команд (точки останова и обнаружение зацикливания тогда идут через step())"""
+        return self.profiler is not None or self._models_attached()
+
+    def _models_attached(self):
+        return (self.journal is not None or self.timing is not None
+                or self.data_cache is not None or self.fetch_unit is not None
+                or self.pipeline is not None or self.branch_predictor is not None
+                or self.tracer is not None or self.hooks is not None)
+
+    def enable_timing(self, model=None):
+        """Подключение модели времени: cycle_count и разбивка тактов в model.report()"""
+        self.timing = model if model is not None else TimingModel()
+        self.cycle_count = 0
+        return self.timing
+
+    def disable_timing(self):
+        self.timing = None
+
+    def enable_data_cache(self, cache=None):
+        """Подключение модели кэша данных, статистика - в cache.report()"""
+        self.data_cache = cache if cache is not None else Cache()
+        return self.data_cache
+
+    def disable_data_cache(self):
+        self.data_cache = None
+
+    def enable_fetch_cache(self, cache=None, prefetch=0):
+        """Выборка команд через кэш команд и буфер предвыборки на prefetch строк
+
+        Если передать тот же кэш, что и в enable_data_cache(), кэш будет общим для кода и данных.
+        """
+        self.fetch_unit = FetchUnit(cache if cache is not None else Cache(), prefetch)
+        return self.fetch_unit
+
+    def disable_fetch_cache(self):
+        self.fetch_unit = None
+
+    def enable_pipeline(self, pipeline=None):
+        """Подключение модели конвейера IF/ID/EX/MEM/WB, статистика - в pipeline.report()"""
+        self.pipeline = pipeline if pipeline is not None else Pipeline()
+        return self.pipeline
+
+    def disable_pipeline(self):
+        self.pipeline = None
+
+    def enable_branch_predictor(self, predictor='2bit'):
+        """Подключение предсказателя JZ/JNZ: объект BranchPredictor или описание для make_predictor"""
+        if isinstance(predictor, str):
+            predictor = make_predictor(predictor)
+        self.branch_predictor = predictor
+        return predictor
+
+    def disable_branch_predictor(self):
+        self.branch_predictor = None
+
+    def enable_profiler(self):
+        """Подключение профилировщика: отчёт - profiler.report(), листинг - profiler.annotate()"""
+        self.profiler = Profiler(len(self.memory))
+        return self.profiler
+
+    def disable_profiler(self):
+        self.profiler = None
+
+    def enable_trace(self, path, capacity=1_000_000):
+        """Запись двоичной трассы последних capacity шагов в файл path (tracing.read_trace для чтения)"""
+        self.disable_trace()
+        self.tracer = TraceWriter(path, capacity)
+        return self.tracer
+
+    def disable_trace(self):
+        """Закрытие файла трассы"""
+        if self.tracer is not None:
+            self.tracer.close()
+            self.tracer = None
+
+    def add_hook(self, event, callback):
+        """Подключение обработчика события (см. hooks.HOOK_EVENTS)
+
+        С первым обработчиком run() переходит на интерпретатор с точками наблюдения,
+        после удаления последнего - возвращается к быстрому движку.
+        """
+        if self.hooks is None:
+            self.hooks = Hooks()
+        self.hooks.add(event, callback)
+
+    def remove_hook(self, event, callback):
+        if self.hooks is None:
+            return
+        self.hooks.remove(event, callback)
+        if not self.hooks:
+            self.hooks = None
+
+    def enable_breakpoints(self):
+        """Точки останова, наблюдения за памятью и условия: add(), watch_range(), add_condition()"""
+        if self.loop_detector is not None:
+            raise ValueError(_BREAKPOINTS_WITH_LOOPS)
+        if self.breakpoints is None:
+            self.breakpoints = Breakpoints(len(self.memory))
+        return self.breakpoints
+
+    def disable_breakpoints(self):
+        self.breakpoints = None
+
+    def enable_loop_detection(self, history=1 << 16):
+        """Остановка run() при доказанном зацикливании, вердикт - в loop_detector.verdict"""
+        if self.breakpoints is not None:
+            raise ValueError(_BREAKPOINTS_WITH_LOOPS)
+        self.loop_detector = LoopDetector(history)
+        return self.loop_detector
+
+    def disable_loop_detection(self):
+        self.loop_detector = None
+
+    def enable_journal(self, capacity=None, keyframe_interval=None):
+        """Включение журнала для step_back(), run_back_to() и goto() с текущего состояния
+
+        capacity - сколько последних шагов можно отменить, keyframe_interval - шагов между снимками
+        """
+        options = {}
+        if capacity is not None:
+            options['capacity'] = capacity
+        if keyframe_interval is not None:
+            options['keyframe_interval'] = keyframe_interval
+        self.journal = Journal(**options)
+        self.journal.start(self)
+        return self.journal
+
+    def disable_journal(self):
+        self.journal = None
+
+    def _require_journal(self):
+        if self.journal is None:
+            raise ValueError("Журнал выполнения не включен (enable_journal)")
+        return self.journal
+
+    def step_back(self):
+        """Отмена последнего шага, False если отменять нечего"""
+        return self._require_journal().step_back(self)
+
+    def run_back_to(self, pc):
+        """Обратный ход до предыдущего шага, на котором PC == pc"""
+        return self._require_journal().run_back_to(self, pc)
+
+    def goto(self, step_count):
+        """Переход к состоянию с заданным step_count (назад по журналу или вперёд выполнением)"""
+        return self._require_journal().goto(self, step_count)
+
     def get_state(self):
         return {
             'ACC': self.ACC,
             'PC': self.PC,
             'IR': self.IR,
-            'registers': self.registers.copy(),
+            'registers': list(self.registers),
             'flags': self.flags.copy(),
             'halted': self.halted,
             'step_count': self.step_count
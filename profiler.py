@@ -0,0 +1,122 @@
+"""
+Профилировщик выполнения: число выполнений каждой команды по адресам
+Счётчики хранятся в заранее выделенном массиве. С JIT-движком скомпилированные блоки
+учитываются одним счётчиком на выполнение блока и раскладываются по адресам при отчёте,
+поэтому профилирование почти не замедляет выполнение
+"""
+
+from array import array
+
+from assembler import Assembler, label_at
+from predecode import decode, OP_JMP, OP_JZ, OP_JNZ, OP_HALT
+
+GROUPINGS = ('label', 'block', 'pc')
+SORT_KEYS = ('steps', 'address')
+
+
+def basic_blocks(program):
+    """Базовые блоки программы: список (начало, конец) полуинтервалов адресов"""
+    leaders = {0}
+    for pc, word in enumerate(program):
+        op, _, arg = decode(word)
+        if op in (OP_JMP, OP_JZ, OP_JNZ, OP_HALT):
+            leaders.add(pc + 1)
+            if op != OP_HALT:
+                leaders.add(arg)
+    starts = sorted(a for a in leaders if a < len(program))
+    return list(zip(starts, starts[1:] + [len(program)]))
+
+
+class Profiler:
+    """Счётчики выполнений по адресам памяти"""
+
+    def __init__(self, size=4096):
+        self.size = size
+        self.counts = array('Q', bytes(8 * size))
+        self.block_runs = {}     # (начало блока, выполнено команд) -> число выполнений блока
+
+    def reset(self):
+        self.counts[:] = array('Q', bytes(8 * self.size))
+        self.block_runs.clear()
+
+    def flush(self):
+        """Раскладка выполнений скомпилированных блоков по адресам команд"""
+        counts = self.counts
+        for (start, length), runs in self.block_runs.items():
+            for pc in range(start, start + length):
+                counts[pc] += runs
+        self.block_runs.clear()
+
+    def pc_counts(self):
+        """Число выполнений по адресам: {адрес: выполнений} только для выполненных команд"""
+        self.flush()
+        return {pc: count for pc, count in enumerate(self.counts) if count}
+
+    @property
+    def total(self):
+        self.flush()
+        return sum(self.counts)
+
+    def report(self, labels=None, program=None, by='label', sort='steps', top=None):
+        """Горячие участки: список словарей name, start, end, steps, share
+
+        by='label' - по участкам от метки до следующей метки, 'block' - по базовым
+        блокам program, 'pc' - по отдельным командам. sort='steps' - по убыванию
+        числа шагов, 'address' - по адресу.
+        """
+        if by not in GROUPINGS:
+            raise ValueError(f"Неизвестная группировка: {by}")
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Неизвестный порядок сортировки: {sort}")
+        counts = self.pc_counts()
+        total = sum(counts.values())
+        labels = labels or {}
+
+        if by == 'pc':
+            ranges = [(pc, pc + 1) for pc in counts]
+        elif by == 'block':
+            if program is None:
+                raise ValueError("Для группировки по блокам нужна программа")
+            ranges = basic_blocks(program)
+        else:
+            starts = sorted(set(labels.values()) | {0})
+            end = len(program) if program is not None else self.size
+            ranges = list(zip(starts, starts[1:] + [max(end, starts[-1] + 1)]))
+
+        rows = []
+        covered = 0
+        for start, end in ranges:
+            steps = sum(counts.get(pc, 0) for pc in range(start, end))
+            if not steps:
+                continue
+            covered += steps
+            rows.append({'name': label_at(start, labels) if labels else f"{start:04X}",
+                         'start': start, 'end': end, 'steps': steps, 'share': steps / total})
+        if covered < total:
+            # Команды вне программы (например, после выхода за её конец)
+            rows.append({'name': 'other', 'start': None, 'end': None,
+                         'steps': total - covered, 'share': (total - covered) / total})
+
+        if sort == 'steps':
+            rows.sort(key=lambda row: -row['steps'])
+        return rows[:top] if top else rows
+
+    def format_report(self, rows):
+        """Текстовая таблица отчёта report()"""
+        lines = [f"{'участок':24s} {'адреса':11s} {'шагов':>10s} {'доля':>7s}"]
+        for row in rows:
+            span = f"{row['start']:04X}-{row['end'] - 1:04X}" if row['start'] is not None else ''
+            lines.append(f"{row['name']:24s} {span:11s} {row['steps']:10d} {row['share']:7.2%}")
+        return lines
+
+    def annotate(self, instructions):
+        """Листинг в формате Assembler.format_program с числом выполнений и долей на полях"""
+        counts = self.pc_counts()
+        total = sum(counts.values()) or 1
+        lines = Assembler().format_program(instructions)
+        result = []
+        for instr, line in zip(instructions, lines):
+            count = counts.get(instr['address'], 0)
+            margin = f"{count:10d} {count / total:6.1%}" if count else " " * 17
+            result.append(f"{margin} | {line}")
+        return result
@@ -0,0 +1,397 @@
+"""
+Регрессионная проверка движков по эталонным результатам
+Каждая программа programs/*.asm выполняется на сгенерированных наборах данных; итоговое
+состояние (память, регистры, флаги, ACC, PC, IR, step_count) каждого движка сравнивается
+с эталоном, записанным эталонным интерпретатором в golden/<программа>.json. При расхождении
+движок и интерпретатор выполняются рядом по одной команде, и выводится первый шаг, на
+котором их состояния различаются, с разницей состояний
+"""
+
+import glob
+import hashlib
+import json
+import os
+from array import array
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from benchmark import PROGRAMS_DIR, DEFAULT_MAX_VALUE, make_inputs
+from objfile import assemble_cached
+from processor import Processor, ENGINES
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden')
+
+# Кроме движков Processor проверяется векторный движок lockstep.py с одной дорожкой.
+# NumPy и lockstep импортируются только там, где нужны: cli загружает модуль лишь в regress и fuzz
+LOCKSTEP = 'lockstep'
+CHECK_ENGINES = ENGINES + (LOCKSTEP,)
+
+DEFAULT_COUNT = 8
+DEFAULT_SEED = 0
+DEFAULT_MAX_STEPS = 1_000_000
+# Пошаговое сравнение: порция команд, которую first_divergence проверяет и одним run()
+TRACE_WINDOW = 4096
+
+# Семейство программы -> (семейство benchmark с тем же расположением данных, наибольший
+# размер массива, наибольшее значение элемента). Число шагов max растёт со значениями
+# элементов, поэтому полный 16-битный диапазон (переносы и переполнения) - только у sum
+INPUT_SHAPES = {
+    'max': ('max', 19, DEFAULT_MAX_VALUE),
+    'sum': ('sum', 19, 0xFFFF),
+    'convolution': ('convolution', 19, DEFAULT_MAX_VALUE),
+    'bubble_sort': ('max', 8, DEFAULT_MAX_VALUE),
+}
+
+# Первое расхождение движка с интерпретатором: номер шага (от начала программы),
+# состояние до шага и состояния обоих после него (Snapshot)
+Divergence = namedtuple('Divergence', ('step', 'before', 'expected', 'actual'))
+
+
+def program_paths(programs_dir=PROGRAMS_DIR, names=None):
+    """Файлы программ: все programs/*.asm или только перечисленные имена (без .asm)"""
+    paths = sorted(glob.glob(os.path.join(programs_dir, '*.asm')))
+    if names:
+        paths = [path for path in paths if _name(path) in names]
+    return paths
+
+
+def _name(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _family(name):
+    for family in INPUT_SHAPES:
+        if name.startswith(f'variant9_{family}'):
+            return family
+    return None
+
+
+def datasets(name, count=DEFAULT_COUNT, seed=DEFAULT_SEED):
+    """Наборы данных программы: count массивов возрастающих размеров
+
+    Программы без известного семейства (без входных данных) получают один пустой набор.
+    """
+    family = _family(name)
+    if family is None:
+        return [{}]
+    shape, limit, max_value = INPUT_SHAPES[family]
+    sizes = [1 + (i * limit) // count for i in range(count)]
+    return [make_inputs(shape, size, f'{seed}:{i}', max_value) for i, size in enumerate(sizes)]
+
+
+def program_hash(program):
+    return hashlib.sha1(array('H', program).tobytes()).hexdigest()
+
+
+class _Machine:
+    """Единый интерфейс пошагового выполнения для движков Processor и lockstep"""
+
+    def __init__(self, engine, program, data):
+        self.engine = engine
+        if engine == LOCKSTEP:
+            from lockstep import LockstepProcessor
+            self.lanes = LockstepProcessor(1)
+            self.lanes.load_program(program)
+            for address, values in data.items():
+                self.lanes.load_data(values, int(address))
+        else:
+            self.processor = Processor(engine=engine)
+            self.processor.load_program(program)
+            for address, values in data.items():
+                self.processor.load_data(values, int(address))
+
+    def run(self, max_steps):
+        if self.engine == LOCKSTEP:
+            self.lanes.run(max_steps)
+        elif self.engine == 'interpreter' and max_steps == 1:
+            self.processor.step()
+        else:
+            self.processor.run(max_steps)
+
+    def snapshot(self):
+        if self.engine == LOCKSTEP:
+            return self.lanes.get_processor(0).snapshot()
+        return self.processor.snapshot()
+
+    def restore(self, snapshot):
+        """Возврат к состоянию из Processor.snapshot()"""
+        if self.engine != LOCKSTEP:
+            self.processor.restore(snapshot)
+            return
+        import numpy as np
+        lanes = self.lanes
+        lanes.ACC[0] = snapshot.ACC
+        lanes.PC[0] = snapshot.PC
+        lanes.IR[0] = snapshot.IR
+        lanes.registers[:, 0] = np.frombuffer(snapshot.registers, dtype=np.uint16)
+        lanes.flags_word[0] = snapshot.flags_word
+        lanes.memory[:, 0] = np.frombuffer(snapshot.memory, dtype=np.uint16)
+        lanes.halted[0] = snapshot.halted
+        lanes.step_count[0] = snapshot.step_count
+
+
+def capture(snapshot, initial):
+    """Итоговое состояние для эталона: ячейки памяти - только изменившиеся относительно initial"""
+    import numpy as np
+    memory = np.frombuffer(snapshot.memory, dtype=np.uint16)
+    changed = np.flatnonzero(memory != np.frombuffer(initial, dtype=np.uint16))
+    return {
+        'ACC': snapshot.ACC,
+        'PC': snapshot.PC,
+        'IR': snapshot.IR,
+        'flags': snapshot.flags_word,
+        'registers': array('H', snapshot.registers).tolist(),
+        'halted': snapshot.halted,
+        'step_count': snapshot.step_count,
+        'memory': {str(addr): int(memory[addr]) for addr in changed},
+    }
+
+
+def diff_states(expected, actual, initial):
+    """Различия состояний capture(): список (поле, ожидалось, получено)"""
+    differences = []
+    for field in ('ACC', 'PC', 'IR', 'flags', 'halted', 'step_count'):
+        if expected[field] != actual[field]:
+            differences.append((field, expected[field], actual[field]))
+    for reg, (old, new) in enumerate(zip(expected['registers'], actual['registers'])):
+        if old != new:
+            differences.append((f'R{reg}', old, new))
+    memory = array('H', initial)
+    for addr in sorted({*expected['memory'], *actual['memory']}, key=int):
+        old = expected['memory'].get(addr, memory[int(addr)])
+        new = actual['memory'].get(addr, memory[int(addr)])
+        if old != new:
+            differences.append((f'mem[{addr}]', old, new))
+    return differences
+
+
+def diff_snapshots(expected, actual):
+    """Различия двух Snapshot: список (поле, ожидалось, получено)"""
+    import numpy as np
+    differences = []
+    for field, name in (('ACC', 'ACC'), ('PC', 'PC'), ('IR', 'IR'), ('flags_word', 'flags'),
+                        ('halted', 'halted'), ('step_count', 'step_count')):
+        if getattr(expected, field) != getattr(actual, field):
+            differences.append((name, getattr(expected, field), getattr(actual, field)))
+    for field, name in (('registers', 'R{}'), ('memory', 'mem[{}]')):
+        old = np.frombuffer(getattr(expected, field), dtype=np.uint16)
+        new = np.frombuffer(getattr(actual, field), dtype=np.uint16)
+        for i in np.flatnonzero(old != new):
+            differences.append((name.format(i), int(old[i]), int(new[i])))
+    return differences
+
+
+def first_divergence(program, data, engine, max_steps=DEFAULT_MAX_STEPS, window=TRACE_WINDOW):
+    """Выполнение движка рядом с интерпретатором до первого различия состояний
+
+    Возвращает Divergence или None, если состояния совпадают. Оба выполняются по одной
+    команде со сравнением снимков после каждой, так что находится и расхождение, которое
+    потом исчезает. Кроме того, каждую порцию из window команд движок повторяет одним
+    run(window) от её начала: так проверяются и пути, которые run(1) не проходит (ускорение
+    циклов умножения, блоки JIT). Если пошагово порция совпала, а run(window) - нет, первый
+    различающийся шаг ищется последовательно по run(k) от начала порции.
+    """
+    reference = _Machine('interpreter', program, data)
+    machine = _Machine(engine, program, data)
+    start = reference.snapshot()
+    done = 0
+    while done < max_steps and not start.halted:
+        count = min(window, max_steps - done)
+        divergence = _step_divergence(reference, machine, start, count)
+        if divergence is not None:
+            return divergence
+        end = reference.snapshot()
+        machine.restore(start)
+        machine.run(count)
+        if machine.snapshot() != end:
+            return _scan_divergence(reference, machine, start, count)
+        start = end
+        done += count
+    return None
+
+
+def _step_divergence(reference, machine, before, count):
+    # Оба в состоянии before; первая различающаяся из count команд, выполняемых по одной
+    for _ in range(count):
+        reference.run(1)
+        machine.run(1)
+        expected = reference.snapshot()
+        actual = machine.snapshot()
+        if expected != actual:
+            return Divergence(before.step_count, before, expected, actual)
+        if expected.halted:
+            break
+        before = expected
+    return None
+
+
+def _scan_divergence(reference, machine, start, count):
+    # Наименьшее k, после которого run(k) движка от start отличается от интерпретатора
+    reference.restore(start)
+    before = start
+    for steps in range(1, count + 1):
+        reference.run(1)
+        expected = reference.snapshot()
+        machine.restore(start)
+        machine.run(steps)
+        actual = machine.snapshot()
+        if expected != actual:
+            return Divergence(before.step_count, before, expected, actual)
+        before = expected
+    return None
+
+
+def _describe_divergence(divergence):
+    before = divergence.before
+    return {
+        'step': divergence.step,
+        'pc': before.PC,
+        'instruction': Processor().disassemble_instruction(
+            array('H', before.memory)[before.PC]) if before.PC < len(before.memory) // 2 else None,
+        'differences': diff_snapshots(divergence.expected, divergence.actual),
+    }
+
+
+def run_state(program, data, engine, max_steps=DEFAULT_MAX_STEPS):
+    """Итоговое состояние программы на движке: (состояние capture(), начальная память)"""
+    machine = _Machine(engine, program, data)
+    initial = machine.snapshot().memory
+    machine.run(max_steps)
+    return capture(machine.snapshot(), initial), initial
+
+
+def check_case(task):
+    """Проверка одного набора данных всеми движками, возвращает список расхождений
+
+    task - (программа, номер набора, слова программы, данные, эталонное состояние,
+    движки, max_steps, trace). trace=True - пошаговое сравнение с интерпретатором
+    даже при совпавшем итоговом состоянии.
+    """
+    name, index, program, data, golden, engines, max_steps, trace = task
+    failures = []
+    for engine in engines:
+        failure = {'program': name, 'case': index, 'engine': engine}
+        try:
+            state, initial = run_state(program, data, engine, max_steps)
+            differences = diff_states(golden, state, initial)
+            if differences:
+                failure['differences'] = differences
+            # Интерпретатор - сам эталон для пошагового сравнения
+            if (differences or trace) and engine != 'interpreter':
+                divergence = first_divergence(program, data, engine, max_steps)
+                if divergence is not None:
+                    failure['divergence'] = _describe_divergence(divergence)
+        except Exception as e:
+            failure['error'] = f'{type(e).__name__}: {e}'
+        if len(failure) > 3:
+            failures.append(failure)
+    return failures
+
+
+def golden_path(name, golden_dir=GOLDEN_DIR):
+    return os.path.join(golden_dir, f'{name}.json')
+
+
+def load_golden(name, golden_dir=GOLDEN_DIR):
+    with open(golden_path(name, golden_dir), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _golden_case(task):
+    name, index, program, data, max_steps = task
+    state, _ = run_state(program, data, 'interpreter', max_steps)
+    return name, index, state
+
+
+def update_golden(names=None, count=DEFAULT_COUNT, seed=DEFAULT_SEED, max_steps=DEFAULT_MAX_STEPS,
+                  programs_dir=PROGRAMS_DIR, golden_dir=GOLDEN_DIR, workers=None):
+    """Запись эталонов эталонным интерпретатором, возвращает список записанных файлов"""
+    programs = {}
+    tasks = []
+    for path in program_paths(programs_dir, names):
+        name = _name(path)
+        program = assemble_cached(path).code
+        cases = datasets(name, count, seed)
+        programs[name] = {'program': os.path.basename(path), 'hash': program_hash(program),
+                          'max_steps': max_steps, 'cases': [{'data': data} for data in cases]}
+        tasks.extend((name, index, program, data, max_steps) for index, data in enumerate(cases))
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        for name, index, state in executor.map(_golden_case, tasks, chunksize=4):
+            programs[name]['cases'][index]['state'] = state
+
+    os.makedirs(golden_dir, exist_ok=True)
+    written = []
+    for name, golden in programs.items():
+        path = golden_path(name, golden_dir)
+        cases = golden.pop('cases')
+        with open(path, 'w', encoding='utf-8') as f:
+            # Один набор на строку: изменения эталона читаются в git diff по наборам
+            f.write(json.dumps(golden, ensure_ascii=False)[:-1] + ', "cases": [\n')
+            f.write(',\n'.join(json.dumps(case, ensure_ascii=False) for case in cases))
+            f.write('\n]}\n')
+        written.append(path)
+    return written
+
+
+def check_golden(names=None, engines=CHECK_ENGINES, trace=False, fail_fast=False,
+                 programs_dir=PROGRAMS_DIR, golden_dir=GOLDEN_DIR, workers=None):
+    """Сравнение всех движков с эталонами на пуле процессов
+
+    Возвращает (число проверенных наборов, список расхождений). Расхождение - словарь
+    program, case, engine и одно или несколько полей: differences - различия итогового
+    состояния с эталоном, divergence - первый различающийся шаг относительно
+    интерпретатора, error - исключение движка или отсутствующий/устаревший эталон.
+    fail_fast - прекратить проверку после первого набора с расхождениями.
+    """
+    failures = []
+    tasks = []
+    for path in program_paths(programs_dir, names):
+        name = _name(path)
+        program = assemble_cached(path).code
+        try:
+            golden = load_golden(name, golden_dir)
+        except FileNotFoundError:
+            failures.append({'program': name, 'error': "нет эталона, запустите с --update"})
+            continue
+        if golden['hash'] != program_hash(program):
+            failures.append({'program': name, 'error': "программа изменилась после записи эталона"})
+            continue
+        tasks.extend((name, index, program, case['data'], case['state'], tuple(engines),
+                      golden['max_steps'], trace)
+                     for index, case in enumerate(golden['cases']))
+    if failures and fail_fast:
+        return 0, failures
+
+    checked = 0
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        futures = [executor.submit(check_case, task) for task in tasks]
+        for future in as_completed(futures):
+            checked += 1
+            case_failures = future.result()
+            failures.extend(case_failures)
+            if case_failures and fail_fast:
+                for pending in futures:
+                    pending.cancel()
+                break
+    failures.sort(key=lambda f: (f['program'], f.get('case', -1), f.get('engine', '')))
+    return checked, failures
+
+
+def format_failure(failure):
+    """Текстовое описание расхождения"""
+    title = failure['program']
+    if 'case' in failure:
+        title += f" набор {failure['case']}, движок {failure['engine']}"
+    lines = [title]
+    if 'error' in failure:
+        lines.append(f"  ошибка: {failure['error']}")
+    if 'differences' in failure:
+        lines.append("  итоговое состояние (эталон -> движок):")
+        lines.extend(f"    {field:12s} {old} -> {new}" for field, old, new in failure['differences'])
+    if 'divergence' in failure:
+        divergence = failure['divergence']
+        lines.append(f"  первое расхождение на шаге {divergence['step']}: "
+                     f"PC={divergence['pc']} {divergence['instruction'] or ''}".rstrip())
+        lines.extend(f"    {field:12s} {old} -> {new}" for field, old, new in divergence['differences'])
+    return lines
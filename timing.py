@@ -0,0 +1,111 @@
+"""
+Потактовая модель времени выполнения
+Число тактов команды = базовые такты операции + обращения к памяти (выборка команды
+и операнды) * задержка памяти + обращения к регистрам * задержка регистров
++ штраф за выполненный переход
+"""
+
+from predecode import (
+    decode,
+    OP_LOAD, OP_STORE, OP_ADD, OP_SUB, OP_CMP, OP_JMP, OP_JZ, OP_JNZ, OP_HALT, OP_NOP,
+    MODE_DIRECT, MODE_IMMEDIATE, MODE_INDIRECT, MODE_REGISTER, MODE_REG_INDIRECT, MODE_ZERO, MODE_NONE,
+)
+
+OP_NAMES = {
+    OP_LOAD: 'LOAD', OP_STORE: 'STORE', OP_ADD: 'ADD', OP_SUB: 'SUB', OP_CMP: 'CMP',
+    OP_JMP: 'JMP', OP_JZ: 'JZ', OP_JNZ: 'JNZ', OP_HALT: 'HALT', OP_NOP: 'NOP',
+}
+
+# Запись способа адресации как в ассемблере
+MODE_NAMES = {
+    MODE_DIRECT: 'addr', MODE_IMMEDIATE: '#v', MODE_INDIRECT: '(addr)',
+    MODE_REGISTER: 'Rk', MODE_REG_INDIRECT: '(Rk)', MODE_ZERO: '-', MODE_NONE: '',
+}
+
+# Базовые такты операции (декодирование и исполнение) без обращений к памяти и регистрам
+DEFAULT_BASE_CYCLES = {
+    OP_LOAD: 1, OP_STORE: 1, OP_ADD: 1, OP_SUB: 1, OP_CMP: 1,
+    OP_JMP: 1, OP_JZ: 1, OP_JNZ: 1, OP_HALT: 1, OP_NOP: 1,
+}
+DEFAULT_MEMORY_LATENCY = 3
+DEFAULT_REGISTER_LATENCY = 1
+DEFAULT_BRANCH_PENALTY = 1
+
+
+def operand_accesses(op, mode):
+    """Число обращений к памяти и к регистрам для операнда: (память, регистры)"""
+    if op in (OP_LOAD, OP_ADD, OP_SUB, OP_CMP, OP_STORE):
+        if mode == MODE_DIRECT:
+            return 1, 0
+        if mode == MODE_INDIRECT:
+            return 2, 0       # адрес из памяти, затем сам операнд
+        if mode == MODE_REGISTER:
+            return 0, 1
+        if mode == MODE_REG_INDIRECT:
+            return 1, 1
+    return 0, 0
+
+
+def instruction_class(word):
+    """Название класса команды для разбивки тактов, например 'LOAD (addr)'"""
+    op, mode, _ = decode(word)
+    return f"{OP_NAMES[op]} {MODE_NAMES[mode]}".rstrip()
+
+
+class TimingModel:
+    """Таблица тактов по операциям и способам адресации с накоплением статистики"""
+
+    def __init__(self, base_cycles=None, memory_latency=DEFAULT_MEMORY_LATENCY,
+                 register_latency=DEFAULT_REGISTER_LATENCY, branch_penalty=DEFAULT_BRANCH_PENALTY):
+        self.base_cycles = dict(DEFAULT_BASE_CYCLES)
+        if base_cycles:
+            self.base_cycles.update(base_cycles)
+        self.memory_latency = memory_latency
+        self.register_latency = register_latency
+        self.branch_penalty = branch_penalty
+        self._cycles = {}       # слово -> (такты без данных, такты данных, класс команды, переход)
+        self.breakdown = {}     # класс команды -> [число команд, такты]
+
+    def reset(self):
+        self.breakdown = {}
+
+    def instruction_cycles(self, word):
+        """Такты команды без штрафа за переход"""
+        fixed, data_accesses = self._split_cycles(word)
+        return fixed + (1 + data_accesses) * self.memory_latency
+
+    def _split_cycles(self, word):
+        # (такты исполнения и регистров, число обращений к памяти данных)
+        op, mode, _ = decode(word)
+        memory, registers = operand_accesses(op, mode)
+        return self.base_cycles[op] + registers * self.register_latency, memory
+
+    def account(self, word, pc, next_pc, memory_cycles=None, fetch_cycles=None):
+        """Такты выполненной команды word по адресу pc; next_pc - PC после неё
+
+        memory_cycles и fetch_cycles - такты обращений к данным и выборки команды,
+        если их посчитали модели кэшей, иначе каждое обращение стоит memory_latency.
+        """
+        entry = self._cycles.get(word)
+        if entry is None:
+            fixed, data_accesses = self._split_cycles(word)
+            entry = self._cycles[word] = (fixed, data_accesses * self.memory_latency,
+                                          instruction_class(word), decode(word)[0] in (OP_JMP, OP_JZ, OP_JNZ))
+        fixed, data_cycles, name, branch = entry
+        cycles = fixed + (data_cycles if memory_cycles is None else memory_cycles)
+        cycles += self.memory_latency if fetch_cycles is None else fetch_cycles
+        if branch and next_pc != pc + 1:
+            cycles += self.branch_penalty
+
+        stats = self.breakdown.get(name)
+        if stats is None:
+            self.breakdown[name] = [1, cycles]
+        else:
+            stats[0] += 1
+            stats[1] += cycles
+        return cycles
+
+    def report(self):
+        """Разбивка тактов по классам команд, по убыванию тактов"""
+        return {name: {'count': count, 'cycles': cycles}
+                for name, (count, cycles) in sorted(self.breakdown.items(), key=lambda item: -item[1][1])}
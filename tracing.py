@@ -0,0 +1,176 @@
+"""
+Двоичная трасса выполнения в кольцевом буфере, отображённом в память (mmap)
+Каждый шаг - запись фиксированной длины: номер шага, PC, IR, ACC до и после,
+флаги, вид обращения к операнду, исполнительный адрес и значение. Запись
+упаковывается struct.pack_into прямо в mmap, без форматирования строк.
+Чтение - потоком структурированных массивов NumPy (read_trace)
+"""
+
+import mmap
+import struct
+
+from predecode import (
+    decode, OP_LOAD, OP_STORE, OP_ADD, OP_SUB, OP_CMP,
+    MODE_DIRECT, MODE_INDIRECT, MODE_REGISTER, MODE_REG_INDIRECT,
+)
+
+MAGIC = b'EMUTRACE'
+VERSION = 1
+
+# Заголовок: сигнатура, версия, длина записи, ёмкость в записях, записано всего
+_HEADER = struct.Struct('<8sIIQQ')
+HEADER_SIZE = 64
+# Счётчик записей - последнее поле заголовка, обновляется после каждой записи
+_WRITTEN = struct.Struct('<Q')
+_WRITTEN_OFFSET = _HEADER.size - _WRITTEN.size
+
+# Запись: шаг, PC, IR, ACC до, ACC после, исполнительный адрес, значение, флаги, вид
+_RECORD = struct.Struct('<QHHHHHHBBxx')
+RECORD_SIZE = _RECORD.size
+
+# Вид обращения к операнду
+ACCESS_NONE = 0
+ACCESS_MEMORY_READ = 1
+ACCESS_MEMORY_WRITE = 2
+ACCESS_REGISTER_READ = 3
+ACCESS_REGISTER_WRITE = 4
+
+NO_ADDRESS = 0xFFFF
+
+RECORD_FIELDS = [
+    ('step', '<u8'), ('pc', '<u2'), ('ir', '<u2'), ('acc_before', '<u2'), ('acc_after', '<u2'),
+    ('address', '<u2'), ('value', '<u2'), ('flags', 'u1'), ('access', 'u1'), ('_pad', 'V2'),
+]
+
+
+def operand_location(word, memory, registers):
+    """Вид обращения и исполнительный адрес (или номер регистра) операнда команды word"""
+    op, mode, arg = decode(word)
+    if op not in (OP_LOAD, OP_STORE, OP_ADD, OP_SUB, OP_CMP):
+        return ACCESS_NONE, NO_ADDRESS
+    write = op == OP_STORE
+    if mode == MODE_REGISTER:
+        return (ACCESS_REGISTER_WRITE if write else ACCESS_REGISTER_READ), arg
+    if mode == MODE_DIRECT:
+        addr = arg
+    elif mode == MODE_INDIRECT:
+        addr = memory[arg]
+    elif mode == MODE_REG_INDIRECT:
+        addr = registers[arg] & 0xFFFF
+    else:
+        return ACCESS_NONE, NO_ADDRESS
+    if addr >= len(memory):
+        return ACCESS_NONE, NO_ADDRESS
+    return (ACCESS_MEMORY_WRITE if write else ACCESS_MEMORY_READ), addr
+
+
+class TraceWriter:
+    """Запись трассы в файл фиксированного размера: последние capacity шагов
+
+    При переполнении новые записи затирают самые старые. Счётчик записей в
+    заголовке обновляется после каждой записи, поэтому трасса читается и без
+    close() - после исключения в run() или аварийного завершения процесса.
+    flush() сбрасывает отображение на диск.
+    """
+
+    def __init__(self, path, capacity=1_000_000):
+        if capacity < 1:
+            raise ValueError("Ёмкость трассы должна быть положительной")
+        self.path = path
+        self.capacity = capacity
+        self.written = 0
+        size = HEADER_SIZE + capacity * RECORD_SIZE
+        self._file = open(path, 'w+b')
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._write_header()
+        # Состояние до текущего шага (begin -> end)
+        self._pc = self._ir = self._acc = 0
+        self._access = ACCESS_NONE
+        self._address = NO_ADDRESS
+
+    def _write_header(self):
+        _HEADER.pack_into(self._map, 0, MAGIC, VERSION, RECORD_SIZE, self.capacity, self.written)
+
+    def begin(self, processor, pc):
+        """Запоминание состояния перед выполнением команды processor.IR по адресу pc"""
+        self._pc = pc
+        self._ir = processor.IR
+        self._acc = processor.ACC & 0xFFFF
+        self._access, self._address = operand_location(processor.IR, processor.memory, processor.registers)
+
+    def end(self, processor):
+        """Запись шага после выполнения команды"""
+        access = self._access
+        address = self._address
+        if access == ACCESS_NONE:
+            value = 0
+        elif access in (ACCESS_MEMORY_READ, ACCESS_MEMORY_WRITE):
+            value = processor.memory[address]
+        else:
+            value = processor.registers[address] & 0xFFFF
+        self.write(processor.step_count - 1, self._pc, self._ir, self._acc, processor.ACC & 0xFFFF,
+                   address, value, processor.flags_word, access)
+
+    def write(self, step, pc, ir, acc_before, acc_after, address, value, flags, access):
+        offset = HEADER_SIZE + (self.written % self.capacity) * RECORD_SIZE
+        _RECORD.pack_into(self._map, offset, step, pc, ir, acc_before, acc_after,
+                          address, value, flags, access)
+        self.written += 1
+        # Счётчик - после записи: читатель не увидит в нём ещё не записанную запись
+        _WRITTEN.pack_into(self._map, _WRITTEN_OFFSET, self.written)
+
+    def flush(self):
+        self._write_header()
+        self._map.flush()
+
+    def close(self):
+        if self._map.closed:
+            return
+        self.flush()
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_header(path):
+    """Заголовок файла трассы: (ёмкость, записано всего)"""
+    with open(path, 'rb') as f:
+        magic, version, record_size, capacity, written = _HEADER.unpack(f.read(_HEADER.size))
+    if magic != MAGIC or version != VERSION or record_size != RECORD_SIZE:
+        raise ValueError(f"Файл не является трассой эмулятора: {path}")
+    return capacity, written
+
+
+def record_dtype():
+    """Тип структурированного массива NumPy для записей трассы"""
+    import numpy as np
+    return np.dtype(RECORD_FIELDS)
+
+
+def read_trace(path, chunk=1_000_000):
+    """Чтение трассы потоком массивов NumPy по chunk записей, от старых к новым"""
+    import numpy as np
+
+    capacity, written = read_header(path)
+    count = min(written, capacity)
+    start = written % capacity if written > capacity else 0
+    records = np.memmap(path, dtype=record_dtype(), mode='r', offset=HEADER_SIZE, shape=(capacity,))
+    # Кольцо разворачивается в два непрерывных участка: [start, capacity) и [0, start)
+    for begin, end in ((start, start + count if start == 0 else capacity), (0, start if start else 0)):
+        for i in range(begin, end, chunk):
+            yield np.array(records[i:min(i + chunk, end)])
+
+
+def load_trace(path):
+    """Вся трасса одним массивом NumPy"""
+    import numpy as np
+
+    chunks = list(read_trace(path))
+    return np.concatenate(chunks) if chunks else np.empty(0, dtype=record_dtype())
+
@@ -2,7 +2,7 @@ import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox, filedialog, Canvas
 import time
 import threading
-from processor import Processor
+from processor import Processor, EMPTY_SNAPSHOT
 from assembler import Assembler
 
 class DataFlowVisualizer:
@@ -663,13 +663,7 @@ END:
     def full_reset_processor(self):
         """Полный сброс процессора (очищает память)"""
         self.running = False
-        self.processor.ACC = 0
-        self.processor.PC = 0
-        self.processor.IR = 0
-        self.processor.flags = {'ZF': False, 'SF': False, 'CF': False, 'OF': False}
-        self.processor.halted = False
-        self.processor.step_count = 0
-        self.processor.memory = [0] * 4096
+        self.processor.restore(EMPTY_SNAPSHOT)
         self.clear_logs()
         self.update_display()
         